@@ -5,7 +5,7 @@
 
 # De Novo Genome Assembly and Assessment Script
 #
-# Required Tools: pigz, fastp, BBtools (bbnorm.sh), Redundans (redundans.py),
+# Required Tools: python3 (numpy), pigz, fastp, BBtools (bbnorm.sh), Redundans (redundans.py),
 #                 Minimap2, Samtools, BESST (runBESST), GapCloser, SPAdes (spades.py),
 #                 SeqKit, BUSCO
 #
@@ -13,7 +13,13 @@
 #   bash <script_name> <read1.fq.gz> <read2.fq.gz> <species_name> <steps_to_run>
 #
 # Example:
-#   bash assemble_genome.sh reads_R1.fq.gz reads_R2.fq.gz MySpecies 12345678
+#   bash assemble_genome.sh reads_R1.fq.gz reads_R2.fq.gz MySpecies 012345678
+#
+# Step 0 profiles the k-mer spectrum of the raw reads (Kmer_Profiler.py) and
+# writes suggested READ_LENGTH, bbnorm memory and SPAdes settings to
+# profile.env, which later steps load automatically when present. The bbnorm
+# target/min stay at 10/2 unless ADAPTIVE_BBNORM=1, which replaces them with
+# the profile's coverage-based depths.
 #
 
 # Exit immediately if a command exits with a non-zero status.
@@ -28,7 +34,7 @@ start_time=$(date +%s) # Record script start time
 if [ "$#" -ne 4 ]; then
     echo "Error: Incorrect number of arguments."
     echo "Usage: $0 <read1.fq.gz> <read2.fq.gz> <species_name> <steps_to_run>"
-    echo "Example: $0 reads_R1.fq.gz reads_R2.fq.gz MySpecies 12345678"
+    echo "Example: $0 reads_R1.fq.gz reads_R2.fq.gz MySpecies 012345678"
     exit 1
 fi
 
@@ -36,7 +42,7 @@ fi
 INPUT_R1="$1"
 INPUT_R2="$2"
 SPECIES="$3"
-STARTING_STEPS_RAW="$4" # e.g., "12345678"
+STARTING_STEPS_RAW="$4" # e.g., "012345678"
 
 # Extract base names and prefixes from input filenames
 filename1=$(basename "${INPUT_R1}")
@@ -49,6 +55,10 @@ READ_LENGTH=150 # Read length of sequencing data
 THREADS=16      # Number of threads to use
 MEMORY_MB=200000 # Total memory limit (MB), e.g., 200GB
 BBTOOLS_MEM_GB="80g" # Specific memory for BBtools (GB)
+BBNORM_TARGET=10 # bbnorm target depth
+BBNORM_MIN=2     # bbnorm minimum depth (k-mers below are treated as errors)
+ADAPTIVE_BBNORM="${ADAPTIVE_BBNORM:-0}" # 1: take bbnorm target/min from the k-mer profile
+SPADES_MEM_GB=$((MEMORY_MB / 1000)) # SPAdes memory limit (GB)
 SAMTOOLS_MEM_PER_THREAD="1706M" # Samtools sort memory per thread (MB)
 
 # --- IMPORTANT: BUSCO Lineage Path (Hardcoded) ---
@@ -160,12 +170,39 @@ STARTING_STEP_ARRAY=($(split_number "${STARTING_STEPS_RAW}"))
 # --- 5. Main Assembly Workflow ---
 # Get the absolute path of the species base directory for easier relative path referencing
 base_path=$(realpath "${SPECIES_BASE_DIR}")
+SCRIPT_DIR="$(dirname "$(realpath "$0")")"
+PROFILE_DIR="${base_path}/0-${SPECIES}_kmer_profile"
+
+# Load k-mer profile suggestions from a previous step 0 run, if available
+load_profile() {
+    if [ -f "${PROFILE_DIR}/profile.env" ]; then
+        source "${PROFILE_DIR}/profile.env"
+        echo "Loaded k-mer profile: READ_LENGTH=${READ_LENGTH} BBNORM_TARGET=${BBNORM_TARGET}" \
+             "BBNORM_MIN=${BBNORM_MIN} BBTOOLS_MEM_GB=${BBTOOLS_MEM_GB} SPADES_MEM_GB=${SPADES_MEM_GB}"
+    fi
+}
+load_profile
 
 for num in "${STARTING_STEP_ARRAY[@]}"; do
     echo "--- Running Step ${num} ---"
     current_step_dir="" # Reset current directory variable for each step
 
     case $num in
+        0)
+            echo "Step 0: K-mer Spectrum Profiling"
+            mkdir -p "${PROFILE_DIR}"
+            cd "${PROFILE_DIR}" || { echo "Error: Could not enter directory ${PROFILE_DIR}"; exit 1; }
+
+            profile_args=()
+            if [ "${ADAPTIVE_BBNORM}" = "1" ]; then
+                profile_args+=(--adaptive-bbnorm)
+            fi
+            python3 "${SCRIPT_DIR}/Kmer_Profiler.py" "${INPUT_R1}" "${INPUT_R2}" \
+                -o . --threads "${THREADS}" --memory-gb "$((MEMORY_MB / 1000))" \
+                "${profile_args[@]}"
+            load_profile
+            echo ""
+            ;;
         1)
             echo "Step 1: Quality Trimming (fastp)"
             step_name="1-${SPECIES}_fastp"
@@ -193,7 +230,7 @@ for num in "${STARTING_STEP_ARRAY[@]}"; do
             "${BBNORM_SH_EXE}" in1="../1-${SPECIES}_fastp/${prefix1}.fastp.fq.gz" \
                 in2="../1-${SPECIES}_fastp/${prefix2}.fastp.fq.gz" \
                 out1="${prefix1}.nor.fq.gz" out2="${prefix2}.nor.fq.gz" \
-                target="10" min=2 histcol=2 khist="${SPECIES}_khist.txt" \
+                target="${BBNORM_TARGET}" min="${BBNORM_MIN}" histcol=2 khist="${SPECIES}_khist.txt" \
                 peaks="${SPECIES}_peaks.txt" threads="${THREADS}" -Xmx"${BBTOOLS_MEM_GB}"
             echo ""
             ;;
@@ -205,7 +242,7 @@ for num in "${STARTING_STEP_ARRAY[@]}"; do
 
             "${SPADES_PY_EXE}" -1 "./2-${SPECIES}_normalize/${prefix1}.nor.fq.gz" \
                 -2 "./2-${SPECIES}_normalize/${prefix2}.nor.fq.gz" \
-                -o "${step_name}" -k 21,33,55,77 -t "${THREADS}"
+                -o "${step_name}" -k 21,33,55,77 -t "${THREADS}" -m "${SPADES_MEM_GB}"
             echo ""
             ;;
         4)
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Pre-assembly K-mer Spectrum Profiler v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. Single streaming pass over paired fq.gz files (one decompression thread per file)
+2. Canonical k-mer hashing in worker processes with NumPy
+3. Bounded memory: HyperLogLog distinct counter plus an adaptively sampled exact table
+4. K-mer histogram, genome size / heterozygosity / coverage estimates
+5. Suggested READ_LENGTH, bbnorm memory and SPAdes memory (shell-sourceable)
+6. Coverage-based bbnorm target/min depths, reported always and written to
+   profile.env only with --adaptive-bbnorm (otherwise the pipeline's fixed
+   target=10 min=2 are kept)
+
+Corrupt or truncated gzip input aborts the run instead of being profiled as
+a shorter file.
+
+The sampled table keeps every k-mer whose hash falls below a threshold, so
+sampled k-mers are counted exactly; when the table exceeds --max-entries the
+threshold is halved. The histogram is rescaled by the final sampling rate.
+
+Usage:
+    python Kmer_Profiler.py reads_R1.fq.gz reads_R2.fq.gz -o 0-kmer_profile \\
+        --threads 16 --memory-gb 200
+"""
+
+import os
+import sys
+import gzip
+import math
+import queue
+import shutil
+import argparse
+import threading
+import subprocess
+import multiprocessing
+from contextlib import contextmanager
+from time import perf_counter
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Constants
+DEFAULT_THREADS = min(os.cpu_count() or 4, 8)
+DEFAULT_K = 21
+DEFAULT_MAX_ENTRIES = 1 << 24      # Sampled k-mers held in memory (~200 MB)
+CHUNK_BYTES = 4 << 20              # FASTQ text per worker task
+HLL_P = 14                         # 2^14 HyperLogLog registers
+HIST_MAX = 10000                   # Depths above this are pooled in the last bin
+TARGET_BASE_COVERAGE = 30          # Coverage kept by the suggested bbnorm target
+SPADES_BYTES_PER_KMER = 64         # Rough SPAdes graph cost per solid k-mer
+DEFAULT_BBNORM_TARGET = 10         # Pipeline's fixed bbnorm target depth
+DEFAULT_BBNORM_MIN = 2             # Pipeline's fixed bbnorm minimum depth
+
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _i, _b in enumerate(b'ACGT'):
+    BASE_CODES[_b] = BASE_CODES[_b + 32] = _i
+UINT64_MAX = np.uint64(0xffffffffffffffff)
+
+
+# ==============================================
+# FASTQ Streaming
+# ==============================================
+@contextmanager
+def open_fastq(path: str) -> Iterator[BinaryIO]:
+    """Open a (gzipped) FASTQ file, using pigz for decompression if available.
+
+    Raises:
+        RuntimeError: If pigz exits with an error (corrupt or truncated input)
+    """
+    if not (path.endswith('.gz') and shutil.which('pigz')):
+        with (gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')) as handle:
+            yield handle
+        return
+
+    proc = subprocess.Popen(['pigz', '-dc', path],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        yield proc.stdout
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        proc.stdout.close()
+        message = proc.stderr.read().decode(errors='replace').strip()
+        proc.stderr.close()
+        returncode = proc.wait()
+    if returncode != 0:
+        raise RuntimeError(f"pigz failed on {path} (exit {returncode}): {message}")
+
+
+def read_chunks(path: str, out: queue.Queue, stop: threading.Event) -> None:
+    """Read a FASTQ file into chunks cut at record boundaries.
+
+    Stops early (without reporting) once ``stop`` is set.
+    """
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    try:
+        with open_fastq(path) as handle:
+            tail = b''
+            while True:
+                data = handle.read(CHUNK_BYTES)
+                if not data:
+                    break
+                data = tail + data
+                lines = data.split(b'\n')
+                cut = (len(lines) - 1) // 4 * 4
+                if not put(b'\n'.join(lines[:cut])):
+                    return
+                tail = b'\n'.join(lines[cut:])
+            if tail.strip():
+                put(tail)
+    except Exception as e:
+        put(e)
+    put(None)
+
+
+def iter_fastq_chunks(paths: List[str], max_pending: int) -> Iterator[bytes]:
+    """Yield FASTQ chunks from all files, each file read by its own thread.
+
+    Closing the iterator early stops the reader threads.
+    """
+    chunks: queue.Queue = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+    readers = [threading.Thread(target=read_chunks, args=(p, chunks, stop), daemon=True)
+               for p in paths]
+    for reader in readers:
+        reader.start()
+    finished = 0
+    try:
+        while finished < len(readers):
+            item = chunks.get()
+            if item is None:
+                finished += 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        stop.set()
+
+
+# ==============================================
+# K-mer Hashing (worker side)
+# ==============================================
+def mix64(x: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer: uniform 64-bit hashes from k-mer codes."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+def canonical_kmer_hashes(seqs: List[bytes], k: int) -> np.ndarray:
+    """Hash every valid canonical k-mer in a batch of reads."""
+    codes = BASE_CODES[np.frombuffer(b'N'.join(seqs), dtype=np.uint8)]
+    n = codes.size - k + 1
+    if n <= 0:
+        return np.empty(0, dtype=np.uint64)
+
+    invalid = np.concatenate([[0], np.cumsum(codes == 4)])
+    valid = (invalid[k:] - invalid[:-k]) == 0
+
+    bits = (codes & 3).astype(np.uint64)
+    fw = np.zeros(n, dtype=np.uint64)
+    rc = np.zeros(n, dtype=np.uint64)
+    two = np.uint64(2)
+    for j in range(k):
+        fw = (fw << two) | bits[j:j + n]
+        rc |= (np.uint64(3) - bits[j:j + n]) << np.uint64(2 * j)
+    return mix64(np.minimum(fw, rc)[valid])
+
+
+def hll_ranks(hashes: np.ndarray) -> np.ndarray:
+    """Per-register maximum HyperLogLog rank for a batch of hashes."""
+    idx = (hashes >> np.uint64(64 - HLL_P)).astype(np.int64)
+    rest = (hashes & np.uint64((1 << (64 - HLL_P)) - 1)).astype(np.float64)
+    with np.errstate(divide='ignore'):
+        rank = np.where(rest > 0, (64 - HLL_P) - np.floor(np.log2(rest)),
+                        64 - HLL_P + 1).astype(np.uint8)
+    registers = np.zeros(1 << HLL_P, dtype=np.uint8)
+    np.maximum.at(registers, idx, rank)
+    return registers
+
+
+def profile_chunk(task: Tuple[bytes, int, int]) -> Dict[str, object]:
+    """Process one FASTQ chunk.
+
+    Args:
+        task: (FASTQ text, k, sampling threshold)
+
+    Returns:
+        Dictionary with sampled k-mer keys/counts, HLL registers,
+        read-length histogram and k-mer total
+    """
+    data, k, threshold = task
+    seqs = data.split(b'\n')[1::4]
+    lengths = np.fromiter((len(s) for s in seqs), np.int64, len(seqs))
+    hashes = canonical_kmer_hashes(seqs, k)
+    sampled = hashes[hashes < np.uint64(threshold)]
+    keys, counts = np.unique(sampled, return_counts=True)
+    return {
+        'keys': keys, 'counts': counts.astype(np.uint32),
+        'hll': hll_ranks(hashes),
+        'lengths': np.bincount(lengths),
+        'kmers': hashes.size,
+    }
+
+
+# ==============================================
+# Aggregation (main process)
+# ==============================================
+class SampledKmerTable:
+    """Exact counts for k-mers whose hash is below an adaptive threshold."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.threshold = int(UINT64_MAX)
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.counts = np.empty(0, dtype=np.uint32)
+        self.buffer: List[Tuple[np.ndarray, np.ndarray]] = []
+        self.buffered = 0
+
+    @property
+    def rate(self) -> float:
+        return self.threshold / float(UINT64_MAX)
+
+    def add(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        self.buffer.append((keys, counts))
+        self.buffered += keys.size
+        if self.buffered > self.max_entries:
+            self.merge()
+
+    def merge(self) -> None:
+        """Fold buffered batches into the table, subsampling if it is too large."""
+        if not self.buffer:
+            return
+        keys = np.concatenate([self.keys] + [b[0] for b in self.buffer])
+        counts = np.concatenate([self.counts] + [b[1] for b in self.buffer])
+        self.buffer, self.buffered = [], 0
+
+        keep = keys < np.uint64(self.threshold)
+        keys, counts = keys[keep], counts[keep]
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts).astype(np.uint32)
+
+        while self.keys.size > self.max_entries:
+            self.threshold //= 2
+            keep = self.keys < np.uint64(self.threshold)
+            self.keys, self.counts = self.keys[keep], self.counts[keep]
+
+    def histogram(self) -> np.ndarray:
+        """Estimated number of distinct k-mers at each depth (index = depth)."""
+        self.merge()
+        depths = np.minimum(self.counts, HIST_MAX)
+        return np.bincount(depths, minlength=2) / self.rate
+
+
+def hll_estimate(registers: np.ndarray) -> float:
+    """HyperLogLog cardinality estimate with small-range correction."""
+    m = registers.size
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.power(2.0, -registers.astype(np.float64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * math.log(m / zeros)
+    return float(estimate)
+
+
+# ==============================================
+# Spectrum Analysis
+# ==============================================
+def analyze_spectrum(hist: np.ndarray, k: int, read_length: float) -> Dict[str, float]:
+    """Estimate coverage, genome size and heterozygosity from a k-mer histogram.
+
+    The error valley is the first local minimum beyond depth 2; the homozygous peak is the
+    highest peak beyond it, re-assigned to twice a lower peak when that peak
+    is a heterozygous (half-coverage) one.
+
+    Returns:
+        Dictionary of estimates (empty values are 0 if no peak is found)
+    """
+    depths = np.arange(hist.size)
+    smooth = np.convolve(hist, np.ones(3) / 3, mode='same')
+    # Depth-1 k-mers dominate the smoothed value at depth 2, so start from there
+    valley = 2
+    while valley + 1 < hist.size - 1 and smooth[valley + 1] < smooth[valley]:
+        valley += 1
+
+    result = {'valley': float(valley), 'kmer_coverage': 0.0, 'genome_size': 0.0,
+              'heterozygosity': 0.0, 'base_coverage': 0.0, 'solid_kmers': 0.0}
+    if valley >= hist.size - 2:
+        return result
+
+    region = smooth[valley:HIST_MAX]
+    peak = valley + int(np.argmax(region))
+    half = peak // 2
+    if half > valley and smooth[half] > 0.25 * smooth[peak]:
+        hom = float(peak)               # Strong half-coverage peak: heterozygous
+    elif 2 * peak < hist.size and smooth[2 * peak] > 0.25 * smooth[peak]:
+        hom = float(2 * peak)           # Highest peak was the heterozygous one
+    else:
+        hom = float(peak)
+
+    total = float(np.sum(hist[valley:] * depths[valley:]))
+    genome_size = total / hom
+    het_area = float(np.sum(hist[valley:int(0.75 * hom)]))
+    hom_area = float(np.sum(hist[int(0.75 * hom):]))
+    g_distinct = hom_area + het_area / 2
+    heterozygosity = het_area / (2 * k * g_distinct) if g_distinct else 0.0
+
+    result.update({
+        'kmer_coverage': hom,
+        'genome_size': genome_size,
+        'heterozygosity': heterozygosity,
+        'base_coverage': hom * read_length / max(read_length - k + 1, 1),
+        'solid_kmers': float(np.sum(hist[valley:])),
+    })
+    return result
+
+
+def adaptive_bbnorm_depths(stats: Dict[str, float], read_length: int,
+                           k: int) -> Tuple[int, int]:
+    """Coverage-based bbnorm target and minimum depth.
+
+    The target keeps about TARGET_BASE_COVERAGE x base coverage (never above
+    the observed depth); the minimum drops k-mers below the error valley.
+
+    Returns:
+        Tuple of (target, min)
+    """
+    kmer_per_base = max(read_length - k + 1, 1) / max(read_length, 1)
+    target = int(round(TARGET_BASE_COVERAGE * kmer_per_base))
+    if stats['kmer_coverage']:
+        target = min(target, int(stats['kmer_coverage']))
+    return max(target, 2), max(int(stats['valley']), 2)
+
+
+def suggest_parameters(stats: Dict[str, float], distinct: float, read_length: int,
+                       k: int, memory_gb: float, adaptive_bbnorm: bool) -> Dict[str, object]:
+    """Derive assembly parameters from the spectrum estimates.
+
+    bbnorm target/min stay at the pipeline's fixed DEFAULT_BBNORM_TARGET and
+    DEFAULT_BBNORM_MIN unless ``adaptive_bbnorm`` is set. Memory suggestions
+    are heuristics: ~4 bytes per distinct k-mer for bbnorm's count-min sketch
+    and ~SPADES_BYTES_PER_KMER per solid k-mer for SPAdes, each with 50%
+    headroom and capped at the available memory.
+    """
+    if adaptive_bbnorm:
+        target, minimum = adaptive_bbnorm_depths(stats, read_length, k)
+    else:
+        target, minimum = DEFAULT_BBNORM_TARGET, DEFAULT_BBNORM_MIN
+    bbnorm_gb = math.ceil(distinct * 4 * 1.5 / 1e9)
+    spades_gb = math.ceil(stats['solid_kmers'] * SPADES_BYTES_PER_KMER * 1.5 / 1e9)
+    return {
+        'READ_LENGTH': read_length,
+        'BBNORM_TARGET': target,
+        'BBNORM_MIN': minimum,
+        'BBTOOLS_MEM_GB': f"{int(min(max(bbnorm_gb, 4), memory_gb))}g",
+        'SPADES_MEM_GB': int(min(max(spades_gb, 16), memory_gb)),
+        'GENOME_SIZE': int(stats['genome_size']),
+    }
+
+
+# ==============================================
+# Main Control Flow
+# ==============================================
+def profile_reads(paths: List[str], k: int, threads: int,
+                  max_entries: int) -> Dict[str, object]:
+    """Stream all reads once and aggregate the k-mer profile.
+
+    At most ``2 * threads`` chunks are in flight. If a worker or a reader
+    fails, the producer is woken and stops, and the pool is terminated.
+    """
+    table = SampledKmerTable(max_entries)
+    registers = np.zeros(1 << HLL_P, dtype=np.uint8)
+    lengths = np.zeros(1, dtype=np.int64)
+    total_kmers = 0
+
+    in_flight = threading.Semaphore(threads * 2)
+    cancelled = threading.Event()
+
+    def tasks():
+        for chunk in iter_fastq_chunks(paths, threads * 2):
+            in_flight.acquire()
+            if cancelled.is_set():
+                return
+            yield chunk, k, table.threshold
+
+    with multiprocessing.Pool(max(1, threads)) as pool:
+        try:
+            for result in pool.imap_unordered(profile_chunk, tasks()):
+                in_flight.release()
+                table.add(result['keys'], result['counts'])
+                np.maximum(registers, result['hll'], out=registers)
+                if result['lengths'].size > lengths.size:
+                    lengths = np.pad(lengths, (0, result['lengths'].size - lengths.size))
+                lengths[:result['lengths'].size] += result['lengths']
+                total_kmers += result['kmers']
+        except BaseException:
+            cancelled.set()
+            in_flight.release()  # Wake a producer waiting for a free slot
+            raise
+
+    return {'hist': table.histogram(), 'rate': table.rate,
+            'distinct': hll_estimate(registers), 'lengths': lengths,
+            'total_kmers': total_kmers}
+
+
+def write_outputs(out_dir: str, profile: Dict[str, object], stats: Dict[str, float],
+                  params: Dict[str, object], adaptive: Tuple[int, int], k: int) -> None:
+    """Write the histogram, text report and shell-sourceable parameters."""
+    os.makedirs(out_dir, exist_ok=True)
+    hist = profile['hist']
+    with open(os.path.join(out_dir, 'khist.tsv'), 'w') as f:
+        f.write("#Depth\tCount\n")
+        for depth in np.flatnonzero(hist[1:] > 0) + 1:
+            f.write(f"{depth}\t{hist[depth]:.0f}\n")
+
+    lengths = profile['lengths']
+    n_reads = int(lengths.sum())
+    total_bases = int(np.dot(np.arange(lengths.size), lengths))
+    with open(os.path.join(out_dir, 'profile_report.txt'), 'w') as f:
+        f.write("K-mer Spectrum Profile Report\n")
+        f.write("=============================\n\n")
+        f.write(f"K-mer size:            {k}\n")
+        f.write(f"Reads:                 {n_reads}\n")
+        f.write(f"Total bases:           {total_bases}\n")
+        f.write(f"Read length mode/max:  {int(np.argmax(lengths))}/{lengths.size - 1}\n")
+        f.write(f"Mean read length:      {total_bases / max(n_reads, 1):.1f}\n")
+        f.write(f"Total k-mers:          {profile['total_kmers']}\n")
+        f.write(f"Distinct k-mers (HLL): {profile['distinct']:.0f}\n")
+        f.write(f"Sampling rate:         {profile['rate']:.6f}\n")
+        f.write(f"Error valley depth:    {stats['valley']:.0f}\n")
+        f.write(f"Homozygous peak depth: {stats['kmer_coverage']:.0f}\n")
+        f.write(f"Base coverage:         {stats['base_coverage']:.1f}x\n")
+        f.write(f"Genome size estimate:  {stats['genome_size']:.0f} bp\n")
+        f.write(f"Heterozygosity:        {stats['heterozygosity']:.4%}\n")
+        f.write(f"Coverage-based bbnorm: target={adaptive[0]} min={adaptive[1]} "
+                f"(used with --adaptive-bbnorm)\n\n")
+        f.write("Suggested parameters:\n")
+        for key, value in params.items():
+            f.write(f"  {key}={value}\n")
+
+    with open(os.path.join(out_dir, 'profile.env'), 'w') as f:
+        for key, value in params.items():
+            f.write(f'{key}="{value}"\n')
+
+
+def main():
+    """Main execution routine."""
+    parser = argparse.ArgumentParser(
+        description="Streaming k-mer spectrum profiler for assembly parametrization",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("reads", nargs='+', help="FASTQ files (optionally gzipped)")
+    parser.add_argument("-o", "--out-dir", default="kmer_profile", help="Output directory")
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="K-mer size (≤ 31)")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="Worker processes for k-mer hashing")
+    parser.add_argument("--max-entries", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Maximum sampled k-mers kept in memory")
+    parser.add_argument("--memory-gb", type=float, default=200,
+                        help="Available memory, caps the memory suggestions")
+    parser.add_argument("--adaptive-bbnorm", action="store_true",
+                        help="Write coverage-based bbnorm target/min to profile.env instead "
+                             f"of the fixed {DEFAULT_BBNORM_TARGET}/{DEFAULT_BBNORM_MIN}")
+    args = parser.parse_args()
+
+    if not 1 <= args.k <= 31:
+        sys.exit("Parameter error: k must be between 1 and 31")
+    missing = [p for p in args.reads if not os.path.exists(p)]
+    if missing:
+        sys.exit(f"Input not found: {', '.join(missing)}")
+
+    start_time = perf_counter()
+    try:
+        profile = profile_reads(args.reads, args.k, args.threads, args.max_entries)
+    except (OSError, EOFError, RuntimeError) as e:
+        sys.exit(f"Error: Failed to read input: {e}")
+    if profile['total_kmers'] == 0:
+        sys.exit("No valid k-mers found in input")
+
+    read_length = int(np.argmax(profile['lengths']))
+    mean_length = float(np.dot(np.arange(profile['lengths'].size), profile['lengths'])
+                        / profile['lengths'].sum())
+    stats = analyze_spectrum(profile['hist'], args.k, mean_length)
+    params = suggest_parameters(stats, profile['distinct'], read_length,
+                                args.k, args.memory_gb, args.adaptive_bbnorm)
+    adaptive = adaptive_bbnorm_depths(stats, read_length, args.k)
+    write_outputs(args.out_dir, profile, stats, params, adaptive, args.k)
+
+    print(f"Profiling completed in {perf_counter() - start_time:.2f}s\n"
+          f"- Genome size estimate: {stats['genome_size']:.0f} bp\n"
+          f"- Base coverage: {stats['base_coverage']:.1f}x\n"
+          f"- Heterozygosity: {stats['heterozygosity']:.4%}\n"
+          f"Results written to: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
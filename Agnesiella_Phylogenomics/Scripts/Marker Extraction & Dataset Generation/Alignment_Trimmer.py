@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Alignment Column Trimmer v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. Loads each locus alignment as a uint8 matrix (taxa × columns)
+2. Per-column gap, ambiguity, occupancy and Shannon entropy in NumPy
+3. Threshold and entropy masks applied in parallel across loci
+4. Per-locus statistics cache: changing thresholds never re-parses FASTA
+5. Trimmed alignments plus recomputed *_Partitions.txt in one run; alignments
+   written by earlier runs (listed in <prefix>_outputs.txt) for loci no longer
+   retained are removed, other files in the output directory are left alone
+
+Example:
+    python Alignment_Trimmer.py loci/ fas trimmed/ --max-gap 0.5 \\
+        --partitions SCOs_NT_80_CID_Raw_Partitions.txt --prefix SCOs_NT_80_trimmed
+"""
+
+import os
+import re
+import sys
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from time import perf_counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Constants
+DEFAULT_THREADS = min(os.cpu_count() or 4, 8)
+CACHE_VERSION = 1
+GAP_CHARS = b'-?.'
+DNA_STATES = b'ACGT'
+AA_STATES = b'ACDEFGHIKLMNPQRSTVWY'
+DNA_MIN_FRACTION = 0.9  # Fraction of ACGTUN among non-gap residues to call DNA
+
+PARTITION_PATTERN = re.compile(r"^\s*([^,\s]+)\s*,\s*(\S+)\s*=")
+
+
+class TrimParams(NamedTuple):
+    """Column mask thresholds (fractions of taxa)."""
+    max_gap: float
+    max_ambiguity: float
+    min_occupancy: float
+    max_entropy: Optional[float]
+    min_length: int
+
+
+class LocusResult(NamedTuple):
+    """Per-locus trimming summary."""
+    locus: str
+    data_type: str
+    n_taxa: int
+    raw_length: int
+    trimmed_length: int
+    cached: bool
+    error: Optional[str]
+
+
+def state_table(states: bytes) -> np.ndarray:
+    """Byte -> state index lookup (255 for gaps and ambiguity codes)."""
+    table = np.full(256, 255, dtype=np.uint8)
+    for i, b in enumerate(states):
+        table[b] = table[b + 32] = i
+    if states == DNA_STATES:
+        table[ord('U')] = table[ord('u')] = 3
+    return table
+
+
+DNA_TABLE = state_table(DNA_STATES)
+AA_TABLE = state_table(AA_STATES)
+GAP_TABLE = np.zeros(256, dtype=bool)
+GAP_TABLE[list(GAP_CHARS)] = True
+
+
+# ==============================================
+# Alignment I/O
+# ==============================================
+def read_alignment(fasta_file: str) -> Tuple[List[str], np.ndarray]:
+    """
+    Read an aligned FASTA file into a uint8 matrix.
+
+    Returns:
+        Tuple of (sequence names, matrix of shape taxa × columns)
+
+    Raises:
+        ValueError: If the file is empty or sequences differ in length
+    """
+    names, seqs, chunks = [], [], []
+    with open(fasta_file, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(b'>'):
+                if names:
+                    seqs.append(b''.join(chunks))
+                names.append(line[1:].decode())
+                chunks = []
+            elif line:
+                chunks.append(line)
+    if names:
+        seqs.append(b''.join(chunks))
+    if not names:
+        raise ValueError("no sequences")
+    if len({len(s) for s in seqs}) != 1:
+        raise ValueError("sequences are not aligned (unequal lengths)")
+    matrix = np.frombuffer(b''.join(seqs), dtype=np.uint8).reshape(len(seqs), -1)
+    return names, matrix
+
+
+def write_alignment(output_file: str, names: List[str], matrix: np.ndarray) -> None:
+    """Write a matrix as FASTA, one sequence per line."""
+    with open(output_file, 'wb') as f:
+        for name, row in zip(names, matrix):
+            f.write(b'>' + name.encode() + b'\n' + row.tobytes() + b'\n')
+
+
+def read_partitions(partition_file: str) -> List[Tuple[str, str]]:
+    """
+    Read (data type, locus) pairs from a RAxML-style partition file
+    such as ``DNA, OG0010426 = 1-1448``.
+
+    Raises:
+        ValueError: If a line cannot be parsed
+    """
+    partitions = []
+    with open(partition_file) as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            match = PARTITION_PATTERN.match(line)
+            if not match:
+                raise ValueError(f"Invalid partition at line {line_num}: {line.strip()}")
+            partitions.append((match.group(1), match.group(2)))
+    return partitions
+
+
+def write_partitions(output_file: str, entries: List[Tuple[str, str, int]]) -> None:
+    """Write consecutive partition coordinates for (data type, locus, length) entries."""
+    start = 1
+    with open(output_file, 'w') as f:
+        for data_type, locus, length in entries:
+            f.write(f"{data_type}, {locus} = {start}-{start + length - 1}\n")
+            start += length
+
+
+# ==============================================
+# Column Statistics
+# ==============================================
+def detect_type(matrix: np.ndarray) -> str:
+    """Return 'DNA' or 'AA' from the residue composition."""
+    residues = matrix[~GAP_TABLE[matrix]]
+    if residues.size == 0:
+        return 'DNA'
+    nucleotide = (DNA_TABLE[residues] != 255) | np.isin(residues, list(b'NnUu'))
+    return 'DNA' if nucleotide.mean() >= DNA_MIN_FRACTION else 'AA'
+
+
+def column_stats(matrix: np.ndarray, data_type: str) -> Dict[str, np.ndarray]:
+    """
+    Per-column gap, ambiguity and entropy statistics.
+
+    Returns:
+        Dict with 'gap' and 'ambiguity' fractions, 'valid' counts of
+        unambiguous residues and 'entropy' in bits over those residues
+    """
+    n_taxa = matrix.shape[0]
+    table = DNA_TABLE if data_type == 'DNA' else AA_TABLE
+    n_states = 4 if data_type == 'DNA' else 20
+    gaps = GAP_TABLE[matrix]
+    states = table[matrix]
+    ambiguous = (states == 255) & ~gaps
+
+    counts = np.stack([(states == s).sum(axis=0) for s in range(n_states)])
+    valid = counts.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        freqs = counts / valid
+        entropy = -np.where(counts > 0, freqs * np.log2(freqs), 0.0).sum(axis=0)
+    return {
+        'gap': gaps.sum(axis=0) / n_taxa,
+        'ambiguity': ambiguous.sum(axis=0) / n_taxa,
+        'valid': valid,
+        'entropy': entropy,
+    }
+
+
+def column_mask(stats: Dict[str, np.ndarray], n_taxa: int, params: TrimParams) -> np.ndarray:
+    """Boolean mask of columns to keep."""
+    keep = (stats['gap'] <= params.max_gap) & (stats['ambiguity'] <= params.max_ambiguity)
+    keep &= stats['valid'] >= params.min_occupancy * n_taxa
+    keep &= stats['valid'] > 0
+    if params.max_entropy is not None:
+        keep &= stats['entropy'] <= params.max_entropy
+    return keep
+
+
+# ==============================================
+# Cache
+# ==============================================
+def source_signature(path: str) -> np.ndarray:
+    """File identity used to invalidate cache entries."""
+    st = os.stat(path)
+    return np.array([CACHE_VERSION, st.st_size, st.st_mtime_ns], dtype=np.int64)
+
+
+def load_locus(path: str, cache_dir: str) -> Tuple[np.lib.npyio.NpzFile, bool]:
+    """
+    Load the cached matrix and column statistics of a locus, building the
+    cache entry from the FASTA file when it is missing or stale.
+
+    Returns:
+        Tuple of (lazily loaded npz archive, whether the cache was hit)
+    """
+    locus = os.path.splitext(os.path.basename(path))[0]
+    cache_file = os.path.join(cache_dir, f"{locus}.npz")
+    signature = source_signature(path)
+    if os.path.exists(cache_file):
+        cached = np.load(cache_file)
+        if np.array_equal(cached['signature'], signature):
+            return cached, True
+        cached.close()
+
+    names, matrix = read_alignment(path)
+    data_type = detect_type(matrix)
+    stats = column_stats(matrix, data_type)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_file, signature=signature, names=np.array(names), matrix=matrix,
+             data_type=np.array(data_type), **stats)
+    os.replace(tmp_file, cache_file)
+    return np.load(cache_file), False
+
+
+def trim_locus(path: str, cache_dir: str, params: TrimParams,
+               output_dir: Optional[str]) -> LocusResult:
+    """
+    Trim one locus; the sequence matrix is only read when writing output.
+
+    Returns:
+        LocusResult (error set instead of raising so one bad locus
+        does not stop the run)
+    """
+    locus = os.path.splitext(os.path.basename(path))[0]
+    try:
+        cached, hit = load_locus(path, cache_dir)
+        with cached:
+            stats = {key: cached[key] for key in ('gap', 'ambiguity', 'valid', 'entropy')}
+            n_taxa = len(cached['names'])
+            data_type = str(cached['data_type'])
+            keep = column_mask(stats, n_taxa, params)
+            trimmed = int(keep.sum())
+            if output_dir and trimmed >= max(params.min_length, 1):
+                write_alignment(os.path.join(output_dir, os.path.basename(path)),
+                                cached['names'].tolist(), cached['matrix'][:, keep])
+        return LocusResult(locus, data_type, n_taxa, keep.size, trimmed, hit, None)
+    except Exception as e:
+        return LocusResult(locus, '', 0, 0, 0, False, str(e))
+
+
+# ==============================================
+# Main Workflow
+# ==============================================
+def collect_loci(source_dir: str, extension: str,
+                 partitions: Optional[List[Tuple[str, str]]]) -> List[str]:
+    """
+    Locus files to process, in partition-file order when one is given.
+
+    Raises:
+        ValueError: If no files are found or a partition has no file
+    """
+    files = {os.path.splitext(os.path.basename(p))[0]: p
+             for p in glob.glob(os.path.join(source_dir, f"*.{extension}"))}
+    if not files:
+        raise ValueError(f"No *.{extension} files found in {source_dir}")
+    if partitions is None:
+        return [files[locus] for locus in sorted(files)]
+    missing = [locus for _, locus in partitions if locus not in files]
+    if missing:
+        raise ValueError(f"{len(missing)} partitions have no alignment file "
+                         f"(e.g. {missing[0]})")
+    return [files[locus] for _, locus in partitions]
+
+
+def read_manifest(path: str) -> List[str]:
+    """File names listed in an output manifest (empty if there is none)."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def remove_stale_outputs(output_dir: str, manifest_file: str, written: List[str],
+                         failed: List[str]) -> List[str]:
+    """
+    Delete alignments an earlier run wrote that this run no longer retains.
+
+    Only files listed in the manifest are candidates, and files of loci that
+    failed this time are kept (and stay listed) so an error never deletes
+    the last good alignment. The manifest is then rewritten.
+
+    Returns:
+        Names of the removed files
+    """
+    keep = set(written) | set(failed)
+    previous = read_manifest(manifest_file)
+    removed = []
+    for name in previous:
+        if name not in keep and os.path.exists(os.path.join(output_dir, name)):
+            os.remove(os.path.join(output_dir, name))
+            removed.append(name)
+    listed = set(written) | (set(previous) & set(failed))
+    tmp_file = f"{manifest_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(''.join(f"{name}\n" for name in sorted(listed)))
+    os.replace(tmp_file, manifest_file)
+    return sorted(removed)
+
+
+def main():
+    """Main execution routine."""
+    parser = argparse.ArgumentParser(
+        description="Trim gappy/ambiguous alignment columns and update partitions",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("source_dir", help="Directory of aligned locus FASTA files")
+    parser.add_argument("extension", help="Alignment file extension (without dot)")
+    parser.add_argument("output_dir", help="Directory for trimmed alignments")
+    parser.add_argument("--partitions", help="Partition file giving locus order and data types")
+    parser.add_argument("--prefix", default="Trimmed",
+                        help="Output partition file is <prefix>_Partitions.txt")
+    parser.add_argument("--max-gap", type=float, default=0.5,
+                        help="Maximum fraction of gap characters per column")
+    parser.add_argument("--max-ambiguity", type=float, default=0.5,
+                        help="Maximum fraction of ambiguity codes (N, X, ...) per column")
+    parser.add_argument("--min-occupancy", type=float, default=0.0,
+                        help="Minimum fraction of taxa with an unambiguous residue")
+    parser.add_argument("--max-entropy", type=float,
+                        help="Maximum Shannon entropy (bits) per column")
+    parser.add_argument("--min-length", type=int, default=1,
+                        help="Drop loci shorter than this after trimming")
+    parser.add_argument("--aa-model", default="LG", help="Partition label for protein loci")
+    parser.add_argument("--cache-dir", help="Column statistics cache "
+                        "(default: <output_dir>/.trim_cache)")
+    parser.add_argument("--report-only", action="store_true",
+                        help="Only report trimmed lengths; write no alignments")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="Parallel worker processes")
+    args = parser.parse_args()
+
+    for name in ('max_gap', 'max_ambiguity', 'min_occupancy'):
+        if not 0.0 <= getattr(args, name) <= 1.0:
+            sys.exit(f"Parameter error: --{name.replace('_', '-')} must be within [0, 1]")
+
+    if os.path.isdir(args.output_dir) and os.path.samefile(args.source_dir, args.output_dir):
+        sys.exit("Parameter error: output_dir must differ from source_dir")
+
+    start_time = perf_counter()
+    try:
+        partitions = read_partitions(args.partitions) if args.partitions else None
+        loci = collect_loci(args.source_dir, args.extension, partitions)
+    except (ValueError, FileNotFoundError) as e:
+        sys.exit(f"Error: {e}")
+
+    cache_dir = args.cache_dir or os.path.join(args.output_dir, ".trim_cache")
+    os.makedirs(args.output_dir, exist_ok=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    params = TrimParams(args.max_gap, args.max_ambiguity, args.min_occupancy,
+                        args.max_entropy, args.min_length)
+    output_dir = None if args.report_only else args.output_dir
+
+    print(f"Trimming {len(loci)} alignments...")
+    worker = partial(trim_locus, cache_dir=cache_dir, params=params, output_dir=output_dir)
+    with ProcessPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(worker, loci, chunksize=16))
+
+    errors = [r for r in results if r.error]
+    kept = [r for r in results
+            if not r.error and r.trimmed_length >= max(args.min_length, 1)]
+    labels = {locus: label for label, locus in partitions} if partitions else {}
+    entries = [(labels.get(r.locus, 'DNA' if r.data_type == 'DNA' else args.aa_model),
+                r.locus, r.trimmed_length) for r in kept]
+
+    report_file = os.path.join(args.output_dir, f"{args.prefix}_trim_report.tsv")
+    with open(report_file, 'w') as f:
+        f.write("locus\ttype\ttaxa\traw_length\ttrimmed_length\tretained\n")
+        for r in results:
+            if not r.error:
+                retained = r.trimmed_length / r.raw_length if r.raw_length else 0.0
+                f.write(f"{r.locus}\t{r.data_type}\t{r.n_taxa}\t{r.raw_length}\t"
+                        f"{r.trimmed_length}\t{retained:.4f}\n")
+    removed = []
+    if not args.report_only:
+        write_partitions(os.path.join(args.output_dir, f"{args.prefix}_Partitions.txt"),
+                         entries)
+        file_names = {os.path.splitext(os.path.basename(p))[0]: os.path.basename(p)
+                      for p in loci}
+        removed = remove_stale_outputs(
+            args.output_dir, os.path.join(args.output_dir, f"{args.prefix}_outputs.txt"),
+            [file_names[r.locus] for r in kept], [file_names[r.locus] for r in errors])
+
+    raw_total = sum(r.raw_length for r in results if not r.error)
+    trimmed_total = sum(length for _, _, length in entries)
+    print(f"\nStatistical Report:")
+    print(f"- Loci processed: {len(results) - len(errors)} "
+          f"({sum(r.cached for r in results)} from cache)")
+    print(f"- Loci retained: {len(kept)} (≥ {max(args.min_length, 1)} columns)")
+    if removed:
+        print(f"- Stale alignments removed: {len(removed)}")
+    print(f"- Alignment length: {raw_total} → {trimmed_total} "
+          f"({trimmed_total / raw_total:.1%} retained)" if raw_total else "- Alignment length: 0")
+    if errors:
+        print("\nProcessing errors encountered:")
+        for r in errors[:3]:
+            print(f" - {r.locus}: {r.error}")
+        if len(errors) > 3:
+            print(f" (...{len(errors) - 3} additional errors)")
+    print(f"\nTotal execution time: {perf_counter() - start_time:.2f} seconds")
+    if errors:
+        sys.exit(f"Error: {len(errors)} loci failed; their previous outputs were kept")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,8 @@
 
 set -euo pipefail
 
+SCRIPT_DIR="$(dirname "$(realpath "$0")")"
+
 # --- Usage ---
 # This script processes BUSCO results from multiple species to extract,
 # merge, and filter single-copy BUSCO sequences.
@@ -198,4 +200,16 @@ echo "Renaming complete (.fna -> .fas, .faa -> .fas)."
 FINAL_COUNT=$(find "$DIR_FILTERED_LOCI/faa" -maxdepth 1 -type f -name "*.fas" | wc -l)
 echo "Final count of filtered FAA/FAS files: $FINAL_COUNT"
 
+# --- Phase 5: Occupancy planning ---
+# Presence-absence matrix (loci x taxa), loci/length per occupancy threshold,
+# best taxa to drop and com60/com70/com80 locus lists (no files are copied).
+echo "--- Phase 5: Occupancy planning ---"
+DIR_OCCUPANCY="$DIR_OUTPUT/4-occupancy"
+if command -v python3 >/dev/null; then
+    python3 "$SCRIPT_DIR/Occupancy_Planner.py" "$DIR_RAW_LOCI/fna" fna "$DIR_OCCUPANCY" \
+        --targets 0.6 0.7 0.8 --prefix com --taxa "$DIR_OUTPUT/species.list"
+else
+    echo "Warning: python3 not found; skipping occupancy planning." >&2
+fi
+
 echo "--- Script finished successfully ---"
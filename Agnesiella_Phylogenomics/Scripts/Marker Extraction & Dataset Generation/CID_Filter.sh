@@ -8,6 +8,9 @@
 # Requirements:
 #   - realpath, Rscript, python
 #   - Calculate_CID_Distance.R and Visualize_CID_Results.py in PATH
+#
+# treefile_dir holds one <locus file>.treefile per locus, e.g. the trees/
+# directory written by Gene_Tree_Scheduler.py.
 
 set -euo pipefail
 
@@ -30,6 +33,14 @@ validate_directory() {
 # Argument validation
 [ $# -eq 4 ] || usage
 
+# Prefer the installed `phylogenomics` entry point; fall back to the script
+SCRIPT_DIR="$(dirname "$(realpath "$0")")"
+if command -v phylogenomics >/dev/null; then
+    VISUALIZE_CID=(phylogenomics visualize-cid)
+else
+    VISUALIZE_CID=(python "${SCRIPT_DIR}/Visualize_CID_Results.py")
+fi
+
 LOCI_DIR="$1"
 TREEFILE_DIR="$2"
 OUTGROUP="$3"
@@ -76,7 +87,7 @@ Rscript Calculate_CID_Distance.R "$WORKSPACE" 1-ABS_genetrees.treefile || {
     echo "R script failed"; exit 1;
 }
 
-python Visualize_CID_Results.py 3-CID_distance_matrix.csv 2-ABS_genetrees.list || {
+"${VISUALIZE_CID[@]}" 3-CID_distance_matrix.csv 2-ABS_genetrees.list || {
     echo "Python script failed"; exit 1;
 }
 
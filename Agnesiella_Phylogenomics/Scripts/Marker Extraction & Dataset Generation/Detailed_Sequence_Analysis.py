@@ -13,7 +13,7 @@ Features:
 import os
 import argparse
 import shutil
-from typing import List, Tuple, Union
+from typing import List, Optional, Tuple, Union
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from Bio import SeqIO
 from Bio.SeqRecord import SeqRecord
@@ -105,6 +105,24 @@ def filter_sequences(fasta_file: str, threshold: int) -> List[SeqRecord]:
     return [record for record in SeqIO.parse(fasta_file, "fasta")
            if len(record.seq) >= threshold]
 
+def copy_qualified_files(directory: str, threshold: float, output_dir: str) -> List[str]:
+    """Copy FASTA files whose average sequence length reaches a threshold.
+    
+    Args:
+        directory: Directory containing FASTA files
+        threshold: Minimum average sequence length
+        output_dir: Destination directory (created if missing)
+        
+    Returns:
+        Paths of the copied files
+    """
+    qualified = [path for stats, path in parallel_process_files(directory)
+                 if stats[0] > 0 and stats[1] >= threshold]
+    os.makedirs(output_dir, exist_ok=True)
+    for path in qualified:
+        shutil.copy2(path, output_dir)
+    return qualified
+
 def safe_write_output(records: List[SeqRecord], output_path: str) -> None:
     """Safely write sequences to output file with directory validation.
     
@@ -112,7 +130,7 @@ def safe_write_output(records: List[SeqRecord], output_path: str) -> None:
         records: List of SeqRecord objects to write
         output_path: Target output file path
     """
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
     with open(output_path, 'w') as handle:
         SeqIO.write(records, handle, "fasta")
 
@@ -135,6 +153,40 @@ def directory_analysis(directory: str) -> None:
     print(f"Average Locus Length: {total_sites/loci_count:.2f}" if loci_count else "No valid files")
     print(f"Size Range: [{min(lengths)} - {max(lengths)}]" if lengths else "No data")
 
+def ask(prompt: str) -> str:
+    """Read an interactive answer; end of input (no terminal) counts as no answer.
+    
+    Args:
+        prompt: Text shown to the user
+        
+    Returns:
+        Stripped answer, or an empty string at end of input
+    """
+    try:
+        return input(prompt).strip()
+    except EOFError:
+        return ''
+
+def ask_target(threshold_prompt: str, path_prompt: str) -> Optional[Tuple[int, str]]:
+    """Ask for a length threshold and an output path.
+    
+    Args:
+        threshold_prompt: Prompt for the integer threshold
+        path_prompt: Prompt for the output path
+        
+    Returns:
+        (threshold, path), or None if either answer is missing or invalid
+    """
+    answer = ask(threshold_prompt)
+    if not answer.isdigit():
+        print(f"Invalid threshold: {answer!r}" if answer else "No threshold specified")
+        return None
+    path = ask(path_prompt)
+    if not path:
+        print("No output path specified")
+        return None
+    return int(answer), path
+
 def handle_user_choices(input_path: str, is_directory: bool) -> None:
     """Manage interactive user prompts for file operations.
     
@@ -143,17 +195,17 @@ def handle_user_choices(input_path: str, is_directory: bool) -> None:
         is_directory: Flag for directory vs file processing
     """
     if is_directory:
-        choice = input("Copy files with average length threshold? [y/n]: ").lower()
-        if choice == 'y':
-            threshold = int(input("Minimum average length: "))
-            output_dir = input("Output directory: ")
+        choice = ask("Copy files with average length threshold? [y/n]: ").lower()
+        target = choice == 'y' and ask_target("Minimum average length: ", "Output directory: ")
+        if target:
+            threshold, output_dir = target
             copied = copy_qualified_files(input_path, threshold, output_dir)
             print(f"Copied {len(copied)} files to {output_dir}")
     else:
-        choice = input("Extract long sequences? [y/n]: ").lower()
-        if choice == 'y':
-            threshold = int(input("Minimum sequence length: "))
-            output_file = input("Output file path: ")
+        choice = ask("Extract long sequences? [y/n]: ").lower()
+        target = choice == 'y' and ask_target("Minimum sequence length: ", "Output file path: ")
+        if target:
+            threshold, output_file = target
             records = filter_sequences(input_path, threshold)
             safe_write_output(records, output_file)
             print(f"Saved {len(records)} sequences to {output_file}")
@@ -165,6 +217,8 @@ def main():
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
     parser.add_argument("inputs", nargs="+", help="FASTA files/directories to process")
+    parser.add_argument("--no-prompt", action="store_true",
+                        help="Report statistics only, without copy/extract prompts")
     args = parser.parse_args()
 
     for path in args.inputs:
@@ -174,14 +228,16 @@ def main():
             
         if os.path.isdir(path):
             directory_analysis(path)
-            handle_user_choices(path, is_directory=True)
+            if not args.no_prompt:
+                handle_user_choices(path, is_directory=True)
         else:
             try:
                 stats = calculate_fasta_stats(path)
                 print(f"\nFile Analysis: {path}")
                 print(f"Sequences: {stats[0]}\nAvg Length: {stats[1]:.1f}")
                 print(f"Total Length: {stats[2]}\nSize Range: [{stats[3]} - {stats[4]}]")
-                handle_user_choices(path, is_directory=False)
+                if not args.no_prompt:
+                    handle_user_choices(path, is_directory=False)
             except Exception as e:
                 print(f"Error processing {path}: {str(e)}")
 
@@ -60,6 +60,16 @@ def copy_validated_files(file_list, dest_dir, max_workers):
     
     return success, errors
 
+def ask(prompt):
+    """
+    Read an interactive answer; end of input (no terminal, batch mode)
+    counts as an empty answer.
+    """
+    try:
+        return input(prompt)
+    except EOFError:
+        return ''
+
 def validate_arguments(source_dir, target_ext, threshold):
     """Perform parameter validation checks"""
     if not os.path.isdir(source_dir):
@@ -80,6 +90,10 @@ def main():
     parser.add_argument("threshold", type=int, help="Minimum sequence count")
     parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
                        help="Maximum parallel processing threads")
+    parser.add_argument("--copy-to", metavar="DIR",
+                       help="Copy validated files to DIR without prompting")
+    parser.add_argument("--no-prompt", action="store_true",
+                       help="Never prompt (skip copying unless --copy-to is given)")
     
     args = parser.parse_args()
     
@@ -129,20 +143,22 @@ def main():
             print(f" (...{len(error_list)-3} additional errors)")
 
     if valid_count > 0:
-        if input("\nCopy validated files? [y/N]: ").lower() == 'y':
-            dest_dir = input("Destination directory path: ").strip()
-            if dest_dir:
-                copy_start = perf_counter()
-                copied, copy_errors = copy_validated_files(
-                    valid_files, dest_dir, args.threads
-                )
-                copy_time = perf_counter() - copy_start
-                
-                print(f"\nCopied {copied}/{valid_count} files in {copy_time:.2f}s")
-                if copy_errors:
-                    print(f"Copy errors: {len(copy_errors)}")
-            else:
+        dest_dir = args.copy_to
+        if not dest_dir and not args.no_prompt \
+                and ask("\nCopy validated files? [y/N]: ").lower() == 'y':
+            dest_dir = ask("Destination directory path: ").strip()
+            if not dest_dir:
                 print("No destination directory specified")
+        if dest_dir:
+            copy_start = perf_counter()
+            copied, copy_errors = copy_validated_files(
+                valid_files, dest_dir, args.threads
+            )
+            copy_time = perf_counter() - copy_start
+            
+            print(f"\nCopied {copied}/{valid_count} files in {copy_time:.2f}s")
+            if copy_errors:
+                print(f"Copy errors: {len(copy_errors)}")
     
     total_time = perf_counter() - start_time
     print(f"\nTotal execution time: {total_time:.2f} seconds")
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Gene Tree Batch Scheduler v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. Quick scan of every locus: taxa, alignment length, distinct site patterns
+2. Cost ranking (taxa × patterns); largest loci first with more threads
+3. Small loci packed into multi-locus batches run by one worker
+4. Thread-budget dispatcher keeping all cores busy, with a bounded wait for
+   large loci (backfilling stops once the next large job has waited too long)
+5. Resumable (finished .treefile outputs are skipped) with per-locus timing
+6. Pluggable tree-inference command template
+
+Trees are written as <tree_dir>/<locus file>.treefile, the layout expected by
+CID_Filter.sh, and concatenated into 1-ABS_genetrees.treefile for CID/QuIBL:
+    python Gene_Tree_Scheduler.py loci/ fas genetrees/ --threads 64
+"""
+
+import os
+import sys
+import glob
+import shlex
+import argparse
+import subprocess
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+
+# Constants
+DEFAULT_THREADS = os.cpu_count() or 4
+DEFAULT_COMMAND = ("iqtree2 -s {alignment} -m MFP -B 1000 -T {threads} "
+                   "--prefix {prefix} -redo -quiet")
+CONCAT_NAME = "1-ABS_genetrees.treefile"
+TIMING_NAME = "scheduler_timing.tsv"
+DEFAULT_BACKFILL_WAIT = 300  # Seconds a blocked job waits before threads are reserved
+
+
+class Locus(NamedTuple):
+    """Alignment summary from the quick scan."""
+    path: str
+    n_taxa: int
+    length: int
+    patterns: int
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def cost(self) -> int:
+        return self.n_taxa * self.patterns
+
+
+class Job(NamedTuple):
+    """Loci run back to back by one worker with a fixed thread count."""
+    loci: List[Locus]
+    threads: int
+
+    @property
+    def cost(self) -> int:
+        return sum(locus.cost for locus in self.loci)
+
+
+# ==============================================
+# Locus Scan
+# ==============================================
+def scan_locus(path: str) -> Locus:
+    """
+    Count taxa, columns and distinct site patterns of an aligned FASTA file.
+
+    Raises:
+        ValueError: If the file is empty or sequences differ in length
+    """
+    n_headers, seqs, chunks = 0, [], []
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(b'>'):
+                if n_headers:
+                    seqs.append(b''.join(chunks).upper())
+                n_headers += 1
+                chunks = []
+            elif line:
+                chunks.append(line)
+    if not n_headers:
+        raise ValueError(f"No sequences in {path}")
+    seqs.append(b''.join(chunks).upper())
+    if len({len(s) for s in seqs}) != 1:
+        raise ValueError(f"Sequences are not aligned in {path}")
+
+    matrix = np.frombuffer(b''.join(seqs), dtype=np.uint8).reshape(len(seqs), -1)
+    columns = np.ascontiguousarray(matrix.T).view(f"V{matrix.shape[0]}").ravel()
+    return Locus(path, matrix.shape[0], matrix.shape[1], np.unique(columns).size)
+
+
+def scan_loci(paths: List[str], max_workers: int) -> Tuple[List[Locus], List[Tuple[str, str]]]:
+    """Scan loci in parallel; returns (loci, errors)."""
+    loci, errors = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(scan_locus, p): p for p in paths}
+        for future, path in futures.items():
+            try:
+                loci.append(future.result())
+            except Exception as e:
+                errors.append((path, str(e)))
+    return loci, errors
+
+
+# ==============================================
+# Scheduling
+# ==============================================
+def plan_jobs(loci: List[Locus], total_threads: int, max_job_threads: int,
+              batch_cost: int) -> List[Job]:
+    """
+    Group loci into jobs ordered largest first.
+
+    Loci costing at least ``batch_cost`` run alone, with threads growing with
+    their share of the total cost (capped at ``max_job_threads``); smaller
+    loci are packed into single-thread batches of about ``batch_cost``.
+    """
+    total_cost = sum(locus.cost for locus in loci) or 1
+    fair_share = total_cost / total_threads
+    jobs, batch = [], []
+    for locus in sorted(loci, key=lambda l: l.cost, reverse=True):
+        if locus.cost >= batch_cost:
+            threads = int(min(max_job_threads, max(1, locus.cost // fair_share)))
+            jobs.append(Job([locus], threads))
+            continue
+        batch.append(locus)
+        if sum(l.cost for l in batch) >= batch_cost:
+            jobs.append(Job(batch, 1))
+            batch = []
+    if batch:
+        jobs.append(Job(batch, 1))
+    return sorted(jobs, key=lambda j: (j.threads, j.cost), reverse=True)
+
+
+def tree_path(tree_dir: str, locus: Locus) -> str:
+    """Final tree file of a locus."""
+    return os.path.join(tree_dir, f"{locus.name}.treefile")
+
+
+def run_job(job: Job, command: str, tree_dir: str, timing_file: str) -> List[Tuple[str, str]]:
+    """
+    Run the tree command for every locus of a job.
+
+    A tree left by an earlier run is deleted first, so a failed rerun
+    (e.g. with --no-resume) is never mistaken for success.
+
+    Returns:
+        List of (locus, error message) for failed loci
+    """
+    errors = []
+    for locus in job.loci:
+        prefix = os.path.join(tree_dir, locus.name)
+        cmd = command.format(alignment=shlex.quote(locus.path), threads=job.threads,
+                             prefix=shlex.quote(prefix))
+        tree = tree_path(tree_dir, locus)
+        if os.path.exists(tree):
+            os.remove(tree)
+        start = perf_counter()
+        result = subprocess.run(cmd, shell=True, stdout=subprocess.DEVNULL,
+                                stderr=subprocess.PIPE, text=True)
+        elapsed = perf_counter() - start
+        ok = result.returncode == 0 and os.path.exists(tree) and os.path.getsize(tree) > 0
+        if not ok:
+            message = result.stderr.strip().splitlines()[-1:] or [f"exit {result.returncode}"]
+            errors.append((locus.name, message[0]))
+        with open(timing_file, 'a') as f:  # Single short write per locus
+            f.write(f"{locus.name}\t{locus.n_taxa}\t{locus.length}\t{locus.patterns}\t"
+                    f"{job.threads}\t{elapsed:.2f}\t{'done' if ok else 'failed'}\n")
+    return errors
+
+
+def dispatch(jobs: List[Job], total_threads: int, command: str, tree_dir: str,
+             timing_file: str, backfill_wait: float = DEFAULT_BACKFILL_WAIT
+             ) -> List[Tuple[str, str]]:
+    """
+    Launch jobs in order whenever enough of the thread budget is free.
+
+    Later (smaller) jobs may start ahead of the first pending job when it
+    does not fit yet, so cores are not left idle while waiting. Once that
+    job has been blocked for ``backfill_wait`` seconds, backfilling stops:
+    freed threads are held for it until it starts, so a stream of small
+    jobs cannot starve it.
+
+    Returns:
+        List of (locus, error message) for failed loci
+    """
+    pending = list(jobs)
+    running = {}
+    free = total_threads
+    errors = []
+    blocked, blocked_since = None, 0.0
+    with ThreadPoolExecutor(max_workers=total_threads) as executor:
+        while pending or running:
+            for job in list(pending):
+                threads = min(job.threads, total_threads)
+                if threads > free:
+                    if job is pending[0]:
+                        if job is not blocked:
+                            blocked, blocked_since = job, perf_counter()
+                        if perf_counter() - blocked_since >= backfill_wait:
+                            break
+                    continue
+                pending.remove(job)
+                future = executor.submit(run_job, job._replace(threads=threads),
+                                         command, tree_dir, timing_file)
+                running[future] = threads
+                free -= threads
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                free += running.pop(future)
+                errors.extend(future.result())
+    return errors
+
+
+def concatenate_trees(loci: List[Locus], tree_dir: str, output_file: str) -> int:
+    """Concatenate finished trees in locus name order; returns the tree count."""
+    count = 0
+    with open(output_file, 'w') as out:
+        for locus in sorted(loci, key=lambda l: l.name):
+            path = tree_path(tree_dir, locus)
+            if os.path.exists(path) and os.path.getsize(path) > 0:
+                with open(path) as f:
+                    out.write(f.read().strip() + '\n')
+                count += 1
+    return count
+
+
+def main():
+    """Main execution routine."""
+    parser = argparse.ArgumentParser(
+        description="Size-aware scheduler for per-locus gene-tree inference",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("loci_dir", help="Directory of locus alignments")
+    parser.add_argument("extension", help="Alignment file extension (without dot)")
+    parser.add_argument("output_dir", help="Output directory")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="Total thread budget")
+    parser.add_argument("--max-job-threads", type=int, default=8,
+                        help="Maximum threads given to a single locus")
+    parser.add_argument("--batch-cost", type=int, default=50000,
+                        help="Loci below this cost (taxa × site patterns) are batched")
+    parser.add_argument("--command", default=DEFAULT_COMMAND,
+                        help="Tree command template with {alignment}, {threads} and "
+                             "{prefix}; must write {prefix}.treefile")
+    parser.add_argument("--backfill-wait", type=float, default=DEFAULT_BACKFILL_WAIT,
+                        help="Seconds a large job may wait while smaller jobs use free "
+                             "threads; afterwards threads are reserved for it")
+    parser.add_argument("--tree-dir", help="Tree directory (default: <output_dir>/trees)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Rerun loci whose tree file already exists")
+    parser.add_argument("--dry-run", action="store_true", help="Print the plan only")
+    args = parser.parse_args()
+
+    if args.threads < 1 or args.max_job_threads < 1:
+        sys.exit("Parameter error: thread counts must be ≥ 1")
+    if not os.path.isdir(args.loci_dir):
+        sys.exit(f"Error: Directory not found: {args.loci_dir}")
+
+    start_time = perf_counter()
+    paths = sorted(glob.glob(os.path.join(os.path.abspath(args.loci_dir),
+                                          f"*.{args.extension}")))
+    if not paths:
+        sys.exit(f"No *.{args.extension} files found in {args.loci_dir}")
+
+    tree_dir = os.path.abspath(args.tree_dir or os.path.join(args.output_dir, "trees"))
+    os.makedirs(tree_dir, exist_ok=True)
+    os.makedirs(args.output_dir, exist_ok=True)
+    timing_file = os.path.join(args.output_dir, TIMING_NAME)
+    if not os.path.exists(timing_file):
+        with open(timing_file, 'w') as f:
+            f.write("locus\ttaxa\tlength\tpatterns\tthreads\tseconds\tstatus\n")
+
+    loci, scan_errors = scan_loci(paths, args.threads)
+    todo = [l for l in loci if args.no_resume or not os.path.exists(tree_path(tree_dir, l))]
+    jobs = plan_jobs(todo, args.threads, args.max_job_threads, args.batch_cost)
+    print(f"Scanned {len(loci)} loci in {perf_counter() - start_time:.2f}s: "
+          f"{len(todo)} to run in {len(jobs)} jobs "
+          f"({len(loci) - len(todo)} already finished)")
+
+    if args.dry_run:
+        for job in jobs:
+            print(f"{job.threads}\t{job.cost}\t{','.join(l.name for l in job.loci)}")
+        return
+
+    errors = dispatch(jobs, args.threads, args.command, tree_dir, timing_file,
+                      args.backfill_wait)
+    concat_file = os.path.join(args.output_dir, CONCAT_NAME)
+    n_trees = concatenate_trees(loci, tree_dir, concat_file)
+
+    print(f"\nStatistical Report:")
+    print(f"- Loci scanned: {len(loci)}")
+    print(f"- Trees available: {n_trees}")
+    print(f"- Failed loci: {len(errors) + len(scan_errors)}")
+    for name, message in (scan_errors + errors)[:3]:
+        print(f" - {os.path.basename(name)}: {message}")
+    print(f"Timing written to: {timing_file}")
+    print(f"Gene trees written to: {concat_file}")
+    print(f"\nTotal execution time: {perf_counter() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
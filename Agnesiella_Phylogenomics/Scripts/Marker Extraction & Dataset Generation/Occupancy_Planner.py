@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Locus Occupancy Planner v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. One parallel scan of locus FASTA directories (BUSCO/UCE merged loci)
+2. Bit-packed loci × taxa presence matrix (replaces the free-text absence.log);
+   with --taxa, taxa missing from every locus still count towards occupancy
+3. Occupancy curve: loci retained and total alignment length per threshold
+4. Taxon-dropping sets that maximize retained loci at target occupancies
+   (sets that do not beat a smaller drop are reported but get no lists)
+5. Locus lists for chosen thresholds, written without copying files
+
+Example:
+    python Occupancy_Planner.py 2-raw_loci/fna fna 4-occupancy \\
+        --targets 0.6 0.7 0.8 --prefix com --max-drop 2 --taxa species.list
+"""
+
+import os
+import sys
+import glob
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
+from math import ceil, comb
+from time import perf_counter
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Constants
+DEFAULT_THREADS = min(os.cpu_count() or 4, 8)
+MAX_EXHAUSTIVE = 20000  # Larger drop searches fall back to greedy selection
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint16)
+
+
+class LocusScan(NamedTuple):
+    """Taxa present in one locus file and its alignment length."""
+    locus: str
+    taxa: List[str]
+    length: int
+
+
+class PresenceMatrix(NamedTuple):
+    """Bit-packed presence/absence of taxa (columns) in loci (rows)."""
+    loci: List[str]
+    taxa: List[str]
+    bits: np.ndarray      # uint8 (n_loci × ceil(n_taxa / 8)), np.packbits layout
+    lengths: np.ndarray   # int64 alignment length per locus
+
+    def unpack(self) -> np.ndarray:
+        """Boolean (n_loci × n_taxa) view of the matrix."""
+        return np.unpackbits(self.bits, axis=1, count=len(self.taxa)).astype(bool)
+
+    def counts(self) -> np.ndarray:
+        """Number of taxa present per locus."""
+        return POPCOUNT[self.bits].sum(axis=1)
+
+
+# ==============================================
+# Scanning
+# ==============================================
+def locus_name(path: str) -> str:
+    """Locus name: file name without extension."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def duplicate_loci(paths: List[str]) -> List[Tuple[str, List[str]]]:
+    """
+    Locus names shared by more than one file (e.g. across loci directories).
+
+    Returns:
+        List of (locus, paths) sorted by locus
+    """
+    by_name = {}
+    for path in paths:
+        by_name.setdefault(locus_name(path), []).append(path)
+    return sorted((name, files) for name, files in by_name.items() if len(files) > 1)
+
+
+def scan_locus(path: str) -> LocusScan:
+    """
+    Read taxon names (first header word) and the longest sequence length.
+
+    Raises:
+        ValueError: If the file has no sequences
+    """
+    with open(path, 'rb') as f:
+        records = f.read().split(b'>')[1:]
+    if not records:
+        raise ValueError("no sequences")
+    taxa, length = [], 0
+    for record in records:
+        header, _, sequence = record.partition(b'\n')
+        words = header.split()
+        if words:
+            taxa.append(words[0].decode())
+        length = max(length, len(sequence) - sequence.count(b'\n') - sequence.count(b'\r'))
+    return LocusScan(locus_name(path), taxa, length)
+
+
+def build_matrix(paths: List[str], max_workers: int, taxa: Optional[List[str]] = None
+                 ) -> Tuple[PresenceMatrix, List[Tuple[str, str]]]:
+    """
+    Scan locus files in parallel into a presence matrix.
+
+    Args:
+        paths: Locus files
+        max_workers: Parallel scanning threads
+        taxa: Full taxon set (matrix columns, in this order); None uses the
+            taxa found in the loci, so a taxon without loci is not counted
+
+    Returns:
+        Tuple of (PresenceMatrix with loci sorted by name, errors)
+
+    Raises:
+        ValueError: If a locus contains a taxon missing from ``taxa``
+    """
+    scans, errors = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(scan_locus, p): p for p in paths}
+        for future, path in futures.items():
+            try:
+                scans.append(future.result())
+            except Exception as e:
+                errors.append((path, str(e)))
+    scans.sort(key=lambda s: s.locus)
+
+    found = {t for s in scans for t in s.taxa}
+    if taxa is None:
+        taxa = sorted(found)
+    elif found - set(taxa):
+        unknown = sorted(found - set(taxa))
+        raise ValueError(f"{len(unknown)} taxa in the loci are not in the taxon list "
+                         f"(e.g. {unknown[0]})")
+    column = {t: i for i, t in enumerate(taxa)}
+    present = np.zeros((len(scans), len(taxa)), dtype=bool)
+    for row, scan in enumerate(scans):
+        present[row, [column[t] for t in scan.taxa]] = True
+    matrix = PresenceMatrix([s.locus for s in scans], taxa,
+                            np.packbits(present, axis=1),
+                            np.array([s.length for s in scans], dtype=np.int64))
+    return matrix, errors
+
+
+# ==============================================
+# Planning
+# ==============================================
+def min_taxa_for(occupancy: float, n_taxa: int) -> int:
+    """Minimum taxa present for a locus to meet an occupancy fraction."""
+    return max(1, ceil(occupancy * n_taxa - 1e-9))
+
+
+def occupancy_curve(matrix: PresenceMatrix) -> List[Tuple[int, float, int, int]]:
+    """
+    Loci retained and total length for every minimum taxon count.
+
+    Returns:
+        List of (min_taxa, occupancy, loci, total_length), min_taxa = 1..n_taxa
+    """
+    counts = matrix.counts()
+    n_taxa = len(matrix.taxa)
+    loci = np.bincount(counts, minlength=n_taxa + 1)[::-1].cumsum()[::-1]
+    length = np.bincount(counts, weights=matrix.lengths, minlength=n_taxa + 1)[::-1].cumsum()[::-1]
+    return [(k, k / n_taxa, int(loci[k]), int(length[k])) for k in range(1, n_taxa + 1)]
+
+
+def retained_after_drop(present: np.ndarray, counts: np.ndarray,
+                        drop: Sequence[int], occupancy: float) -> np.ndarray:
+    """Mask of loci meeting the occupancy after dropping taxon columns."""
+    remaining = present.shape[1] - len(drop)
+    kept_counts = counts - present[:, list(drop)].sum(axis=1) if drop else counts
+    return kept_counts >= min_taxa_for(occupancy, remaining)
+
+
+def best_drop_sets(matrix: PresenceMatrix, occupancy: float, max_drop: int
+                   ) -> List[Tuple[Tuple[int, ...], int]]:
+    """
+    Best taxon set to drop for each size 0..max_drop.
+
+    Sizes with at most MAX_EXHAUSTIVE combinations are searched exhaustively;
+    larger ones extend the previous best set greedily.
+
+    Returns:
+        List of (dropped taxon indices, loci retained)
+    """
+    present = matrix.unpack()
+    counts = present.sum(axis=1)
+    n_taxa = len(matrix.taxa)
+    results = [((), int(retained_after_drop(present, counts, (), occupancy).sum()))]
+    for size in range(1, min(max_drop, n_taxa - 1) + 1):
+        if comb(n_taxa, size) <= MAX_EXHAUSTIVE:
+            candidates = combinations(range(n_taxa), size)
+        else:
+            previous = results[-1][0]
+            candidates = (previous + (t,) for t in range(n_taxa) if t not in previous)
+        best = max(((drop, int(retained_after_drop(present, counts, drop, occupancy).sum()))
+                    for drop in candidates), key=lambda item: item[1])
+        results.append(best)
+    return results
+
+
+# ==============================================
+# Output
+# ==============================================
+def write_matrix(output_dir: str, matrix: PresenceMatrix) -> None:
+    """Write the packed matrix (.npz) and a readable 0/1 table."""
+    np.savez(os.path.join(output_dir, "presence_matrix.npz"), bits=matrix.bits,
+             lengths=matrix.lengths, loci=np.array(matrix.loci), taxa=np.array(matrix.taxa))
+    present = matrix.unpack()
+    with open(os.path.join(output_dir, "presence_matrix.tsv"), 'w') as f:
+        f.write("locus\tlength\t" + "\t".join(matrix.taxa) + "\n")
+        for locus, length, row in zip(matrix.loci, matrix.lengths, present.astype(np.uint8)):
+            f.write(f"{locus}\t{length}\t" + "\t".join(map(str, row.tolist())) + "\n")
+
+
+def write_list(path: str, names: List[str]) -> None:
+    """Write one name per line."""
+    with open(path, 'w') as f:
+        f.write(''.join(f"{name}\n" for name in names))
+
+
+def main():
+    """Main execution routine."""
+    parser = argparse.ArgumentParser(
+        description="Locus presence-absence matrix and occupancy planner",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("loci_dir", nargs='+', help="Locus FASTA directories")
+    parser.add_argument("extension", help="Locus file extension (without dot)")
+    parser.add_argument("output_dir", help="Directory for matrix, report and lists")
+    parser.add_argument("--targets", type=float, nargs='+', default=[0.6, 0.7, 0.8],
+                        help="Occupancy fractions to write locus lists for")
+    parser.add_argument("--prefix", default="com",
+                        help="Locus lists are named <prefix><percent>.list")
+    parser.add_argument("--max-drop", type=int, default=2,
+                        help="Largest taxon set considered for dropping")
+    parser.add_argument("--taxa", help="File listing all taxa, one per line (e.g. "
+                        "species.list); taxa absent from every locus still count "
+                        "towards occupancy")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="Parallel scanning threads")
+    args = parser.parse_args()
+
+    if any(not 0.0 < t <= 1.0 for t in args.targets):
+        sys.exit("Parameter error: --targets must be within (0, 1]")
+    for directory in args.loci_dir:
+        if not os.path.isdir(directory):
+            sys.exit(f"Error: Directory not found: {directory}")
+    paths = [p for d in args.loci_dir for p in glob.glob(os.path.join(d, f"*.{args.extension}"))]
+    if not paths:
+        sys.exit(f"No *.{args.extension} files found in {', '.join(args.loci_dir)}")
+    duplicates = duplicate_loci(paths)
+    if duplicates:
+        name, files = duplicates[0]
+        sys.exit(f"Error: {len(duplicates)} locus name(s) found in more than one file, "
+                 f"e.g. {name}: {', '.join(files)}")
+
+    taxa = None
+    if args.taxa:
+        try:
+            with open(args.taxa, 'r') as f:
+                taxa = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+        except FileNotFoundError:
+            sys.exit(f"Error: Taxon list not found: {args.taxa}")
+        if not taxa:
+            sys.exit(f"Error: No taxa listed in {args.taxa}")
+
+    start_time = perf_counter()
+    try:
+        matrix, errors = build_matrix(paths, args.threads, taxa)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    if not matrix.loci:
+        sys.exit("Error: no readable loci")
+    absent = [t for t, n in zip(matrix.taxa, matrix.unpack().sum(axis=0)) if n == 0]
+    if absent:
+        print(f"Warning: {len(absent)} taxa have no loci and lower every occupancy: "
+              f"{', '.join(absent)}", file=sys.stderr)
+    os.makedirs(args.output_dir, exist_ok=True)
+    write_matrix(args.output_dir, matrix)
+    scan_time = perf_counter() - start_time
+
+    curve = occupancy_curve(matrix)
+    with open(os.path.join(args.output_dir, "occupancy_curve.tsv"), 'w') as f:
+        f.write("min_taxa\toccupancy\tloci\ttotal_length\n")
+        for k, occupancy, loci, length in curve:
+            f.write(f"{k}\t{occupancy:.4f}\t{loci}\t{length}\n")
+
+    present = matrix.unpack()
+    counts = present.sum(axis=1)
+    plan = []
+    for target in args.targets:
+        tag = f"{args.prefix}{round(target * 100)}"
+        best = -1
+        for drop, retained in best_drop_sets(matrix, target, args.max_drop):
+            dropped = [matrix.taxa[i] for i in drop]
+            name = tag + ''.join(f"_drop-{t}" for t in dropped)
+            mask = retained_after_drop(present, counts, drop, target)
+            # Dropping taxa only pays off if more loci survive than with a smaller drop
+            improves = retained > best
+            if improves:
+                best = retained
+                write_list(os.path.join(args.output_dir, f"{name}.list"),
+                           [locus for locus, keep in zip(matrix.loci, mask) if keep])
+                if drop:
+                    write_list(os.path.join(args.output_dir, f"{name}.taxa"),
+                               [t for t in matrix.taxa if t not in dropped])
+            plan.append((tag, dropped, retained, int(matrix.lengths[mask].sum()),
+                         f"{name}.list" if improves else "-"))
+    with open(os.path.join(args.output_dir, "occupancy_plan.tsv"), 'w') as f:
+        f.write("target\tn_dropped\tdropped_taxa\tloci\ttotal_length\tlist\n")
+        for tag, dropped, retained, length, list_file in plan:
+            f.write(f"{tag}\t{len(dropped)}\t{','.join(dropped) or '-'}\t{retained}\t"
+                    f"{length}\t{list_file}\n")
+
+    print(f"\nStatistical Report:")
+    print(f"- Loci scanned: {len(matrix.loci)} in {scan_time:.2f}s "
+          f"({len(matrix.taxa)} taxa)")
+    if absent:
+        print(f"- Taxa without loci: {len(absent)} ({', '.join(absent)})")
+    for tag, dropped, retained, length, list_file in plan:
+        label = f"{tag} (drop {', '.join(dropped)})" if dropped else tag
+        note = "" if list_file != "-" else " (no gain over a smaller drop, no list written)"
+        print(f"- {label}: {retained} loci, {length} sites{note}")
+    if errors:
+        print(f"- Unreadable files: {len(errors)}")
+        for path, message in errors[:3]:
+            print(f" - {os.path.basename(path)}: {message}")
+    print(f"Results written to: {args.output_dir}")
+    print(f"\nTotal execution time: {perf_counter() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
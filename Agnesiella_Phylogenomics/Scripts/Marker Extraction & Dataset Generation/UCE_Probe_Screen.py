@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# UCE Probe Redundancy Screen v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. In-memory k-mer index over all probes (both strands)
+2. Seed-and-verify screening: shared k-mers on a common diagonal, then a
+   vectorized banded affine-gap local alignment around that diagonal
+3. LASTZ "general" output accepted by
+   phyluce_probe_remove_duplicate_hits_from_probes_using_lastz
+4. Optional list of probe loci with cross-locus hits
+
+Replaces the phyluce_probe_easy_lastz self-comparison of a probe set:
+    python UCE_Probe_Screen.py probes.fasta --identity 50 --coverage 50 \\
+        -o probes-TO-SELF-PROBES.lastz
+"""
+
+import re
+import sys
+import argparse
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# Constants
+DEFAULT_K = 12
+DEFAULT_MIN_SEEDS = 2
+DEFAULT_MAX_OCCURRENCE = 64   # K-mers seen more often are masked (low complexity)
+DEFAULT_MIN_SCORE = 30        # About LASTZ's default gapped threshold (3000 HOXD70 units)
+VERIFY_CELLS = 4000000        # DP cells per NumPy batch (bounds batch memory)
+BAND = 16                     # Diagonals searched either side of the seed diagonal
+GAP_OPEN = 3                  # A gap of g bases scores -(GAP_OPEN + GAP_EXTEND * g)
+GAP_EXTEND = 1
+NEG = -(1 << 20)
+PAD = 4
+
+BASE_CODES = np.full(256, PAD, dtype=np.uint8)
+for _i, _b in enumerate(b'ACGT'):
+    BASE_CODES[_b] = BASE_CODES[_b + 32] = _i
+
+
+# ==============================================
+# Probe Loading
+# ==============================================
+def read_probes(fasta_file: str) -> Tuple[List[str], List[bytes]]:
+    """Read probe headers (without '>') and sequences from a FASTA file.
+
+    Raises:
+        FileNotFoundError: If input file doesn't exist
+        ValueError: If no sequences are found
+    """
+    names, seqs, chunks = [], [], []
+    with open(fasta_file, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(b'>'):
+                if names:
+                    seqs.append(b''.join(chunks))
+                names.append(line[1:].decode())
+                chunks = []
+            elif line:
+                chunks.append(line)
+    if names:
+        seqs.append(b''.join(chunks))
+    if not names:
+        raise ValueError(f"No sequences found in {fasta_file}")
+    return names, seqs
+
+
+def encode_probes(seqs: List[bytes]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Encode probes as padded 2-bit code matrices for both strands.
+
+    Returns:
+        Tuple of (forward matrix, reverse-complement matrix, lengths); both
+        matrices are left-aligned and padded with PAD
+    """
+    lengths = np.array([len(s) for s in seqs], dtype=np.int64)
+    width = int(lengths.max())
+    forward = np.full((len(seqs), width), PAD, dtype=np.uint8)
+    reverse = np.full((len(seqs), width), PAD, dtype=np.uint8)
+    for i, seq in enumerate(seqs):
+        codes = BASE_CODES[np.frombuffer(seq, dtype=np.uint8)]
+        forward[i, :codes.size] = codes
+        reverse[i, :codes.size] = np.where(codes == PAD, PAD, 3 - codes)[::-1]
+    return forward, reverse, lengths
+
+
+# ==============================================
+# K-mer Index and Candidate Pairs
+# ==============================================
+def kmer_entries(matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """List every valid k-mer of a code matrix.
+
+    Returns:
+        Tuple of (k-mer values, probe indices, start positions)
+    """
+    n_pos = matrix.shape[1] - k + 1
+    if n_pos <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty.astype(np.uint64), empty, empty
+    values = np.zeros((matrix.shape[0], n_pos), dtype=np.uint64)
+    padded = np.zeros((matrix.shape[0], n_pos), dtype=bool)
+    for j in range(k):
+        column = matrix[:, j:j + n_pos]
+        values = (values << np.uint64(2)) | (column & 3).astype(np.uint64)
+        padded |= column == PAD
+    probe, pos = np.nonzero(~padded)
+    return values[probe, pos], probe, pos
+
+
+def candidate_pairs(forward: np.ndarray, reverse: np.ndarray, k: int, min_seeds: int,
+                    max_occurrence: int) -> Tuple[np.ndarray, ...]:
+    """Find probe pairs sharing at least ``min_seeds`` k-mers on one diagonal.
+
+    Forward k-mers of every probe are matched against forward (+ strand) and
+    reverse-complement (- strand) k-mers of all others. Each unordered pair is
+    reported once per strand, with the lower index as the forward target.
+
+    Returns:
+        Tuple of (target, query, strand, diagonal) arrays; strand is 0 for +
+        and 1 for -, diagonal is target position minus query position
+    """
+    fk, fp, fpos = kmer_entries(forward, k)
+    rk, rp, rpos = kmer_entries(reverse, k)
+    kmers = np.concatenate([fk, rk])
+    probe = np.concatenate([fp, rp])
+    pos = np.concatenate([fpos, rpos])
+    strand = np.concatenate([np.zeros(fk.size, np.int8), np.ones(rk.size, np.int8)])
+
+    order = np.argsort(kmers, kind='stable')
+    kmers, probe, pos, strand = kmers[order], probe[order], pos[order], strand[order]
+    _, first, counts = np.unique(kmers, return_index=True, return_counts=True)
+    keep = np.repeat(counts <= max_occurrence, counts)
+    kmers, probe, pos, strand = kmers[keep], probe[keep], pos[keep], strand[keep]
+
+    left, right = [], []
+    for d in range(1, max_occurrence):
+        same = np.flatnonzero(kmers[:-d] == kmers[d:])
+        if same.size == 0:
+            break
+        left.append(same)
+        right.append(same + d)
+    if not left:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty
+    x, y = np.concatenate(left), np.concatenate(right)
+
+    # Orient so the target is the forward-strand entry with the lower index
+    sx, sy = strand[x], strand[y]
+    swap = (sx == 1) | ((sx == sy) & (probe[x] > probe[y]))
+    t = np.where(swap, y, x)
+    q = np.where(swap, x, y)
+    valid = (strand[t] == 0) & (probe[t] != probe[q])
+    valid &= (strand[q] == 0) | (probe[t] < probe[q])
+    t, q = t[valid], q[valid]
+
+    n = forward.shape[0]
+    span = 2 * forward.shape[1] + 1
+    diag = pos[t] - pos[q]
+    key = ((probe[t] * n + probe[q]) * 2 + strand[q]) * span + (diag + forward.shape[1])
+    keys, seeds = np.unique(key, return_counts=True)
+    keys, seeds = keys[seeds >= min_seeds], seeds[seeds >= min_seeds]
+
+    # Best-supported diagonal per (target, query, strand)
+    pair = keys // span
+    order = np.lexsort((-seeds, pair))
+    keys, pair = keys[order], pair[order]
+    first = np.ones(pair.size, dtype=bool)
+    first[1:] = pair[1:] != pair[:-1]
+    keys = keys[first]
+
+    diag = keys % span - forward.shape[1]
+    pair = keys // span
+    query_strand = pair % 2
+    pair //= 2
+    return pair // n, pair % n, query_strand, diag
+
+
+# ==============================================
+# Vectorized Verification
+# ==============================================
+def batch_size(width: int) -> int:
+    """Candidate pairs per batch so one batch holds at most VERIFY_CELLS DP cells."""
+    return max(1, VERIFY_CELLS // ((width + 1) * (2 * BAND + 1)))
+
+
+def align_pairs(forward: np.ndarray, reverse: np.ndarray, lengths: np.ndarray,
+                target: np.ndarray, query: np.ndarray, strand: np.ndarray,
+                diag: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """Banded gapped local alignment of each pair around its seed diagonal.
+
+    Smith-Waterman with affine gaps (match +1, mismatch -1, a gap of g bases
+    -(GAP_OPEN + GAP_EXTEND * g)) restricted to BAND diagonals either side of
+    the seed diagonal, so duplicates differing by small indels align end to
+    end. All pairs are aligned at once, one query row per step; horizontal
+    gaps within a row come from a running maximum.
+
+    Returns:
+        Tuple of (score, t_start, t_end, q_start, q_end, matches, mismatches,
+        ops, runs); query coordinates are on the aligned strand and ops/runs
+        hold the reversed CIGAR operations (0 none, 1 M, 2 I, 3 D) per pair
+    """
+    n = target.size
+    width = forward.shape[1]
+    band = np.arange(2 * BAND + 1)
+    rows = np.arange(n)
+    targets = forward[target]
+    queries = np.where(strand[:, None] == 0, forward[query], reverse[query])
+    len_t = lengths[target][:, None]
+    len_q = lengths[query]
+    offset = diag[:, None] - BAND + band          # Target minus query position per band cell
+
+    H = np.where((offset >= 0) & (offset <= len_t), 0, NEG).astype(np.int32)
+    F = np.full_like(H, NEG)
+    pointers = np.zeros((width + 1,) + H.shape, np.uint8)
+    e_from = np.zeros((width + 1,) + H.shape, np.uint8)
+    best = np.zeros(n, np.int32)
+    best_i = np.zeros(n, np.int64)
+    best_b = np.zeros(n, np.int64)
+    for i in range(1, width + 1):
+        j = offset + i
+        in_query = (i <= len_q)[:, None]
+        valid = (j >= 1) & (j <= len_t) & in_query
+        t_codes = targets[rows[:, None], np.clip(j - 1, 0, width - 1)]
+        q_codes = queries[:, i - 1][:, None]
+        from_diag = H + np.where((t_codes == q_codes) & (q_codes != PAD), 1, -1)
+
+        # Vertical gap (query base against a target gap) from the row above
+        f_open = np.full_like(H, NEG)
+        f_extend = np.full_like(H, NEG)
+        f_open[:, :-1] = H[:, 1:] - GAP_OPEN - GAP_EXTEND
+        f_extend[:, :-1] = F[:, 1:] - GAP_EXTEND
+        F = np.where(valid, np.maximum(f_open, f_extend), NEG)
+
+        h0 = np.maximum(from_diag, F)
+        source = np.where(valid & (h0 > 0), np.where(from_diag >= F, 1, 2), 0)
+        h0 = np.where(valid, np.maximum(h0, 0), np.where((j == 0) & in_query, 0, NEG))
+
+        # Horizontal gap (target bases against a query gap) within this row
+        key = h0 + GAP_EXTEND * band
+        running = np.maximum.accumulate(key, axis=1)
+        argmax = np.maximum.accumulate(np.where(key == running, band, 0), axis=1)
+        E = np.full_like(H, NEG)
+        E[:, 1:] = running[:, :-1] - GAP_OPEN - GAP_EXTEND * band[1:]
+        use_e = valid & (E > h0)
+        H = np.where(use_e, E, h0).astype(np.int32)
+
+        pointers[i] = source | (use_e << 2) | ((f_extend > f_open) << 3)
+        e_from[i, :, 1:] = argmax[:, :-1]
+        row_best = H.max(axis=1)
+        better = row_best > best
+        best = np.where(better, row_best, best)
+        best_i = np.where(better, i, best_i)
+        best_b = np.where(better, H.argmax(axis=1), best_b)
+
+    # Traceback of all pairs in step; mode 0 = H cell, 1 = H without E, 2 = F cell
+    i, b = best_i.copy(), best_b.copy()
+    t_end = best_i + offset[rows, best_b]
+    q_end = best_i.copy()
+    mode = np.zeros(n, np.int8)
+    active = best > 0
+    matches = np.zeros(n, np.int64)
+    mismatches = np.zeros(n, np.int64)
+    ops, runs = [], []
+    while active.any():
+        p = pointers[i, rows, b]
+        in_h = active & (mode < 2)
+        take_e = in_h & (mode == 0) & (p & 4 > 0)
+        go_diag = in_h & ~take_e & (p & 3 == 1)
+        to_f = in_h & ~take_e & (p & 3 == 2)
+        in_f = active & (mode == 2)
+        active &= ~(in_h & ~take_e & (p & 3 == 0))
+
+        j = i + offset[rows, b]
+        q_codes = queries[rows, np.maximum(i - 1, 0)]
+        same = (q_codes == targets[rows, np.clip(j - 1, 0, width - 1)]) & (q_codes != PAD)
+        matches += go_diag & same
+        mismatches += go_diag & ~same
+        gap = np.where(take_e, b - e_from[i, rows, b], 0)
+        ops.append(np.select([go_diag, in_f, take_e], [1, 2, 3], 0).astype(np.uint8))
+        runs.append(np.where(take_e, gap, go_diag | in_f).astype(np.int16))
+
+        b = np.where(take_e, b - gap, np.where(in_f, b + 1, b))
+        i = np.where(go_diag | in_f, i - 1, i)
+        mode = np.select([take_e, to_f, in_f & (p & 8 > 0)], [1, 2, 2], 0).astype(np.int8)
+
+    t_start = i + offset[rows, b]
+    empty = np.zeros((n, 0), np.uint8)
+    ops = np.stack(ops, axis=1) if ops else empty
+    runs = np.stack(runs, axis=1) if runs else empty.astype(np.int16)
+    return best, t_start, t_end, i, q_end, matches, mismatches, ops, runs
+
+
+def cigar_string(ops: np.ndarray, runs: np.ndarray) -> str:
+    """CIGAR from reversed traceback operations, merging equal neighbours."""
+    parts = []
+    for op, run in zip(ops[::-1].tolist(), runs[::-1].tolist()):
+        if not op:
+            continue
+        if parts and parts[-1][0] == op:
+            parts[-1][1] += run
+        else:
+            parts.append([op, run])
+    return ''.join(f"{run}{' MID'[op]}" for op, run in parts)
+
+
+def screen_probes(seqs: List[bytes], k: int, min_seeds: int, max_occurrence: int,
+                  identity: float, coverage: float,
+                  min_score: int = DEFAULT_MIN_SCORE) -> List[Tuple]:
+    """Screen a probe set against itself.
+
+    Identity is matches / (matches + mismatches) as in LASTZ. Every positive
+    scoring alignment under +1/-1 scoring is already above 50% identity, so
+    thresholds of 50 or less leave coverage and ``min_score`` as the filters;
+    the score threshold keeps chance alignments of unrelated probes out.
+
+    Returns:
+        List of hits (target, query, strand, score, t_start, t_end, q_start,
+        q_end, matches, mismatches, cigar) meeting the identity and coverage
+        thresholds (percentages); query coordinates are on the aligned strand
+    """
+    forward, reverse, lengths = encode_probes(seqs)
+    target, query, strand, diag = candidate_pairs(forward, reverse, k, min_seeds,
+                                                  max_occurrence)
+    hits = []
+    step = batch_size(forward.shape[1])
+    for start in range(0, target.size, step):
+        sl = slice(start, start + step)
+        t, q, s, d = target[sl], query[sl], strand[sl], diag[sl]
+        score, t_start, t_end, q_start, q_end, matches, mismatches, ops, runs = \
+            align_pairs(forward, reverse, lengths, t, q, s, d)
+        aligned = matches + mismatches
+        covered = np.where(lengths[t] <= lengths[q], t_end - t_start, q_end - q_start)
+        shorter = np.minimum(lengths[t], lengths[q])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ok = (score >= max(min_score, 1)) & (100.0 * matches / aligned >= identity) \
+                & (100.0 * covered / shorter >= coverage)
+        for row in np.flatnonzero(ok):
+            hits.append((int(t[row]), int(q[row]), int(s[row]), int(score[row]),
+                         int(t_start[row]), int(t_end[row]), int(q_start[row]),
+                         int(q_end[row]), int(matches[row]), int(mismatches[row]),
+                         cigar_string(ops[row], runs[row])))
+    return hits
+
+
+# ==============================================
+# Output
+# ==============================================
+def lastz_line(name1: str, len1: int, start1: int, end1: int, name2: str, len2: int,
+               strand2: str, start2: int, end2: int, score: int, matches: int,
+               mismatches: int, cigar: str) -> str:
+    """Format one hit like LASTZ ``general-`` output as run by phyluce_probe_easy_lastz:
+    score,name1,strand1,zstart1,end1,length1,name2,strand2,zstart2+,end2+,length2,
+    diff,cigar,identity,continuity,coverage.
+    """
+    aligned = matches + mismatches
+    columns = sum(int(n) for n in re.findall(r"\d+", cigar))
+    covered, shorter = (end1 - start1, len1) if len1 <= len2 else (end2 - start2, len2)
+    return '\t'.join([
+        str(100 * score), name1, '+', str(start1), str(end1), str(len1),
+        name2, strand2, str(start2), str(end2), str(len2),
+        '.', cigar,
+        f"{matches}/{aligned}", f"{100.0 * matches / aligned:.1f}%",
+        f"{aligned}/{columns}", f"{100.0 * aligned / columns:.1f}%",
+        f"{covered}/{shorter}", f"{100.0 * covered / shorter:.1f}%",
+    ])
+
+
+def mirror_cigar(cigar: str, reverse: bool) -> str:
+    """CIGAR with target and query swapped (and reversed for - strand hits)."""
+    parts = re.findall(r"\d+[MID]", cigar.translate(str.maketrans("ID", "DI")))
+    return ''.join(parts[::-1] if reverse else parts)
+
+
+def write_lastz(output_file: str, names: List[str], lengths: List[int],
+                hits: List[Tuple]) -> None:
+    """Write hits in both directions, mirroring a LASTZ self-comparison."""
+    with open(output_file, 'w') as f:
+        for t, q, s, score, t_start, t_end, q_start, q_end, matches, mismatches, cigar in hits:
+            lt, lq = lengths[t], lengths[q]
+            strand = '+' if s == 0 else '-'
+            if s:
+                q_start, q_end = lq - q_end, lq - q_start   # Query segment on its + strand
+            counts = (score, matches, mismatches)
+            f.write(lastz_line(names[t], lt, t_start, t_end, names[q], lq, strand,
+                               q_start, q_end, *counts, cigar) + '\n')
+            f.write(lastz_line(names[q], lq, q_start, q_end, names[t], lt, strand,
+                               t_start, t_end, *counts, mirror_cigar(cigar, s == 1)) + '\n')
+
+
+def duplicate_loci(names: List[str], hits: List[Tuple[int, ...]],
+                   probe_prefix: Optional[str]) -> List[str]:
+    """Loci whose probes hit probes of a different locus."""
+    if probe_prefix:
+        pattern = re.compile(rf"^({re.escape(probe_prefix)}\d+)")
+    else:
+        pattern = re.compile(r"^(\S+?)(?:_p\d+)?(?:\s|$)")
+    def locus(name):
+        match = pattern.match(name)
+        return match.group(1) if match else name.split()[0]
+    dupes = set()
+    for t, q, *_ in hits:
+        lt, lq = locus(names[t]), locus(names[q])
+        if lt != lq:
+            dupes.update((lt, lq))
+    return sorted(dupes)
+
+
+def main():
+    """Main execution routine."""
+    parser = argparse.ArgumentParser(
+        description="In-memory self-comparison of UCE probes (LASTZ replacement)",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("probes", help="Probe FASTA file")
+    parser.add_argument("-o", "--output", required=True, help="LASTZ-format output")
+    parser.add_argument("--identity", type=float, default=50.0,
+                        help="Minimum percent identity, matches / (matches + mismatches); "
+                             "values of 50 or less do not filter (every reported "
+                             "alignment is above 50%%)")
+    parser.add_argument("--coverage", type=float, default=50.0,
+                        help="Minimum percent coverage of the shorter probe")
+    parser.add_argument("--min-score", type=int, default=DEFAULT_MIN_SCORE,
+                        help="Minimum alignment score (match +1, mismatch -1, gap of g "
+                             f"bases -({GAP_OPEN} + {GAP_EXTEND}g))")
+    parser.add_argument("-k", type=int, default=DEFAULT_K, help="Seed k-mer size (≤ 31)")
+    parser.add_argument("--min-seeds", type=int, default=DEFAULT_MIN_SEEDS,
+                        help="Shared k-mers required on one diagonal")
+    parser.add_argument("--max-occurrence", type=int, default=DEFAULT_MAX_OCCURRENCE,
+                        help="Mask k-mers occurring more often than this")
+    parser.add_argument("--dupes", help="Also write loci with cross-locus hits here")
+    parser.add_argument("--probe-prefix", default="uce-",
+                        help="Probe locus prefix used for --dupes")
+    args = parser.parse_args()
+
+    if not 1 <= args.k <= 31:
+        sys.exit("Parameter error: k must be between 1 and 31")
+
+    start_time = perf_counter()
+    try:
+        names, seqs = read_probes(args.probes)
+    except (ValueError, FileNotFoundError) as e:
+        sys.exit(f"Error: {e}")
+    hits = screen_probes(seqs, args.k, args.min_seeds, args.max_occurrence,
+                         args.identity, args.coverage, args.min_score)
+    write_lastz(args.output, names, [len(s) for s in seqs], hits)
+
+    summary = (f"Screened {len(names)} probes in {perf_counter() - start_time:.2f}s\n"
+               f"- Pairs above thresholds: {len(hits)}\n")
+    if args.dupes:
+        dupes = duplicate_loci(names, hits, args.probe_prefix)
+        with open(args.dupes, 'w') as f:
+            f.write(''.join(f"{locus}\n" for locus in dupes))
+        summary += f"- Loci with cross-locus hits: {len(dupes)}\n"
+    print(summary + f"Results written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,11 @@ NUM_CORES_ART_ILLUMINA=8
 NUM_CORES_STAMPY_MAP=3 # Note: STAMPY_MAP itself uses -t 12, but parallel jobs are limited to 3.
 NUM_CORES_LASTZ_SQLITE=20 # For phyluce_probe_run_multiple_lastzs_sqlite
 
+# Probe self-comparison in Steps 5 and 6: "lastz" uses phyluce_probe_easy_lastz,
+# "python" uses the in-memory k-mer screen (UCE_Probe_Screen.py; not yet validated
+# against LASTZ on full probe sets).
+PROBE_SCREEN="lastz"
+
 # --- Script Setup ---
 # Exit immediately if a command exits with a non-zero status.
 # Exit if an unset variable is used.
@@ -285,13 +290,20 @@ do
                     --two-probes \
                     --output "${BASE_GENOME_PREFIX}+${INITIAL_SHARED_UCE_COUNT}.temp.probes"
                 
-                echo "  Running LASTZ for self-comparison of probes..."
-                phyluce_probe_easy_lastz \
-                    --target "${BASE_GENOME_PREFIX}+${INITIAL_SHARED_UCE_COUNT}.temp.probes" \
-                    --query "${BASE_GENOME_PREFIX}+${INITIAL_SHARED_UCE_COUNT}.temp.probes" \
-                    --identity 50 \
-                    --coverage 50 \
-                    --output "${BASE_GENOME_PREFIX}+${INITIAL_SHARED_UCE_COUNT}.temp.probes-TO-SELF-PROBES.lastz"
+                echo "  Running self-comparison of probes (${PROBE_SCREEN})..."
+                if [[ "$PROBE_SCREEN" == "python" ]]; then
+                    python3 "${SCRIPT_DIR}/UCE_Probe_Screen.py" "${BASE_GENOME_PREFIX}+${INITIAL_SHARED_UCE_COUNT}.temp.probes" \
+                        --identity 50 \
+                        --coverage 50 \
+                        --output "${BASE_GENOME_PREFIX}+${INITIAL_SHARED_UCE_COUNT}.temp.probes-TO-SELF-PROBES.lastz"
+                else
+                    phyluce_probe_easy_lastz \
+                        --target "${BASE_GENOME_PREFIX}+${INITIAL_SHARED_UCE_COUNT}.temp.probes" \
+                        --query "${BASE_GENOME_PREFIX}+${INITIAL_SHARED_UCE_COUNT}.temp.probes" \
+                        --identity 50 \
+                        --coverage 50 \
+                        --output "${BASE_GENOME_PREFIX}+${INITIAL_SHARED_UCE_COUNT}.temp.probes-TO-SELF-PROBES.lastz"
+                fi
                 
                 echo "  Removing duplicate hits from probes..."
                 # Original command, no --output parameter added as per user request
@@ -365,13 +377,20 @@ do
                     --two-probes \
                     --output "${GROUP_NAME}-v1-master-probe-list.fasta"
                 
-                echo "  Running LASTZ for self-comparison of final probes..."
-                phyluce_probe_easy_lastz \
-                    --target "${GROUP_NAME}-v1-master-probe-list.fasta" \
-                    --query "${GROUP_NAME}-v1-master-probe-list.fasta" \
-                    --identity 50 \
-                    --coverage 50 \
-                    --output "${GROUP_NAME}-v1-master-probe-list-TO-SELF-PROBES.lastz"
+                echo "  Running self-comparison of final probes (${PROBE_SCREEN})..."
+                if [[ "$PROBE_SCREEN" == "python" ]]; then
+                    python3 "${SCRIPT_DIR}/UCE_Probe_Screen.py" "${GROUP_NAME}-v1-master-probe-list.fasta" \
+                        --identity 50 \
+                        --coverage 50 \
+                        --output "${GROUP_NAME}-v1-master-probe-list-TO-SELF-PROBES.lastz"
+                else
+                    phyluce_probe_easy_lastz \
+                        --target "${GROUP_NAME}-v1-master-probe-list.fasta" \
+                        --query "${GROUP_NAME}-v1-master-probe-list.fasta" \
+                        --identity 50 \
+                        --coverage 50 \
+                        --output "${GROUP_NAME}-v1-master-probe-list-TO-SELF-PROBES.lastz"
+                fi
                 
                 echo "  Removing duplicate hits from final probes..."
                 # Original command, no --output parameter added as per user request
@@ -3,20 +3,20 @@
 # CID Distance Analyzer v2024.12.1
 # Author: WJJ
 
+import sys
 import argparse
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from pathlib import Path
 from typing import Dict, List
 
-# Configure visual settings
-plt.style.use('seaborn')
-sns.set_palette('husl')
+# Visual settings (matplotlib itself is imported only when plotting)
 COLOR_SCATTER = '#4B8BBE'
 COLOR_IQR = '#FF6347'
 COLOR_MAD = '#FFA500'
+PLOT_STYLES = ('seaborn-v0_8', 'seaborn')  # Renamed in matplotlib 3.6
+PLOT_BACKENDS = {'png': 'Agg', 'svg': 'svg', 'pdf': 'pdf'}
+DENSITY_MIN_TREES = 5000  # 'auto' mode switches to a binned density above this
 
 def parse_cid_matrix(file_path: str) -> pd.DataFrame:
     """Parse CID distance matrix from CSV file.
@@ -91,29 +91,54 @@ def generate_report(output_file: str, stats: Dict, thresholds: Dict,
         f.write("Per-Tree Averages:\n")
         f.write(distances.to_string(float_format="%.4f"))
 
+def load_pyplot(backend: str):
+    """Import pyplot on a non-interactive backend.
+    
+    Args:
+        backend: matplotlib backend name (e.g. 'Agg', 'svg')
+        
+    Returns:
+        matplotlib.pyplot module
+    """
+    import matplotlib
+    matplotlib.use(backend)
+    import matplotlib.pyplot as plt
+    for style in PLOT_STYLES:
+        if style in plt.style.available:
+            plt.style.use(style)
+            break
+    return plt
+
 def visualize_distances(distances: pd.Series, stats: Dict, 
-                        thresholds: Dict) -> plt.Figure:
+                        thresholds: Dict, plt, mode: str = 'auto'):
     """Create visualization of CID distance distribution.
     
     Args:
         distances: Sorted average distances
         stats: Statistical measures
         thresholds: Threshold values
+        plt: pyplot module from load_pyplot
+        mode: 'scatter' (rasterized points), 'density' (hexbin counts)
+              or 'auto' (density for large tree sets)
         
     Returns:
         matplotlib Figure object
     """
     fig, ax = plt.subplots(figsize=(12, 7))
-    
-    # Scatter plot configuration
-    sns.scatterplot(
-        x=range(len(distances)),
-        y=distances,
-        color=COLOR_SCATTER,
-        alpha=0.6,
-        s=40,
-        ax=ax
-    )
+    x = np.arange(len(distances))
+    y = distances.to_numpy()
+    
+    if mode == 'auto':
+        mode = 'density' if len(distances) >= DENSITY_MIN_TREES else 'scatter'
+    if mode == 'density':
+        # Binned counts: drawing cost independent of the number of trees
+        hb = ax.hexbin(x, y, gridsize=(200, 60), bins='log', mincnt=1, cmap='Blues')
+        fig.colorbar(hb, ax=ax, label='Trees per bin (log)')
+    else:
+        # Rasterized markers keep vector outputs small
+        ax.scatter(x, y, color=COLOR_SCATTER, alpha=0.6,
+                   s=40 if len(distances) < 1000 else 8,
+                   linewidths=0, rasterized=True)
     
     # Threshold lines
     ax.axhline(thresholds['iqr'], color=COLOR_IQR, 
@@ -147,6 +172,14 @@ def main():
                        help='Path to CID distance matrix CSV')
     parser.add_argument('tree_file', type=str,
                        help='Path to tree names list')
+    parser.add_argument('--no-plot', action='store_true',
+                       help='Write report and threshold lists only (headless)')
+    parser.add_argument('--plot-mode', choices=['auto', 'scatter', 'density'],
+                       default='auto', help='Point scatter or binned density plot')
+    parser.add_argument('--plot-format', choices=sorted(PLOT_BACKENDS),
+                       default='png', help='Plot file format (selects the backend)')
+    parser.add_argument('--dpi', type=int, default=150,
+                       help='Resolution of raster output')
     
     args = parser.parse_args()
     
@@ -169,15 +202,25 @@ def main():
     # Generate outputs
     generate_report('4-CID_distance_report.txt', stats, thresholds, avg_distances)
     
-    # Visualization
-    fig = visualize_distances(avg_distances, stats, thresholds)
-    fig.savefig('4-CID_distance_trend.png', dpi=300, bbox_inches='tight')
-    
     # Threshold outputs
     for threshold_type in ['iqr', 'mad']:
         outliers = avg_distances[avg_distances > thresholds[threshold_type]]
         outliers.to_csv(f'5-Exceed_{threshold_type.upper()}_CID_trees.txt',
                        header=False, float_format="%.4f")
+    
+    # Visualization (optional; report and thresholds are already written)
+    if args.no_plot:
+        return
+    try:
+        plt = load_pyplot(PLOT_BACKENDS[args.plot_format])
+    except ImportError as e:
+        # Not an error: the report and threshold lists are complete
+        print(f"Warning: plot skipped ({e})", file=sys.stderr)
+        return
+    fig = visualize_distances(avg_distances, stats, thresholds, plt, args.plot_mode)
+    fig.savefig(f'4-CID_distance_trend.{args.plot_format}', dpi=args.dpi,
+                bbox_inches='tight')
+    plt.close(fig)
 
 if __name__ == '__main__':
     main()
@@ -6,11 +6,15 @@ import os
 import logging
 import argparse
 from itertools import combinations
-from ete3 import Tree
 import multiprocessing
 import subprocess
 import shutil
 import time
+from functools import wraps
+from Tree_Store import TreeStore
+
+# Gene trees shared by pruning workers (set by init_tree_store)
+_TREE_STORE = None
 
 # ==============================================
 # Performance Tracking Infrastructure
@@ -35,6 +39,7 @@ class Timer:
 def track_time(step_name):
     """Decorator for function-level timing"""
     def decorator(func):
+        @wraps(func)  # Keeps the function picklable for multiprocessing
         def wrapper(*args, **kwargs):
             start = time.time()
             result = func(*args, **kwargs)
@@ -68,34 +73,37 @@ def generate_species_combinations(species_list, output_file, outgroup):
     
     return len(combs_4)
 
+def init_tree_store(shm_name, store_path):
+    """Pool initializer: view the shared gene trees without copying
+    
+    Args:
+        shm_name: Shared memory block holding the store (or None)
+        store_path: Store file to memory-map when shm_name is None
+    """
+    global _TREE_STORE
+    if shm_name:
+        _TREE_STORE = TreeStore.attach(shm_name)
+    else:
+        _TREE_STORE = TreeStore.load(store_path)
+
 @track_time("Tree Pruning Operation")
 def process_line(args):
     """Process individual tree line with pruning
     
     Args:
-        args: Tuple containing (line, line_num, tree_path, output_dir)
+        args: Tuple containing (line, line_num, output_dir); trees come
+              from the worker's shared TreeStore
     
     Returns:
         int: Number of successfully processed trees
     """
-    line, line_number, tree_file_path, output_dir = args
+    line, line_number, output_dir = args
     try:
         subtree_taxa = line.strip().split()
-        pruned_trees = []
-        
-        # Bulk tree loading
-        with open(tree_file_path, 'r') as tree_file:
-            trees = [t.strip() for t in tree_file if t.strip()]
-            
-        # Tree processing loop
-        for tree_line in trees:
-            try:
-                tree = Tree(tree_line)
-                tree.prune(subtree_taxa, preserve_branch_length=True)
-                pruned_trees.append(tree.write())
-            except Exception as e:
-                logging.debug(f"Pruning error line {line_number}: {str(e)}")
-                continue
+        pruned_trees = _TREE_STORE.prune_all(subtree_taxa)
+        if len(pruned_trees) < len(_TREE_STORE):
+            logging.debug(f"Line {line_number}: {len(_TREE_STORE) - len(pruned_trees)} "
+                          f"trees lack some of {subtree_taxa}")
         
         # Batch output writing
         if pruned_trees:
@@ -178,6 +186,8 @@ def main():
     # Argument definitions
     parser.add_argument('--species_list_file', help='Species list file path')
     parser.add_argument('--tree_file_path', help='Input tree file path')
+    parser.add_argument('--tree_store', help='Compact tree store file, memory-mapped by '
+                        'workers (rebuilt from --tree_file_path if missing or stale)')
     parser.add_argument('--outgroup', required=True, help='Outgroup species')
     parser.add_argument('--pruned_tree_dir', help='Pruned trees directory')
     parser.add_argument('--output_path_base', help='Base output directory')
@@ -217,31 +227,55 @@ def main():
                 logging.info(f"Generated {comb_count} combinations")
 
             elif step == 'prune_trees':
-                if not all([args.tree_file_path, args.pruned_tree_dir]):
+                have_store = bool(args.tree_store) and os.path.exists(args.tree_store)
+                if have_store and args.tree_file_path and \
+                        not TreeStore.is_current(args.tree_store, args.tree_file_path):
+                    logging.info(f"Tree store {args.tree_store} is out of date, rebuilding")
+                    have_store = False
+                if not (args.tree_file_path or have_store) or not args.pruned_tree_dir:
                     raise ValueError("Missing required arguments for tree pruning")
                 
                 cpu_count = multiprocessing.cpu_count()
                 pool_size = min(args.pool_size, cpu_count)
                 
-                with multiprocessing.Pool(pool_size) as pool:
-                    tasks = []
-                    with open('temp_combinations.txt') as taxa_file:
-                        for line_num, line in enumerate(taxa_file, 1):
-                            tasks.append((
-                                line, 
-                                line_num, 
-                                os.path.abspath(args.tree_file_path), 
-                                os.path.abspath(args.pruned_tree_dir)
-                            ))
-                    
-                    # Process in chunks for memory efficiency
-                    chunk_size = 100
-                    results = []
-                    for i in range(0, len(tasks), chunk_size):
-                        chunk = tasks[i:i+chunk_size]
-                        results.extend(pool.map(process_line, chunk))
-                        logging.info(f"Processed chunk {i//chunk_size} ({sum(results)} trees)")
+                # Parse gene trees once; workers view one shared copy
+                shm = None
+                if have_store:
+                    store_path = os.path.abspath(args.tree_store)
+                else:
+                    store = TreeStore.from_newick_file(args.tree_file_path)
+                    if args.tree_store:
+                        store.save(args.tree_store)
+                        store_path = os.path.abspath(args.tree_store)
+                    else:
+                        shm = store.to_shared_memory()
+                        store_path = None
+                    logging.info(f"Tree store: {len(store)} trees, {store.nbytes} bytes")
+                    del store
                 
+                try:
+                    with multiprocessing.Pool(pool_size, initializer=init_tree_store,
+                                              initargs=(shm and shm.name, store_path)) as pool:
+                        tasks = []
+                        with open('temp_combinations.txt') as taxa_file:
+                            for line_num, line in enumerate(taxa_file, 1):
+                                tasks.append((
+                                    line, 
+                                    line_num, 
+                                    os.path.abspath(args.pruned_tree_dir)
+                                ))
+                        
+                        # Process in chunks for memory efficiency
+                        chunk_size = 100
+                        results = []
+                        for i in range(0, len(tasks), chunk_size):
+                            chunk = tasks[i:i+chunk_size]
+                            results.extend(pool.map(process_line, chunk))
+                            logging.info(f"Processed chunk {i//chunk_size} ({sum(results)} trees)")
+                finally:
+                    if shm is not None:
+                        shm.close()
+                        shm.unlink()
                 logging.info(f"Total pruned trees: {sum(results)}")
 
             elif step == 'generate_config':
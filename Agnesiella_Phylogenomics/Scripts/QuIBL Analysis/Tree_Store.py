@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Compact Gene Tree Store v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. Flat NumPy representation of a tree collection: parent index, child
+   offset, branch length and taxon ID arrays (nodes in breadth-first order,
+   so the children of a node are contiguous)
+2. One contiguous buffer, placed in multiprocessing.shared_memory or an
+   mmap'd file and viewed zero-copy by every worker
+3. Newick round-trip and ete3-compatible pruning
+   (``prune(..., preserve_branch_length=True)`` followed by ``write()``);
+   absent branch lengths are written and summed as ete3's default of 1
+4. Size and mtime of the source tree file recorded in the header, so stale
+   store files can be detected
+
+Layout of the buffer: an 8-byte header length, a JSON header describing each
+array (dtype, shape, offset) and the source file, then the arrays aligned to
+64 bytes.
+"""
+
+import os
+import re
+import json
+from multiprocessing import shared_memory
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Constants
+ALIGNMENT = 64
+FLOAT_FORMAT = "%0.6g"  # ete3 branch length / support formatting
+DEFAULT_DIST = 1.0      # ete3 branch length when the Newick string has none
+NEWICK_TOKEN = re.compile(r"\s*(\[[^\]]*\]|'(?:[^']|'')*'|[(),:;]|[^\s(),:;\[\]']+)")
+QUOTE_CHARS = set("(),:;[] '\t")
+
+# Array name -> dtype; shapes are recorded in the header
+ARRAY_DTYPES = {
+    'node_offsets': np.int64,    # n_trees + 1: node range of each tree
+    'parent': np.int32,          # n_nodes: tree-local parent index (-1 = root)
+    'child_offset': np.int32,    # n_nodes + n_trees: per tree, local child start of
+                                 # each node plus a closing entry
+    'branch_length': np.float64, # n_nodes: NaN when absent (DEFAULT_DIST on output)
+    'taxon': np.int32,           # n_nodes: label ID (-1 = unlabelled)
+    'leaf_keys': np.int64,       # sorted tree * n_labels + taxon for leaves
+    'leaf_nodes': np.int64,      # global node index for each leaf key
+    'label_blob': np.uint8,      # UTF-8 labels, concatenated
+    'label_offsets': np.int64,   # n_labels + 1
+}
+
+
+# ==============================================
+# Newick Parsing
+# ==============================================
+def parse_newick(text: str, label_ids: Dict[str, int]
+                 ) -> Tuple[List[int], List[int], List[float], List[int]]:
+    """
+    Parse one Newick tree into breadth-first node arrays.
+
+    Args:
+        text: Newick string
+        label_ids: Shared label -> ID table, extended in place
+
+    Returns:
+        Tuple of (parent, child offsets incl. closing entry, branch lengths,
+        label IDs), all tree-local
+
+    Raises:
+        ValueError: If the string is not a valid Newick tree
+    """
+    parent, children, length, label = [-1], [[]], [np.nan], [-1]
+    current, expect_length = 0, False
+    for token in NEWICK_TOKEN.findall(text):
+        if token.startswith('['):
+            continue
+        if token == '(':
+            node = len(parent)
+            parent.append(current)
+            children.append([])
+            length.append(np.nan)
+            label.append(-1)
+            children[current].append(node)
+            current = node
+        elif token == ',':
+            if parent[current] < 0:
+                raise ValueError("Unbalanced parentheses")
+            node = len(parent)
+            parent.append(parent[current])
+            children.append([])
+            length.append(np.nan)
+            label.append(-1)
+            children[parent[current]].append(node)
+            current = node
+        elif token == ')':
+            if parent[current] < 0:
+                raise ValueError("Unbalanced parentheses")
+            current = parent[current]
+        elif token == ':':
+            expect_length = True
+        elif token == ';':
+            break
+        elif expect_length:
+            length[current] = float(token)
+            expect_length = False
+        else:
+            if token.startswith("'"):
+                token = token[1:-1].replace("''", "'")
+            label[current] = label_ids.setdefault(token, len(label_ids))
+    if current != 0:
+        raise ValueError("Unbalanced parentheses")
+
+    order = [0]
+    for node in order:
+        order.extend(children[node])
+    local = {node: i for i, node in enumerate(order)}
+    offsets, position = [], 1
+    for node in order:
+        offsets.append(position)
+        position += len(children[node])
+    offsets.append(position)
+    return ([local[parent[n]] if parent[n] >= 0 else -1 for n in order], offsets,
+            [length[n] for n in order], [label[n] for n in order])
+
+
+def source_signature(path: str) -> Dict[str, int]:
+    """Size and modification time identifying a version of a tree file."""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def format_label(label: str) -> str:
+    """Quote a label for Newick output when needed."""
+    if QUOTE_CHARS & set(label):
+        return "'" + label.replace("'", "''") + "'"
+    return label
+
+
+# ==============================================
+# Tree Store
+# ==============================================
+class TreeStore:
+    """Read-only collection of rooted trees backed by flat NumPy arrays."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray], owner=None,
+                 source: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            arrays: Arrays named as in ARRAY_DTYPES
+            owner: Object keeping the backing buffer alive (shared memory,
+                   memmap), closed by close()
+            source: source_signature() of the tree file the store was built from
+        """
+        for name in ARRAY_DTYPES:
+            setattr(self, name, arrays[name])
+        self._owner = owner
+        self.source = source
+        self._labels: Optional[List[str]] = None
+        self._label_ids: Optional[Dict[str, int]] = None
+        self._support_text: Dict[int, str] = {}
+
+    # ----- construction -----
+    @classmethod
+    def from_newick(cls, trees: Iterable[str]) -> "TreeStore":
+        """
+        Build a store from Newick strings (blank lines skipped).
+
+        Raises:
+            ValueError: If a tree cannot be parsed (message gives its number)
+        """
+        label_ids: Dict[str, int] = {}
+        node_offsets, parents, child_offsets, lengths, taxa = [0], [], [], [], []
+        for number, text in enumerate((t for t in trees if t.strip()), 1):
+            try:
+                parent, offsets, length, taxon = parse_newick(text, label_ids)
+            except ValueError as e:
+                raise ValueError(f"Tree {number}: {e}")
+            parents.extend(parent)
+            child_offsets.extend(offsets)
+            lengths.extend(length)
+            taxa.extend(taxon)
+            node_offsets.append(len(parents))
+
+        node_offsets = np.array(node_offsets, dtype=np.int64)
+        taxon = np.array(taxa, dtype=np.int32)
+        child_offset = np.array(child_offsets, dtype=np.int32)
+        tree_of_node = np.repeat(np.arange(len(node_offsets) - 1), np.diff(node_offsets))
+        local_end = child_offset[np.arange(taxon.size) + tree_of_node + 1]
+        is_leaf = local_end == child_offset[np.arange(taxon.size) + tree_of_node]
+        leaves = np.flatnonzero(is_leaf & (taxon >= 0))
+        keys = tree_of_node[leaves] * max(len(label_ids), 1) + taxon[leaves]
+        order = np.argsort(keys, kind='stable')
+
+        encoded = [label.encode() for label in label_ids]
+        return cls({
+            'node_offsets': node_offsets,
+            'parent': np.array(parents, dtype=np.int32),
+            'child_offset': child_offset,
+            'branch_length': np.array(lengths, dtype=np.float64),
+            'taxon': taxon,
+            'leaf_keys': keys[order].astype(np.int64),
+            'leaf_nodes': leaves[order].astype(np.int64),
+            'label_blob': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+            'label_offsets': np.cumsum([0] + [len(e) for e in encoded], dtype=np.int64),
+        })
+
+    @classmethod
+    def from_newick_file(cls, path: str) -> "TreeStore":
+        """Build a store from a file with one Newick tree per line."""
+        source = source_signature(path)
+        with open(path) as f:
+            store = cls.from_newick(f)
+        store.source = source
+        return store
+
+    # ----- buffer layout -----
+    def _layout(self) -> Tuple[bytes, Dict[str, Tuple[int, int]], int]:
+        """Header bytes, array offsets and total size of the buffer."""
+        counts, offsets, position = {}, {}, 0
+        for name in ARRAY_DTYPES:
+            array = getattr(self, name)
+            counts[name] = array.shape[0]
+            offsets[name] = (position, array.nbytes)
+            position += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        header = json.dumps({'counts': counts, 'offsets': offsets,
+                             'source': self.source}).encode()
+        data_start = -(-(8 + len(header)) // ALIGNMENT) * ALIGNMENT
+        return header, {n: (data_start + o, size) for n, (o, size) in offsets.items()}, \
+            data_start + position
+
+    def _write_into(self, buffer) -> None:
+        header, offsets, _ = self._layout()
+        buffer[:8] = len(header).to_bytes(8, 'little')
+        buffer[8:8 + len(header)] = header
+        for name, (offset, size) in offsets.items():
+            buffer[offset:offset + size] = getattr(self, name).tobytes()
+
+    @classmethod
+    def _from_buffer(cls, buffer, owner=None) -> "TreeStore":
+        header_length = int.from_bytes(bytes(buffer[:8]), 'little')
+        header = json.loads(bytes(buffer[8:8 + header_length]))
+        data_start = -(-(8 + header_length) // ALIGNMENT) * ALIGNMENT
+        arrays = {}
+        for name, dtype in ARRAY_DTYPES.items():
+            count = header['counts'][name]
+            offset = data_start + header['offsets'][name][0]
+            arrays[name] = np.ndarray((count,), dtype=dtype, buffer=buffer, offset=offset)
+            arrays[name].flags.writeable = False
+        return cls(arrays, owner, header.get('source'))
+
+    @property
+    def nbytes(self) -> int:
+        return self._layout()[2]
+
+    # ----- shared memory / mmap -----
+    def to_shared_memory(self) -> shared_memory.SharedMemory:
+        """Copy the store into a new shared memory block (caller unlinks it)."""
+        shm = shared_memory.SharedMemory(create=True, size=max(self.nbytes, 1))
+        self._write_into(shm.buf)
+        return shm
+
+    @classmethod
+    def attach(cls, name: str) -> "TreeStore":
+        """Zero-copy view of a store placed in shared memory by another process."""
+        shm = shared_memory.SharedMemory(name=name)
+        return cls._from_buffer(shm.buf, shm)
+
+    def save(self, path: str) -> None:
+        """Write the store to a file that load() can memory-map."""
+        buffer = bytearray(self.nbytes)
+        self._write_into(memoryview(buffer))
+        with open(path, 'wb') as f:
+            f.write(buffer)
+
+    @classmethod
+    def load(cls, path: str) -> "TreeStore":
+        """Memory-map a file written by save()."""
+        mapped = np.memmap(path, dtype=np.uint8, mode='r')
+        return cls._from_buffer(mapped, mapped)
+
+    @classmethod
+    def is_current(cls, path: str, source_path: str) -> bool:
+        """Whether a saved store was built from the current version of a tree file."""
+        try:
+            with open(path, 'rb') as f:
+                header_length = int.from_bytes(f.read(8), 'little')
+                header = json.loads(f.read(header_length))
+        except (OSError, ValueError):
+            return False
+        return header.get('source') == source_signature(source_path)
+
+    def close(self) -> None:
+        """Release views of the backing buffer (shared memory is not unlinked)."""
+        owner, self._owner = self._owner, None
+        for name in ARRAY_DTYPES:
+            setattr(self, name, None)
+        if isinstance(owner, shared_memory.SharedMemory):
+            owner.close()
+
+    # ----- labels -----
+    def __len__(self) -> int:
+        return self.node_offsets.size - 1
+
+    @property
+    def labels(self) -> List[str]:
+        if self._labels is None:
+            blob = self.label_blob.tobytes()
+            bounds = self.label_offsets.tolist()
+            self._labels = [blob[a:b].decode() for a, b in zip(bounds, bounds[1:])]
+        return self._labels
+
+    def label_id(self, label: str) -> int:
+        """ID of a label, or -1 when it occurs in no tree."""
+        if self._label_ids is None:
+            self._label_ids = {label: i for i, label in enumerate(self.labels)}
+        return self._label_ids.get(label, -1)
+
+    def _support(self, taxon: int) -> str:
+        """ete3-style internal node text: numeric support formatted, default 1."""
+        if taxon not in self._support_text:
+            text = self.labels[taxon] if taxon >= 0 else "1"
+            try:
+                text = FLOAT_FORMAT % float(text)
+            except ValueError:
+                text = format_label(text)
+            self._support_text[taxon] = text
+        return self._support_text[taxon]
+
+    # ----- Newick output -----
+    def _children(self, tree: int, node: int) -> range:
+        base = self.node_offsets[tree] + tree
+        return range(int(self.child_offset[base + node]), int(self.child_offset[base + node + 1]))
+
+    def _render(self, tree: int, node: int, kids, length: float, is_root: bool) -> str:
+        start = int(self.node_offsets[tree])
+        child_nodes = kids(node)
+        if child_nodes:
+            text = '(' + ','.join(self._render(tree, c, kids, d, False)
+                                  for c, d in child_nodes) + ')'
+            if not is_root:
+                text += self._support(int(self.taxon[start + node]))
+        else:
+            taxon = int(self.taxon[start + node])
+            text = format_label(self.labels[taxon]) if taxon >= 0 else ''
+        if not is_root:
+            text += ':' + FLOAT_FORMAT % length
+        return text
+
+    def _length(self, node: int) -> float:
+        """Branch length of a global node, ete3's default when absent."""
+        length = self.branch_length[node]
+        return DEFAULT_DIST if np.isnan(length) else float(length)
+
+    def newick(self, tree: int) -> str:
+        """Newick string of one tree (ete3 format 0 style)."""
+        start = int(self.node_offsets[tree])
+        kids = lambda node: [(c, self._length(start + c)) for c in self._children(tree, node)]
+        return self._render(tree, 0, kids, np.nan, True) + ';'
+
+    # ----- pruning -----
+    def leaf_nodes_for(self, taxa: Sequence[int]) -> np.ndarray:
+        """
+        Tree-local leaf index of each taxon in every tree.
+
+        Returns:
+            Array (n_trees × n_taxa), -1 where a taxon is absent
+        """
+        n_labels = max(self.label_offsets.size - 1, 1)
+        trees = np.arange(len(self))
+        keys = trees[:, None] * n_labels + np.asarray(taxa, dtype=np.int64)[None, :]
+        if self.leaf_keys.size == 0:
+            return np.full(keys.shape, -1, dtype=np.int64)
+        pos = np.searchsorted(self.leaf_keys, keys).clip(max=self.leaf_keys.size - 1)
+        found = self.leaf_keys[pos] == keys
+        local = self.leaf_nodes[pos] - self.node_offsets[trees][:, None]
+        return np.where(found, local, -1)
+
+    def prune(self, tree: int, leaves: Sequence[int]) -> str:
+        """
+        Newick string of the subtree induced by tree-local leaf nodes.
+
+        Matches ete3 ``prune(preserve_branch_length=True)``: unary nodes are
+        removed in postorder, each adding its branch length to its child and
+        moving that child to the end of its parent's children, and the result
+        is rooted at the most recent common ancestor of the kept leaves.
+        """
+        start = int(self.node_offsets[tree])
+        parent = self.parent[start:int(self.node_offsets[tree + 1])]
+        visits: Dict[int, int] = {}
+        for leaf in leaves:
+            node = int(leaf)
+            while node >= 0:
+                visits[node] = visits.get(node, 0) + 1
+                node = int(parent[node])
+        # Breadth-first order: the deepest common node has the largest index,
+        # and visited nodes past it are exactly its kept descendants
+        mrca = max(n for n, count in visits.items() if count == len(leaves))
+        children: Dict[int, List[int]] = {}
+        up, length = {}, {}
+        for node in sorted(visits):
+            if node > mrca:
+                up[node] = int(parent[node])
+                length[node] = self._length(start + node)
+                children.setdefault(up[node], []).append(node)
+
+        postorder, stack = [], [mrca]
+        while stack:
+            node = stack.pop()
+            postorder.append(node)
+            stack.extend(children.get(node, []))
+        for node in reversed(postorder[1:]):
+            if len(children.get(node, [])) == 1:
+                child, above = children[node][0], up[node]
+                length[child] += length[node]
+                children[above].remove(node)
+                children[above].append(child)
+                up[child] = above
+
+        kids = lambda node: [(c, length[c]) for c in children.get(node, [])]
+        return self._render(tree, mrca, kids, np.nan, True) + ';'
+
+    def prune_all(self, taxa: Sequence[str]) -> List[str]:
+        """Prune every tree containing all taxa; trees missing any are skipped."""
+        ids = [self.label_id(t) for t in taxa]
+        if min(ids, default=-1) < 0:
+            return []
+        leaves = self.leaf_nodes_for(ids)
+        return [self.prune(tree, row) for tree, row in enumerate(leaves.tolist())
+                if min(row) >= 0]
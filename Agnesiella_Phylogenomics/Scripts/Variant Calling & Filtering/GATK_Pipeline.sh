@@ -13,6 +13,32 @@ FASTQ_R2="$2"
 SPECIES_NAME="$3"
 STEPS="$4"
 
+# Scatter-gather mode (SCATTER_JOBS > 1): steps 3-4 run per interval in parallel.
+# Per-species runs do steps 1-2. A single cohort run named "All", started
+# after every species has finished, then calls all BAMs in 1-bams in one
+# worker pool (step 3), joint-genotypes every gVCF in 2-g_vcfs into one "All"
+# VCF (step 4) and processes it (steps 5-6), replacing the per-species merge
+# of step 7:
+#   SCATTER_JOBS=12 bash GATK_Pipeline.sh - - All 3456789
+# Species that ran step 3 themselves can start the cohort run at step 4.
+SCATTER_JOBS="${SCATTER_JOBS:-1}"
+SCATTER_INTERVALS="${SCATTER_INTERVALS:-$((SCATTER_JOBS * 4))}"
+COHORT_NAME="All"
+JOINT_BATCH_SIZE="${JOINT_BATCH_SIZE:-50}"
+SCRIPT_DIR="$(dirname "$(realpath "$0")")"
+SCATTER_SCRIPT="${SCRIPT_DIR}/GATK_Scatter_Gather.py"
+FILTER_SCRIPT="${SCRIPT_DIR}/VCF_Site_Filter.py"
+FILTER_THREADS="${FILTER_THREADS:-8}"
+MATRIX_SCRIPT="${SCRIPT_DIR}/VCF_to_SNP_Matrix.py"
+MATRIX_OUTGROUP="${MATRIX_OUTGROUP:-}"
+MATRIX_THIN="${MATRIX_THIN:-0}"
+
+if [ "${SCATTER_JOBS}" -gt 1 ]; then
+    VCF_NAME="${COHORT_NAME}"
+else
+    VCF_NAME="${SPECIES_NAME}"
+fi
+
 # Initialize logging
 LOG_DIR="0-log"
 mkdir -p "${LOG_DIR}"
@@ -25,6 +51,14 @@ split_steps() {
     grep -o . <<< "$1" | tr '\n' ' '
 }
 
+# Scatter mode: joint steps run once, in the cohort run only
+cohort_only() {
+    if [ "${SCATTER_JOBS}" -gt 1 ] && [ "${SPECIES_NAME}" != "${COHORT_NAME}" ]; then
+        echo "Scatter mode: step $1 runs once for all species (SPECIES_NAME=${COHORT_NAME}), skipping" | tee -a "${LOG}"
+        return 1
+    fi
+}
+
 timer() {
     local start=$1
     local end=$(date +%s)
@@ -44,13 +78,13 @@ check_tool bwa-mem2
 check_tool samtools
 check_tool gatk
 check_tool bcftools
-check_tool vcftools
+check_tool python3
 
 # Reference genome path
 REF="/path/to/reference/genome.fasta"
 
 # Create workspace
-mkdir -p "1-bams" "2-g_vcfs" "3-vcfs" "4-snps" "5-snps_filted" "6-snps_further_filted"
+mkdir -p "1-bams" "2-g_vcfs" "3-vcfs" "4-snps" "5-snps_filted" "6-snps_further_filted" "7-snp_matrix"
 
 # Step executor
 execute_step() {
@@ -89,62 +123,97 @@ execute_step() {
         echo "[$(date)] STEP 3 START: gVCF Creation" | tee -a "${LOG}"
         cd 2-g_vcfs
 
-        gatk HaplotypeCaller \
-            -R "${REF}" \
-            -I ../1-bams/"${SPECIES_NAME}_markdup.bam" \
-            --max-alternate-alleles 3 \
-            --sample-ploidy 2 \
-            -ERC GVCF \
-            -O "${SPECIES_NAME}.g.vcf.gz"
+        if [ "${SCATTER_JOBS}" -gt 1 ]; then
+            # Cohort run pools every sample's intervals into one worker pool
+            SAMPLE_ARGS=()
+            if [ "${SPECIES_NAME}" = "${COHORT_NAME}" ]; then
+                for bam in ../1-bams/*_markdup.bam; do
+                    SAMPLE_ARGS+=(--sample "$(basename "${bam}" _markdup.bam)=${bam}")
+                done
+            else
+                SAMPLE_ARGS+=(--sample "${SPECIES_NAME}=../1-bams/${SPECIES_NAME}_markdup.bam")
+            fi
+            python3 "${SCATTER_SCRIPT}" call \
+                -R "${REF}" \
+                "${SAMPLE_ARGS[@]}" \
+                --intervals "${SCATTER_INTERVALS}" \
+                --jobs "${SCATTER_JOBS}" \
+                --work-dir "scatter_${SPECIES_NAME}" \
+                --out-dir .
+        else
+            gatk HaplotypeCaller \
+                -R "${REF}" \
+                -I ../1-bams/"${SPECIES_NAME}_markdup.bam" \
+                --max-alternate-alleles 3 \
+                --sample-ploidy 2 \
+                -ERC GVCF \
+                -O "${SPECIES_NAME}.g.vcf.gz"
 
-        tabix -p vcf "${SPECIES_NAME}.g.vcf.gz"
+            tabix -p vcf "${SPECIES_NAME}.g.vcf.gz"
+        fi
         cd ..
         ;;
     4)
         # Joint Genotyping
         echo "[$(date)] STEP 4 START: Genotyping" | tee -a "${LOG}"
+        cohort_only 4 || return 0
         cd 3-vcfs
 
-        gatk --java-options "-Xmx4g" GenotypeGVCFs \
-            -R "${REF}" \
-            -V ../2-g_vcfs/"${SPECIES_NAME}.g.vcf.gz" \
-            -O "${SPECIES_NAME}.vcf.gz"
+        if [ "${SCATTER_JOBS}" -gt 1 ]; then
+            # Batched joint genotyping of all species at once; re-runs when
+            # the set of gVCFs (or any of their mtimes) has changed
+            python3 "${SCATTER_SCRIPT}" joint \
+                -R "${REF}" \
+                --gvcf-dir ../2-g_vcfs \
+                --batch-size "${JOINT_BATCH_SIZE}" \
+                --intervals "${SCATTER_INTERVALS}" \
+                --jobs "${SCATTER_JOBS}" \
+                --work-dir scatter_joint \
+                -o "${VCF_NAME}.vcf.gz"
+        else
+            gatk --java-options "-Xmx4g" GenotypeGVCFs \
+                -R "${REF}" \
+                -V ../2-g_vcfs/"${SPECIES_NAME}.g.vcf.gz" \
+                -O "${SPECIES_NAME}.vcf.gz"
 
-        tabix -p vcf "${SPECIES_NAME}.vcf.gz"
+            tabix -p vcf "${SPECIES_NAME}.vcf.gz"
+        fi
         cd ..
         ;;
     5)
         # SNP Selection
         echo "[$(date)] STEP 5 START: SNP Selection" | tee -a "${LOG}"
+        cohort_only 5 || return 0
         cd 4-snps
 
         gatk --java-options "-Xmx4G" SelectVariants \
             -R "${REF}" \
-            -V ../3-vcfs/"${SPECIES_NAME}.vcf.gz" \
+            -V ../3-vcfs/"${VCF_NAME}.vcf.gz" \
             --select-type-to-include SNP \
             --restrict-alleles-to BIALLELIC \
-            -O "${SPECIES_NAME}_BIALLELIC_SNP.vcf.gz"
+            -O "${VCF_NAME}_BIALLELIC_SNP.vcf.gz"
 
         cd ..
         ;;
     6)
         # SNP Filtering
         echo "[$(date)] STEP 6 START: SNP Filtering" | tee -a "${LOG}"
+        cohort_only 6 || return 0
         cd 5-snps_filted
 
         gatk VariantFiltration \
-            -V "../4-snps/${SPECIES_NAME}_BIALLELIC_SNP.vcf.gz" \
+            -V "../4-snps/${VCF_NAME}_BIALLELIC_SNP.vcf.gz" \
             --filter-expression "QD < 2.0 || QUAL < 30.0 || SOR > 3.0 || FS > 60.0 || MQ < 40.0 || MQRankSum < -12.5 || ReadPosRankSum < -8.0" \
             --filter-name "my_filters" \
-            -O "${SPECIES_NAME}_BIALLELIC_SNP_anno.vcf.gz"
+            -O "${VCF_NAME}_BIALLELIC_SNP_anno.vcf.gz"
 
         gatk --java-options "-Xmx4G" SelectVariants \
             -R "${REF}" \
-            -V "${SPECIES_NAME}_BIALLELIC_SNP_anno.vcf.gz" \
+            -V "${VCF_NAME}_BIALLELIC_SNP_anno.vcf.gz" \
             --exclude-filtered \
-            -O "${SPECIES_NAME}_BIALLELIC_SNP_PASS.vcf.gz"
+            -O "${VCF_NAME}_BIALLELIC_SNP_PASS.vcf.gz"
 
-        tabix -p vcf "${SPECIES_NAME}_BIALLELIC_SNP_PASS.vcf.gz"
+        tabix -p vcf "${VCF_NAME}_BIALLELIC_SNP_PASS.vcf.gz"
         cd ..
         ;;
     7)
@@ -152,10 +221,15 @@ execute_step() {
         echo "[$(date)] STEP 7 START: VCF Merging" | tee -a "${LOG}"
         cd 5-snps_filted
 
-        bcftools merge *_BIALLELIC_SNP_PASS.vcf.gz \
-            -o "All_BIALLELIC_SNP_PASS.vcf.gz"
+        if [ "${SCATTER_JOBS}" -gt 1 ]; then
+            # Joint genotyping in step 4 already produced the multi-species VCF
+            echo "Scatter mode: All_BIALLELIC_SNP_PASS.vcf.gz is jointly genotyped, skipping merge" | tee -a "${LOG}"
+        else
+            bcftools merge *_BIALLELIC_SNP_PASS.vcf.gz \
+                -o "All_BIALLELIC_SNP_PASS.vcf.gz"
 
-        tabix -p vcf "All_BIALLELIC_SNP_PASS.vcf.gz"
+            tabix -p vcf "All_BIALLELIC_SNP_PASS.vcf.gz"
+        fi
         cd ..
         ;;
     8)
@@ -163,14 +237,31 @@ execute_step() {
         echo "[$(date)] STEP 8 START: Advanced Filtering" | tee -a "${LOG}"
         cd 6-snps_further_filted
 
-        vcftools --gzvcf "../5-snps_filted/All_BIALLELIC_SNP_PASS.vcf.gz" \
-            --recode --recode-INFO-all --stdout \
-            --max-missing 0.8 --minDP 4 --maxDP 100 \
-            --minQ 30 --min-alleles 2 --max-alleles 2 | bgzip -c > "All_BIALLELIC_SNP_PASS_0.8_30.vcf.gz"
+        # Single streaming pass equivalent to:
+        #   vcftools --max-missing 0.8 --minDP 4 --maxDP 100 --minQ 30 --min-alleles 2 --max-alleles 2
+        #   bcftools view -e 'AC==0 || AC==AN || F_MISSING > 0.5' -m2 -M2
+        python3 "${FILTER_SCRIPT}" \
+            "../5-snps_filted/All_BIALLELIC_SNP_PASS.vcf.gz" \
+            "All_BIALLELIC_SNP_PASS_0.8_30_0.5.vcf.gz" \
+            --max-missing 0.8 --min-dp 4 --max-dp 100 --min-qual 30 \
+            --max-f-missing 0.5 \
+            --threads "${FILTER_THREADS}"
+        cd ..
+        ;;
+    9)
+        # SNP Matrix Generation
+        echo "[$(date)] STEP 9 START: SNP Matrix" | tee -a "${LOG}"
+        cd 7-snp_matrix
 
-        bcftools view -e 'AC==0 || AC==AN || F_MISSING > 0.5' \
-            -m2 -M2 -o "All_BIALLELIC_SNP_PASS_0.8_30_0.5.vcf.gz" \
-            -O z ./"All_BIALLELIC_SNP_PASS_0.8_30.vcf.gz"
+        for matrix_format in phylip nexus; do
+            python3 "${MATRIX_SCRIPT}" \
+                "../6-snps_further_filted/All_BIALLELIC_SNP_PASS_0.8_30_0.5.vcf.gz" \
+                "All_BIALLELIC_SNP_PASS_0.8_30_0.5.${matrix_format:0:3}" \
+                --format "${matrix_format}" \
+                --thin "${MATRIX_THIN}" \
+                ${MATRIX_OUTGROUP:+--outgroup "${MATRIX_OUTGROUP}"} \
+                --threads "${FILTER_THREADS}"
+        done
         cd ..
         ;;
     *)
@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# GATK Scatter-Gather Runner v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. At most N equal-sized genomic intervals from a reference .fai index (BED)
+2. Per-interval HaplotypeCaller jobs for all samples in one bounded worker pool
+3. Batched joint genotyping (GenomicsDBImport + GenotypeGVCFs) per interval
+4. Ordered gathering of interval results with bcftools concat + tabix
+5. Resume by input manifest: a job is skipped only when its output is indexed
+   and its command lines and input files (size, mtime) are unchanged
+
+Usage:
+    python GATK_Scatter_Gather.py intervals genome.fasta.fai 48 intervals/
+    python GATK_Scatter_Gather.py call -R genome.fasta --sample SpA=SpA_markdup.bam \\
+        --sample SpB=SpB_markdup.bam --intervals 48 --jobs 12 --out-dir 2-g_vcfs
+    python GATK_Scatter_Gather.py joint -R genome.fasta --gvcf-dir 2-g_vcfs \\
+        --intervals 48 --jobs 12 -o 3-vcfs/All.vcf.gz
+
+All external tools (gatk, bcftools, tabix) can be replaced by stub commands
+via --gatk/--bcftools/--tabix.
+"""
+
+import os
+import sys
+import glob
+import json
+import fcntl
+import shlex
+import argparse
+import subprocess
+from time import perf_counter
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Constants
+DEFAULT_JOBS = min(os.cpu_count() or 4, 8)
+DEFAULT_INTERVALS = 24
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_JAVA_OPTIONS = "-Xmx4g -XX:ParallelGCThreads=1"
+MANIFEST_SUFFIX = ".manifest.json"
+
+Interval = Tuple[str, int, int]
+
+
+class Job(NamedTuple):
+    """A unit of work: commands run sequentially, producing an indexed ``output``.
+
+    ``inputs`` are the files the commands read; they are stat'ed when the job
+    runs, so they may be produced by earlier jobs.
+    """
+    name: str
+    commands: List[List[str]]
+    output: str
+    inputs: Tuple[str, ...] = ()
+
+
+# ==============================================
+# Interval Balancing
+# ==============================================
+def read_fai(fai_path: str) -> List[Tuple[str, int]]:
+    """Read contig names and lengths from a samtools .fai index.
+
+    Args:
+        fai_path: Path to FASTA index file
+
+    Returns:
+        List of (contig, length) tuples in reference order
+
+    Raises:
+        FileNotFoundError: If index file doesn't exist
+        ValueError: If a line is malformed
+    """
+    if not os.path.exists(fai_path):
+        raise FileNotFoundError(f"Reference index not found: {fai_path}")
+
+    contigs = []
+    with open(fai_path, 'r') as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            parts = line.split('\t')
+            if len(parts) < 2:
+                raise ValueError(f"Invalid .fai line {line_num}: {line.strip()}")
+            contigs.append((parts[0], int(parts[1])))
+    return contigs
+
+
+def balance_intervals(contigs: List[Tuple[str, int]],
+                      n_intervals: int) -> List[List[Interval]]:
+    """Split contigs into at most ``n_intervals`` equal-sized interval groups.
+
+    The reference is treated as its contigs laid end to end and cut every
+    total / n_intervals bp, so groups differ by at most one base and only
+    contigs spanning a cut are split. Groups stay in reference order, so
+    gathered results keep reference order.
+
+    Args:
+        contigs: List of (contig, length) tuples in reference order
+        n_intervals: Desired number of interval groups
+
+    Returns:
+        List of groups, each a list of 1-based inclusive (contig, start, end)
+    """
+    if n_intervals < 1:
+        raise ValueError("Number of intervals must be ≥ 1")
+    contigs = [(contig, length) for contig, length in contigs if length > 0]
+    total = sum(length for _, length in contigs)
+    n_groups = min(n_intervals, total)
+    if n_groups == 0:
+        return []
+    # Group i covers genome positions [cuts[i], cuts[i + 1]) of the concatenation
+    cuts = [total * i // n_groups for i in range(n_groups + 1)]
+
+    groups: List[List[Interval]] = [[] for _ in range(n_groups)]
+    offset = 0
+    group = 0
+    for contig, length in contigs:
+        start = 0
+        while start < length:
+            while cuts[group + 1] <= offset + start:
+                group += 1
+            end = min(length, cuts[group + 1] - offset)
+            groups[group].append((contig, start + 1, end))
+            start = end
+        offset += length
+    return groups
+
+
+def write_interval_files(groups: List[List[Interval]], out_dir: str) -> List[str]:
+    """Write each interval group as a BED file (0-based, half-open).
+
+    BED keeps contig names containing ':' unambiguous, unlike ``c:s-e``
+    strings. Files whose content is unchanged are left untouched, so their
+    mtimes do not invalidate the manifests of finished jobs.
+
+    Args:
+        groups: Interval groups from balance_intervals
+        out_dir: Output directory
+
+    Returns:
+        List of written file paths, in group order
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for idx, group in enumerate(groups, 1):
+        path = os.path.join(out_dir, f"scatter_{idx:04d}.bed")
+        text = ''.join(f"{c}\t{s - 1}\t{e}\n" for c, s, e in group)
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                unchanged = f.read() == text
+        else:
+            unchanged = False
+        if not unchanged:
+            with open(path, 'w') as f:
+                f.write(text)
+        paths.append(path)
+    return paths
+
+
+# ==============================================
+# Job Scheduling
+# ==============================================
+def run_command(cmd: List[str]) -> None:
+    """Run one external command, raising CalledProcessError on failure."""
+    subprocess.run(cmd, check=True)
+
+
+def job_manifest(job: Job) -> Dict:
+    """Command lines of a job plus the size and mtime of each of its inputs.
+
+    Raises:
+        FileNotFoundError: If an input does not exist
+    """
+    inputs = []
+    for path in job.inputs:
+        stat = os.stat(path)
+        inputs.append([path, stat.st_size, stat.st_mtime_ns])
+    return {'commands': job.commands, 'inputs': inputs}
+
+
+def is_current(job: Job, manifest: Dict) -> bool:
+    """Whether the job's indexed output was produced from the same manifest."""
+    manifest_path = job.output + MANIFEST_SUFFIX
+    if not (os.path.exists(job.output + '.tbi') and os.path.exists(manifest_path)):
+        return False
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f) == manifest
+    except (OSError, ValueError):
+        return False
+
+
+def run_jobs(jobs: List[Job], max_workers: int,
+             runner: Callable[[List[str]], None] = run_command,
+             resume: bool = True) -> List[str]:
+    """Run jobs in a bounded worker pool.
+
+    Commands within a job run sequentially; jobs run concurrently with at most
+    ``max_workers`` in flight. With ``resume`` set, a job is skipped when its
+    output is indexed (``.tbi``) and the manifest written next to it matches
+    the current command lines and input files. The manifest is removed before
+    a job starts and written after its last command, so an interrupted job or
+    a changed input set causes a re-run.
+
+    Args:
+        jobs: Jobs to execute
+        max_workers: Maximum concurrent jobs
+        runner: Callable executing one command (replaceable for testing)
+        resume: Skip jobs with existing indexed outputs
+
+    Returns:
+        Job outputs in submission order
+
+    Raises:
+        RuntimeError: If any job fails
+    """
+    def execute(job: Job) -> None:
+        manifest = job_manifest(job)
+        if resume and is_current(job, manifest):
+            print(f"Skipping {job.name}: {job.output} is up to date")
+            return
+        manifest_path = job.output + MANIFEST_SUFFIX
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        start = perf_counter()
+        for cmd in job.commands:
+            runner(cmd)
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f)
+        print(f"Finished {job.name} in {perf_counter() - start:.1f}s")
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = [executor.submit(execute, job) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((job.name, str(e)))
+
+    if errors:
+        details = '\n'.join(f" - {name}: {err}" for name, err in errors[:3])
+        raise RuntimeError(f"{len(errors)} job(s) failed:\n{details}")
+    return [job.output for job in jobs]
+
+
+@contextmanager
+def work_dir_lock(work_dir: str) -> Iterator[None]:
+    """Hold an exclusive lock on a scatter work directory.
+
+    Raises:
+        RuntimeError: If another run holds the lock
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    with open(os.path.join(work_dir, '.lock'), 'w') as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise RuntimeError(f"Another run is using {work_dir}")
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+# ==============================================
+# Command Builders
+# ==============================================
+def gatk_cmd(gatk: str, java_options: str, tool: str) -> List[str]:
+    """Build the leading part of a GATK command line."""
+    return shlex.split(gatk) + ['--java-options', java_options, tool]
+
+
+def gather_job(name: str, parts: List[str], output: str,
+               bcftools: str, tabix: str) -> Job:
+    """Concatenate ordered interval VCFs and index the result."""
+    return Job(name, [
+        shlex.split(bcftools) + ['concat', '-O', 'z', '-o', output] + parts,
+        shlex.split(tabix) + ['-f', '-p', 'vcf', output],
+    ], output, tuple(parts))
+
+
+def haplotypecaller_jobs(samples: Dict[str, str], reference: str,
+                         interval_files: List[str], work_dir: str,
+                         args: argparse.Namespace) -> Dict[str, List[Job]]:
+    """Build per-sample, per-interval HaplotypeCaller jobs."""
+    jobs = {}
+    for sample, bam in samples.items():
+        sample_jobs = []
+        for interval_file in interval_files:
+            label = os.path.basename(interval_file).rsplit('.', 1)[0]
+            part = os.path.join(work_dir, f"{sample}.{label}.g.vcf.gz")
+            sample_jobs.append(Job(f"HaplotypeCaller {sample} {label}", [
+                gatk_cmd(args.gatk, args.java_options, 'HaplotypeCaller') + [
+                    '-R', reference, '-I', bam, '-L', interval_file,
+                    '--max-alternate-alleles', '3', '--sample-ploidy', '2',
+                    '-ERC', 'GVCF', '-O', part]
+            ], part, (bam, interval_file)))
+        jobs[sample] = sample_jobs
+    return jobs
+
+
+def joint_genotyping_jobs(gvcfs: List[str], reference: str,
+                          interval_files: List[str], work_dir: str,
+                          args: argparse.Namespace) -> List[Job]:
+    """Build per-interval GenomicsDBImport + GenotypeGVCFs jobs."""
+    jobs = []
+    for interval_file in interval_files:
+        label = os.path.basename(interval_file).rsplit('.', 1)[0]
+        workspace = os.path.join(work_dir, f"{label}_genomicsdb")
+        part = os.path.join(work_dir, f"joint.{label}.vcf.gz")
+        import_cmd = gatk_cmd(args.gatk, args.java_options, 'GenomicsDBImport') + [
+            '--genomicsdb-workspace-path', workspace,
+            '--overwrite-existing-genomicsdb-workspace', 'true',
+            '--batch-size', str(args.batch_size),
+            '--merge-input-intervals', '-L', interval_file]
+        for gvcf in gvcfs:
+            import_cmd += ['-V', gvcf]
+        jobs.append(Job(f"JointGenotyping {label}", [
+            import_cmd,
+            gatk_cmd(args.gatk, args.java_options, 'GenotypeGVCFs') + [
+                '-R', reference, '-V', f"gendb://{workspace}",
+                '-L', interval_file, '-O', part],
+        ], part, (interval_file, *gvcfs)))
+    return jobs
+
+
+# ==============================================
+# Subcommands
+# ==============================================
+def prepare_intervals(reference: str, n_intervals: int, work_dir: str) -> List[str]:
+    """Balance the reference index and write interval files."""
+    groups = balance_intervals(read_fai(reference + '.fai'), n_intervals)
+    paths = write_interval_files(groups, os.path.join(work_dir, 'intervals'))
+    print(f"Scattering over {len(paths)} intervals")
+    return paths
+
+
+def parse_samples(entries: List[str]) -> Dict[str, str]:
+    """Parse ``NAME=BAM`` sample specifications."""
+    samples = {}
+    for entry in entries:
+        name, sep, bam = entry.partition('=')
+        if not sep or not name or not bam:
+            raise ValueError(f"Invalid sample specification (NAME=BAM): {entry}")
+        samples[name] = os.path.abspath(bam)
+    return samples
+
+
+def cmd_intervals(args: argparse.Namespace) -> None:
+    groups = balance_intervals(read_fai(args.fai), args.n_intervals)
+    paths = write_interval_files(groups, args.out_dir)
+    print(f"Wrote {len(paths)} interval files to {args.out_dir}")
+
+
+def cmd_call(args: argparse.Namespace) -> None:
+    samples = parse_samples(args.sample)
+    os.makedirs(args.out_dir, exist_ok=True)
+    work_dir = os.path.abspath(args.work_dir or os.path.join(args.out_dir, 'scatter'))
+    with work_dir_lock(work_dir):
+        interval_files = prepare_intervals(args.reference, args.intervals, work_dir)
+        print(f"Calling {len(samples)} sample(s) in one pool of {args.jobs} jobs")
+
+        jobs = haplotypecaller_jobs(samples, args.reference, interval_files, work_dir, args)
+        run_jobs([job for sample_jobs in jobs.values() for job in sample_jobs],
+                 args.jobs, resume=args.resume)
+
+        gathers = [
+            gather_job(f"Gather {sample}", [job.output for job in sample_jobs],
+                       os.path.abspath(os.path.join(args.out_dir, f"{sample}.g.vcf.gz")),
+                       args.bcftools, args.tabix)
+            for sample, sample_jobs in jobs.items()
+        ]
+        run_jobs(gathers, args.jobs, resume=args.resume)
+
+
+def cmd_joint(args: argparse.Namespace) -> None:
+    gvcfs = sorted(os.path.abspath(p) for p in args.gvcf)
+    if args.gvcf_dir:
+        gvcfs += sorted(glob.glob(os.path.join(os.path.abspath(args.gvcf_dir), '*.g.vcf.gz')))
+    if not gvcfs:
+        raise ValueError("No gVCF inputs provided")
+    unindexed = [p for p in gvcfs if not os.path.exists(p + '.tbi')]
+    if unindexed:
+        raise ValueError(f"{len(unindexed)} gVCF(s) not indexed (still being written?): "
+                         + ', '.join(os.path.basename(p) for p in unindexed[:3]))
+    output = os.path.abspath(args.output)
+    work_dir = os.path.abspath(args.work_dir or os.path.join(os.path.dirname(output), 'scatter'))
+    with work_dir_lock(work_dir):
+        interval_files = prepare_intervals(args.reference, args.intervals, work_dir)
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+
+        print(f"Joint genotyping {len(gvcfs)} gVCFs (batch size {args.batch_size})")
+        jobs = joint_genotyping_jobs(gvcfs, args.reference, interval_files, work_dir, args)
+        parts = run_jobs(jobs, args.jobs, resume=args.resume)
+        run_jobs([gather_job("Gather joint", parts, output, args.bcftools, args.tabix)],
+                 1, resume=args.resume)
+
+
+# ==============================================
+# Main Control Flow
+# ==============================================
+def add_common_arguments(parser: argparse.ArgumentParser) -> None:
+    """Register options shared by the call and joint subcommands."""
+    parser.add_argument('-R', '--reference', required=True,
+                        help='Reference FASTA (with .fai index)')
+    parser.add_argument('--intervals', type=int, default=DEFAULT_INTERVALS,
+                        help='Number of scatter intervals')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS,
+                        help='Maximum concurrent interval jobs')
+    parser.add_argument('--work-dir', help='Directory for interval files and partial results')
+    parser.add_argument('--java-options', default=DEFAULT_JAVA_OPTIONS,
+                        help='Java options passed to each GATK job')
+    parser.add_argument('--no-resume', dest='resume', action='store_false',
+                        help='Re-run jobs even if their outputs are up to date')
+    parser.add_argument('--gatk', default='gatk', help='GATK command')
+    parser.add_argument('--bcftools', default='bcftools', help='bcftools command')
+    parser.add_argument('--tabix', default='tabix', help='tabix command')
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Main execution flow with argument parsing."""
+    parser = argparse.ArgumentParser(
+        description="Scatter-gather runner for GATK variant calling",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p_int = subparsers.add_parser('intervals', help='Write balanced interval files',
+                                  formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    p_int.add_argument('fai', help='Reference .fai index')
+    p_int.add_argument('n_intervals', type=int, help='Number of intervals')
+    p_int.add_argument('out_dir', help='Output directory')
+    p_int.set_defaults(func=cmd_intervals)
+
+    p_call = subparsers.add_parser('call', help='Scattered HaplotypeCaller (gVCF)',
+                                   formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    add_common_arguments(p_call)
+    p_call.add_argument('--sample', action='append', required=True,
+                        help='Sample as NAME=BAM (repeatable)')
+    p_call.add_argument('--out-dir', default='.', help='Directory for gathered gVCFs')
+    p_call.set_defaults(func=cmd_call)
+
+    p_joint = subparsers.add_parser('joint', help='Scattered batched joint genotyping',
+                                    formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    add_common_arguments(p_joint)
+    p_joint.add_argument('--gvcf', action='append', default=[],
+                         help='Input gVCF (repeatable)')
+    p_joint.add_argument('--gvcf-dir', help='Directory of *.g.vcf.gz inputs')
+    p_joint.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                         help='Samples read at once by GenomicsDBImport')
+    p_joint.add_argument('-o', '--output', required=True, help='Joint-genotyped VCF')
+    p_joint.set_defaults(func=cmd_joint)
+
+    args = parser.parse_args(argv)
+    start_time = perf_counter()
+    try:
+        args.func(args)
+    except (ValueError, FileNotFoundError, RuntimeError) as e:
+        sys.exit(f"Error: {e}")
+    print(f"\nTotal execution time: {perf_counter() - start_time:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
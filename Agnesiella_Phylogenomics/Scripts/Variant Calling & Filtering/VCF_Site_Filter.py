@@ -0,0 +1,537 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Streaming VCF Site/Genotype Filter v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. Single streaming pass replacing the vcftools + bcftools double filter
+2. Chunked NumPy parsing of genotypes and depths
+3. Parallel BGZF block decompression and compression
+4. BGZF output with a tabix (.tbi) index
+
+Filters (defaults match the original step 8):
+    vcftools --max-missing 0.8 --minDP 4 --maxDP 100 --minQ 30
+             --min-alleles 2 --max-alleles 2
+    bcftools view -e 'AC==0 || AC==AN || F_MISSING > 0.5' -m2 -M2
+
+Genotypes failing the depth filter are set to missing, and AC/AN/AF are
+recomputed from the remaining calls (INFO values are updated when present).
+
+Usage:
+    python VCF_Site_Filter.py All_BIALLELIC_SNP_PASS.vcf.gz \\
+        All_BIALLELIC_SNP_PASS_0.8_30_0.5.vcf.gz --threads 8
+"""
+
+import os
+import re
+import sys
+import gzip
+import zlib
+import struct
+import argparse
+from collections import deque
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Constants
+DEFAULT_THREADS = min(os.cpu_count() or 4, 8)
+BGZF_BLOCK_SIZE = 0xff00  # Uncompressed bytes per block, as used by htslib
+BGZF_EOF = bytes.fromhex('1f8b08040000000000ff0600424302001b0003000000000000000000')
+BATCH_BLOCKS = 64         # BGZF blocks decompressed per parallel batch
+TEXT_CHUNK_BYTES = BGZF_BLOCK_SIZE * BATCH_BLOCKS
+TBI_MAX_POSITION = 1 << 29
+
+
+# ==============================================
+# BGZF Input
+# ==============================================
+def is_bgzf(path: str) -> bool:
+    """Check whether a file starts with a BGZF block header."""
+    with open(path, 'rb') as handle:
+        header = handle.read(18)
+    return (len(header) == 18 and header[:4] == b'\x1f\x8b\x08\x04'
+            and header[12:14] == b'BC')
+
+
+def iter_bgzf_blocks(handle) -> Iterator[bytes]:
+    """Yield the raw deflate payload of each BGZF block.
+
+    Raises:
+        ValueError: If a block header is malformed or truncated
+    """
+    while True:
+        header = handle.read(12)
+        if not header:
+            return
+        if len(header) < 12 or header[:4] != b'\x1f\x8b\x08\x04':
+            raise ValueError("Invalid BGZF block header")
+        xlen = struct.unpack('<H', header[10:12])[0]
+        extra = handle.read(xlen)
+
+        bsize = None
+        pos = 0
+        while pos + 4 <= len(extra):
+            slen = struct.unpack('<H', extra[pos + 2:pos + 4])[0]
+            if extra[pos:pos + 2] == b'BC' and slen == 2:
+                bsize = struct.unpack('<H', extra[pos + 4:pos + 6])[0]
+            pos += 4 + slen
+        if bsize is None:
+            raise ValueError("BGZF block without BC subfield")
+
+        remaining = bsize + 1 - 12 - xlen
+        body = handle.read(remaining)
+        if len(body) != remaining:
+            raise ValueError("Truncated BGZF block")
+        yield body[:-8]
+
+
+def inflate_block(cdata: bytes) -> bytes:
+    """Decompress one raw deflate payload (releases the GIL)."""
+    return zlib.decompress(cdata, -15)
+
+
+def iter_text_chunks(path: str, executor: ThreadPoolExecutor) -> Iterator[bytes]:
+    """Yield decompressed chunks of the input, decompressing ahead in parallel.
+
+    BGZF input is inflated block-wise in the thread pool with one batch of
+    lookahead; plain gzip and uncompressed input are read sequentially.
+    """
+    if not is_bgzf(path):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as handle:
+            while True:
+                chunk = handle.read(TEXT_CHUNK_BYTES)
+                if not chunk:
+                    return
+                yield chunk
+
+    with open(path, 'rb') as handle:
+        blocks = iter_bgzf_blocks(handle)
+        pending = deque()
+
+        def submit_batch() -> bool:
+            batch = [b for _, b in zip(range(BATCH_BLOCKS), blocks)]
+            if batch:
+                pending.append([executor.submit(inflate_block, b) for b in batch])
+            return bool(batch)
+
+        submit_batch()
+        submit_batch()
+        while pending:
+            futures = pending.popleft()
+            submit_batch()
+            yield b''.join(f.result() for f in futures)
+
+
+def iter_line_chunks(path: str, executor: ThreadPoolExecutor) -> Iterator[List[bytes]]:
+    """Yield lists of complete lines (without newlines)."""
+    tail = b''
+    for chunk in iter_text_chunks(path, executor):
+        lines = (tail + chunk).split(b'\n')
+        tail = lines.pop()
+        if lines:
+            yield lines
+    if tail:
+        yield [tail]
+
+
+# ==============================================
+# BGZF Output and Tabix Index
+# ==============================================
+def bgzf_block(data: bytes, level: int = 6) -> bytes:
+    """Compress data into a single BGZF block."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    header = struct.pack('<4BI2BH2BHH', 0x1f, 0x8b, 8, 4, 0, 0, 0xff,
+                         6, ord('B'), ord('C'), 2, len(cdata) + 25)
+    return header + cdata + struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+
+
+class BgzfWriter:
+    """BGZF writer compressing full blocks in parallel.
+
+    Blocks are always cut at BGZF_BLOCK_SIZE uncompressed bytes, so the
+    virtual offset of any uncompressed position already passed to write()
+    is known as soon as write() returns.
+    """
+
+    def __init__(self, path: str, executor: ThreadPoolExecutor, level: int = 6):
+        self.handle = open(path, 'wb')
+        self.executor = executor
+        self.level = level
+        self.pending = b''
+        self.position = 0          # Uncompressed bytes accepted so far
+        self.block_starts = [0]    # Compressed offset of each block
+
+    def voffset(self, position: int) -> int:
+        """Convert an uncompressed position into a BGZF virtual offset."""
+        block, within = divmod(position, BGZF_BLOCK_SIZE)
+        return (self.block_starts[block] << 16) | within
+
+    def write(self, data: bytes) -> None:
+        self.position += len(data)
+        data = self.pending + data
+        n_full = len(data) // BGZF_BLOCK_SIZE
+        self.pending = data[n_full * BGZF_BLOCK_SIZE:]
+        chunks = [data[i * BGZF_BLOCK_SIZE:(i + 1) * BGZF_BLOCK_SIZE]
+                  for i in range(n_full)]
+        for block in self.executor.map(bgzf_block, chunks, [self.level] * n_full):
+            self.handle.write(block)
+            self.block_starts.append(self.block_starts[-1] + len(block))
+
+    def close(self) -> None:
+        if self.pending:
+            self.handle.write(bgzf_block(self.pending, self.level))
+        self.handle.write(BGZF_EOF)
+        self.handle.close()
+
+
+def reg2bin(beg: int, end: int) -> int:
+    """UCSC/tabix bin for a 0-based, half-open interval."""
+    end -= 1
+    for shift, offset in ((14, 4681), (17, 585), (20, 73), (23, 9), (26, 1)):
+        if beg >> shift == end >> shift:
+            return offset + (beg >> shift)
+    return 0
+
+
+class TabixIndexer:
+    """Incremental tabix index builder for coordinate-sorted VCF records."""
+
+    PSEUDO_BIN = 37450
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.refs: Dict[bytes, dict] = {}
+        self.current: Optional[bytes] = None
+        self.last_pos = -1
+
+    def add(self, chrom: bytes, beg: int, end: int, vbeg: int, vend: int) -> None:
+        """Register one record spanning [beg, end) at virtual offsets [vbeg, vend).
+
+        Raises:
+            ValueError: If records are not coordinate-sorted
+        """
+        if chrom != self.current:
+            if chrom in self.refs:
+                raise ValueError(f"Unsorted input: {chrom.decode()} appears in two blocks")
+            self.refs[chrom] = {'bins': {}, 'linear': [], 'beg': vbeg, 'end': vend, 'n': 0}
+            self.names.append(chrom.decode())
+            self.current, self.last_pos = chrom, -1
+        if beg < self.last_pos:
+            raise ValueError(f"Unsorted input at {chrom.decode()}:{beg + 1}")
+        if end > TBI_MAX_POSITION:
+            raise ValueError(f"Position {end} exceeds the tabix limit of 2^29")
+        self.last_pos = beg
+
+        ref = self.refs[chrom]
+        chunks = ref['bins'].setdefault(reg2bin(beg, end), [])
+        if chunks and (chunks[-1][1] == vbeg or chunks[-1][1] >> 16 == vbeg >> 16):
+            chunks[-1][1] = vend
+        else:
+            chunks.append([vbeg, vend])
+
+        linear = ref['linear']
+        last_window = (end - 1) >> 14
+        if len(linear) <= last_window:
+            linear.extend([None] * (last_window + 1 - len(linear)))
+        for window in range(beg >> 14, last_window + 1):
+            if linear[window] is None:
+                linear[window] = vbeg
+        ref['end'] = vend
+        ref['n'] += 1
+
+    def write(self, path: str) -> None:
+        """Write the index as a BGZF-compressed .tbi file."""
+        names = b''.join(name.encode() + b'\0' for name in self.names)
+        parts = [b'TBI\x01', struct.pack('<8i', len(self.names), 2, 1, 2, 0,
+                                         ord('#'), 0, len(names)), names]
+        for chrom in self.refs:
+            ref = self.refs[chrom]
+            bins = ref['bins']
+            parts.append(struct.pack('<i', len(bins) + 1))
+            for bin_id, chunks in bins.items():
+                parts.append(struct.pack('<Ii', bin_id, len(chunks)))
+                parts.extend(struct.pack('<QQ', b, e) for b, e in chunks)
+            parts.append(struct.pack('<IiQQQQ', self.PSEUDO_BIN, 2,
+                                     ref['beg'], ref['end'], ref['n'], 0))
+
+            linear = ref['linear']
+            previous = ref['beg']
+            parts.append(struct.pack('<i', len(linear)))
+            for offset in linear:
+                previous = previous if offset is None else offset
+                parts.append(struct.pack('<Q', previous))
+        parts.append(struct.pack('<Q', 0))
+
+        data = b''.join(parts)
+        with open(path, 'wb') as f:
+            for i in range(0, len(data), BGZF_BLOCK_SIZE):
+                f.write(bgzf_block(data[i:i + BGZF_BLOCK_SIZE]))
+            f.write(BGZF_EOF)
+
+
+# ==============================================
+# Vectorized Filtering
+# ==============================================
+class FilterParams:
+    """Site- and genotype-level thresholds."""
+
+    def __init__(self, min_qual: float, min_dp: int, max_dp: int,
+                 max_missing: float, max_f_missing: float):
+        self.min_qual = min_qual
+        self.min_dp = min_dp
+        self.max_dp = max_dp
+        self.max_missing = max_missing
+        self.max_f_missing = max_f_missing
+
+
+def parse_qual(value: bytes) -> float:
+    return float('nan') if value == b'.' else float(value)
+
+
+def split_format_fields(calls: List[bytes], n_keys: int) -> np.ndarray:
+    """Split sample fields into an (n_calls, n_keys) bytes array.
+
+    Uses a single join/split when every call carries all FORMAT keys and
+    falls back to per-call padding for truncated fields (e.g. ``./.``).
+    """
+    flat = b':'.join(calls).split(b':')
+    if len(flat) == len(calls) * n_keys:
+        return np.array(flat).reshape(len(calls), n_keys)
+    rows = [c.split(b':') for c in calls]
+    rows = [r + [b'.'] * (n_keys - len(r)) if len(r) < n_keys else r[:n_keys] for r in rows]
+    return np.array(rows).reshape(len(calls), n_keys)
+
+
+def decode_genotypes(gt: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Decode single-digit biallelic GT strings.
+
+    Returns:
+        Tuple of (missing mask, alt allele count, called allele count) per call
+    """
+    raw = np.frombuffer(gt.astype('S3').tobytes(), dtype=np.uint8).reshape(-1, 3)
+    haploid = raw[:, 1] == 0
+    first = raw[:, 0].astype(np.int16) - 48
+    second = np.where(haploid, 0, raw[:, 2].astype(np.int16) - 48)
+    missing = (first < 0) | (first > 9) | (second < 0) | (second > 9)
+    alt = (first == 1).astype(np.int8) + ((second == 1) & ~haploid).astype(np.int8)
+    ploidy = np.where(haploid, 1, 2).astype(np.int8)
+    return missing, alt, ploidy
+
+
+def parse_depths(dp: np.ndarray) -> np.ndarray:
+    """Convert DP strings to integers, with -1 for missing values."""
+    dp = np.where((dp == b'.') | (dp == b''), b'-1', dp)
+    return dp.astype(np.int32)
+
+
+INFO_TAG = {tag: re.compile(rb'(^|;)' + tag + rb'=[^;]*') for tag in (b'AC', b'AN', b'AF')}
+
+
+def update_info(info: bytes, ac: int, an: int) -> bytes:
+    """Rewrite INFO AC/AN/AF tags (when present) from recomputed counts."""
+    values = {b'AC': b'%d' % ac, b'AN': b'%d' % an,
+              b'AF': (b'%.4g' % (ac / an)) if an else b'.'}
+    for tag, pattern in INFO_TAG.items():
+        if tag + b'=' in info:
+            info = pattern.sub(lambda m: m.group(1) + tag + b'=' + values[tag], info)
+    return info
+
+
+def mask_call(call: bytes) -> bytes:
+    """Replace the GT of a sample field with a missing genotype."""
+    gt, sep, rest = call.partition(b':')
+    missing = b'.' if len(gt) == 1 else b'./.'
+    return missing + sep + rest
+
+
+def filter_records(lines: List[bytes], n_samples: int, params: FilterParams,
+                   counts: Dict[str, int]) -> List[bytes]:
+    """Filter a chunk of VCF records and return the retained lines.
+
+    Args:
+        lines: Data lines (no header), without trailing newlines
+        n_samples: Number of sample columns
+        params: Filtering thresholds
+        counts: Running per-filter exclusion counts, updated in place
+
+    Returns:
+        Retained (and genotype-masked) record lines
+    """
+    records = [line.split(b'\t', 9) for line in lines if line]
+    counts['input'] += len(records)
+    if not records:
+        return []
+
+    alt = [r[4] for r in records]
+    biallelic = np.fromiter((a != b'.' and b',' not in a for a in alt), bool, len(records))
+    qual = np.fromiter((parse_qual(r[5]) for r in records), float, len(records))
+    qual_ok = qual >= params.min_qual
+    counts['multiallelic'] += int((~biallelic).sum())
+    counts['low_qual'] += int((biallelic & ~qual_ok).sum())
+
+    candidates = np.flatnonzero(biallelic & qual_ok)
+    if candidates.size == 0:
+        return []
+
+    # Group candidate records by FORMAT so each group parses as one matrix
+    groups: Dict[bytes, List[int]] = {}
+    for i in candidates:
+        groups.setdefault(records[i][8], []).append(i)
+
+    kept = {}
+    for fmt, idx in groups.items():
+        keys = fmt.split(b':')
+        if b'GT' not in keys:
+            chrom, pos = records[idx[0]][:2]
+            raise ValueError(f"FORMAT '{fmt.decode()}' has no GT field "
+                             f"(record {chrom.decode()}:{pos.decode()})")
+        calls = b'\t'.join(records[i][9] for i in idx).split(b'\t')
+        if len(calls) != len(idx) * n_samples:
+            raise ValueError("Sample column count does not match the header")
+        fields = split_format_fields(calls, len(keys))
+
+        missing, alt_count, ploidy = decode_genotypes(fields[:, keys.index(b'GT')])
+        if b'DP' in keys:
+            depth = parse_depths(fields[:, keys.index(b'DP')])
+        else:
+            depth = np.full(len(calls), -1, dtype=np.int32)
+        depth_fail = ((depth < params.min_dp) | (depth > params.max_dp)) & ~missing
+
+        called = (~missing & ~depth_fail).reshape(len(idx), n_samples)
+        alt_count = np.where(called.ravel(), alt_count, 0).reshape(len(idx), n_samples)
+        ploidy = np.where(called.ravel(), ploidy, 0).reshape(len(idx), n_samples)
+        depth_fail = depth_fail.reshape(len(idx), n_samples)
+
+        call_rate = called.sum(axis=1) / n_samples
+        ac = alt_count.sum(axis=1)
+        an = ploidy.sum(axis=1)
+        missing_ok = call_rate >= params.max_missing
+        variable_ok = (ac > 0) & (ac < an)
+        f_missing_ok = (1 - call_rate) <= params.max_f_missing
+        counts['max_missing'] += int((~missing_ok).sum())
+        counts['monomorphic'] += int((missing_ok & ~variable_ok).sum())
+        counts['f_missing'] += int((missing_ok & variable_ok & ~f_missing_ok).sum())
+
+        for row in np.flatnonzero(missing_ok & variable_ok & f_missing_ok):
+            record = records[idx[row]]
+            if depth_fail[row].any():
+                sample_calls = calls[row * n_samples:(row + 1) * n_samples]
+                for s in np.flatnonzero(depth_fail[row]):
+                    sample_calls[s] = mask_call(sample_calls[s])
+                record = record[:9] + [b'\t'.join(sample_calls)]
+            else:
+                record = list(record)
+            record[7] = update_info(record[7], int(ac[row]), int(an[row]))
+            kept[idx[row]] = b'\t'.join(record)
+
+    return [kept[i] for i in sorted(kept)]
+
+
+# ==============================================
+# Main Control Flow
+# ==============================================
+def filter_vcf(input_path: str, output_path: str, params: FilterParams,
+               threads: int, level: int = 6) -> Dict[str, int]:
+    """Stream-filter a VCF into an indexed BGZF file.
+
+    Returns:
+        Dictionary of record counts per filter stage
+    """
+    counts = dict.fromkeys(['input', 'multiallelic', 'low_qual', 'max_missing',
+                            'monomorphic', 'f_missing', 'output'], 0)
+    indexer = TabixIndexer()
+    n_samples = None
+    header = []
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        writer = BgzfWriter(output_path, executor, level)
+        try:
+            for lines in iter_line_chunks(input_path, executor):
+                if n_samples is None:
+                    while lines and lines[0].startswith(b'#'):
+                        line = lines.pop(0)
+                        if line.startswith(b'#CHROM'):
+                            n_samples = len(line.split(b'\t')) - 9
+                            if n_samples < 1:
+                                raise ValueError("Genotype filters require sample columns")
+                            header.append(b'##VCF_Site_Filter=<minQ=%g,minDP=%d,maxDP=%d,'
+                                          b'maxMissing=%g,maxFMissing=%g>'
+                                          % (params.min_qual, params.min_dp, params.max_dp,
+                                             params.max_missing, params.max_f_missing))
+                        header.append(line)
+                    if n_samples is None:
+                        continue
+                    writer.write(b'\n'.join(header) + b'\n')
+
+                kept = filter_records(lines, n_samples, params, counts)
+                position = writer.position
+                spans = []
+                for line in kept:
+                    chrom, pos, _, ref, _ = line.split(b'\t', 4)
+                    beg = int(pos) - 1
+                    spans.append((chrom, beg, beg + max(len(ref), 1),
+                                  position, position + len(line) + 1))
+                    position += len(line) + 1
+                if kept:
+                    writer.write(b'\n'.join(kept) + b'\n')
+                for chrom, beg, end, ubeg, uend in spans:
+                    indexer.add(chrom, beg, end, writer.voffset(ubeg), writer.voffset(uend))
+                counts['output'] += len(kept)
+        finally:
+            writer.close()
+
+    if n_samples is None:
+        raise ValueError(f"No #CHROM header line found in {input_path}")
+    indexer.write(output_path + '.tbi')
+    return counts
+
+
+def main():
+    """Main execution routine."""
+    parser = argparse.ArgumentParser(
+        description="Streaming site/genotype filter for multi-sample VCFs",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("input_vcf", help="Input VCF (plain, gzip or BGZF)")
+    parser.add_argument("output_vcf", help="Output BGZF VCF (.tbi written alongside)")
+    parser.add_argument("--min-qual", type=float, default=30.0, help="Minimum site QUAL")
+    parser.add_argument("--min-dp", type=int, default=4, help="Minimum genotype DP")
+    parser.add_argument("--max-dp", type=int, default=100, help="Maximum genotype DP")
+    parser.add_argument("--max-missing", type=float, default=0.8,
+                        help="Minimum proportion of called genotypes (vcftools semantics)")
+    parser.add_argument("--max-f-missing", type=float, default=0.5,
+                        help="Maximum proportion of missing genotypes")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="Threads for BGZF decompression/compression")
+    parser.add_argument("--level", type=int, default=6, help="Compression level")
+    args = parser.parse_args()
+
+    params = FilterParams(args.min_qual, args.min_dp, args.max_dp,
+                          args.max_missing, args.max_f_missing)
+    start_time = perf_counter()
+    try:
+        counts = filter_vcf(args.input_vcf, args.output_vcf, params,
+                            args.threads, args.level)
+    except (ValueError, FileNotFoundError) as e:
+        sys.exit(f"Error: {e}")
+
+    print(f"Filtering completed in {perf_counter() - start_time:.2f}s")
+    print(f"Statistical Report:\n"
+          f"- Input sites: {counts['input']}\n"
+          f"- Not biallelic: {counts['multiallelic']}\n"
+          f"- QUAL < {params.min_qual:g}: {counts['low_qual']}\n"
+          f"- Call rate < {params.max_missing:g}: {counts['max_missing']}\n"
+          f"- AC==0 or AC==AN: {counts['monomorphic']}\n"
+          f"- F_MISSING > {params.max_f_missing:g}: {counts['f_missing']}\n"
+          f"- Retained sites: {counts['output']}")
+    print(f"Results written to: {args.output_vcf}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# VCF to SNP Matrix Converter v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. Streams plain/gzip/BGZF VCFs (parallel BGZF decompression)
+2. Packs genotypes into a 2-bit-per-call array (samples x sites / 4 bytes)
+3. PHYLIP or NEXUS output with IUPAC heterozygote codes
+4. Sample subsetting, outgroup-first ordering and one-SNP-per-window thinning
+
+Usage:
+    python VCF_to_SNP_Matrix.py All_BIALLELIC_SNP_PASS_0.8_30_0.5.vcf.gz \\
+        All_SNPs.phy --outgroup Outgroup_sp --thin 1000 --threads 8
+"""
+
+import os
+import sys
+import argparse
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from VCF_Site_Filter import decode_genotypes, iter_line_chunks, split_format_fields
+
+# Constants
+DEFAULT_THREADS = min(os.cpu_count() or 4, 8)
+CODE_REF, CODE_HET, CODE_ALT, CODE_MISSING = 0, 1, 2, 3
+IUPAC = {
+    frozenset('AG'): 'R', frozenset('CT'): 'Y', frozenset('CG'): 'S',
+    frozenset('AT'): 'W', frozenset('GT'): 'K', frozenset('AC'): 'M',
+}
+BASES = 'ACGT'
+MISSING_SYMBOL = {'phylip': 'N', 'nexus': '?'}
+
+# Per-(ref, alt) heterozygote symbol, indexed by base position in BASES
+HET_TABLE = np.full((4, 4), ord('N'), dtype=np.uint8)
+for _i, _a in enumerate(BASES):
+    for _j, _b in enumerate(BASES):
+        if _a != _b:
+            HET_TABLE[_i, _j] = ord(IUPAC[frozenset(_a + _b)])
+BASE_INDEX = np.full(256, 255, dtype=np.uint8)
+for _i, _a in enumerate(BASES):
+    BASE_INDEX[ord(_a)] = BASE_INDEX[ord(_a.lower())] = _i
+
+
+# ==============================================
+# 2-bit Genotype Packing
+# ==============================================
+def pack_codes(codes: np.ndarray) -> np.ndarray:
+    """Pack an (n_samples, n_sites) code matrix into 4 sites per byte.
+
+    ``n_sites`` must be a multiple of 4.
+    """
+    c = codes.reshape(codes.shape[0], -1, 4).astype(np.uint8)
+    return c[:, :, 0] | (c[:, :, 1] << 2) | (c[:, :, 2] << 4) | (c[:, :, 3] << 6)
+
+
+def unpack_codes(packed: np.ndarray, n_sites: int) -> np.ndarray:
+    """Unpack a 1-D packed row back into ``n_sites`` 2-bit codes."""
+    shifts = np.array([0, 2, 4, 6], dtype=np.uint8)
+    return ((packed[:, None] >> shifts) & 3).ravel()[:n_sites]
+
+
+class PackedMatrix:
+    """Growable samples x sites genotype matrix stored at 2 bits per call.
+
+    Sites are appended chunk-wise; fewer than four trailing sites are carried
+    over until the next chunk so every stored block is byte-aligned.
+    """
+
+    def __init__(self, n_samples: int):
+        self.n_samples = n_samples
+        self.blocks: List[np.ndarray] = []
+        self.carry = np.empty((n_samples, 0), dtype=np.uint8)
+        self.ref: List[np.ndarray] = []
+        self.alt: List[np.ndarray] = []
+        self.n_sites = 0
+
+    def append(self, codes: np.ndarray, ref: np.ndarray, alt: np.ndarray) -> None:
+        """Append sites given as an (n_samples, n) code matrix with allele bases."""
+        if codes.shape[1] == 0:
+            return
+        codes = np.concatenate([self.carry, codes], axis=1)
+        usable = codes.shape[1] - codes.shape[1] % 4
+        if usable:
+            self.blocks.append(pack_codes(codes[:, :usable]))
+        self.carry = codes[:, usable:]
+        self.ref.append(ref)
+        self.alt.append(alt)
+        self.n_sites += ref.size
+
+    def finish(self) -> None:
+        """Flush carried-over sites, padding the last byte with missing codes."""
+        if self.carry.shape[1]:
+            pad = np.full((self.n_samples, 4 - self.carry.shape[1]), CODE_MISSING, np.uint8)
+            self.blocks.append(pack_codes(np.concatenate([self.carry, pad], axis=1)))
+            self.carry = self.carry[:, :0]
+        self.ref = [np.concatenate(self.ref)] if self.ref else [np.empty(0, np.uint8)]
+        self.alt = [np.concatenate(self.alt)] if self.alt else [np.empty(0, np.uint8)]
+
+    def row(self, sample: int) -> np.ndarray:
+        """Return the unpacked code vector for one sample."""
+        packed = np.concatenate([block[sample] for block in self.blocks]) \
+            if self.blocks else np.empty(0, np.uint8)
+        return unpack_codes(packed, self.n_sites)
+
+    def nbytes(self) -> int:
+        return sum(block.nbytes for block in self.blocks)
+
+
+# ==============================================
+# VCF Streaming
+# ==============================================
+def window_filter(chroms: List[bytes], positions: np.ndarray, window: int,
+                  last: Tuple[Optional[bytes], int]) -> Tuple[np.ndarray, Tuple[Optional[bytes], int]]:
+    """Keep the first SNP of each fixed ``window``-bp bin per chromosome.
+
+    Args:
+        chroms: Chromosome of each site
+        positions: 1-based positions
+        window: Window size in bp (0 disables thinning)
+        last: (chrom, bin) of the last kept site from previous chunks
+
+    Returns:
+        Tuple of (keep mask, updated last kept (chrom, bin))
+    """
+    if window <= 0 or not chroms:
+        return np.ones(len(chroms), dtype=bool), last
+    bins = (positions - 1) // window
+    new_chrom = np.fromiter((a != b for a, b in zip(chroms[1:], chroms[:-1])),
+                            bool, len(chroms) - 1)
+    keep = np.ones(len(chroms), dtype=bool)
+    keep[1:] = new_chrom | (bins[1:] != bins[:-1])
+    if last[0] == chroms[0] and last[1] == bins[0]:
+        keep[0] = False
+    return keep, (chroms[-1], int(bins[-1]))
+
+
+def read_samples(header_line: bytes) -> List[str]:
+    return [s.decode() for s in header_line.rstrip(b'\r').split(b'\t')[9:]]
+
+
+def build_matrix(vcf_path: str, samples: Optional[List[str]], outgroup: Optional[str],
+                 window: int, keep_invariant: bool,
+                 threads: int) -> Tuple[List[str], PackedMatrix, Dict[str, int]]:
+    """Stream a VCF into a packed genotype matrix.
+
+    Args:
+        vcf_path: Input VCF
+        samples: Samples to keep (None keeps all, in VCF order)
+        outgroup: Sample moved to the first row (None keeps the order)
+        window: Thinning window in bp (0 disables thinning)
+        keep_invariant: Keep sites without variation among selected samples
+        threads: Threads for BGZF decompression
+
+    Returns:
+        Tuple of (selected sample names, packed matrix, site counts)
+
+    Raises:
+        ValueError: If the header is missing or requested samples are absent
+    """
+    counts = dict.fromkeys(['input', 'not_snp', 'invariant', 'thinned', 'output'], 0)
+    names: Optional[List[str]] = None
+    columns = None
+    matrix = None
+    last = (None, -1)
+
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        for lines in iter_line_chunks(vcf_path, executor):
+            if names is None:
+                while lines and lines[0].startswith(b'#'):
+                    line = lines.pop(0)
+                    if line.startswith(b'#CHROM'):
+                        names = read_samples(line)
+                if names is None:
+                    continue
+                if samples is None:
+                    samples = names
+                if outgroup:
+                    samples = [outgroup] + [s for s in samples if s != outgroup]
+                absent = [s for s in samples if s not in names]
+                if absent:
+                    raise ValueError(f"Samples not in VCF: {', '.join(absent)}")
+                columns = np.array([names.index(s) for s in samples])
+                matrix = PackedMatrix(len(samples))
+
+            records = [line.split(b'\t', 9) for line in lines if line]
+            counts['input'] += len(records)
+            n_records = len(records)
+            records = [r for r in records if len(r[3]) == 1 and len(r[4]) == 1
+                       and BASE_INDEX[r[3][0]] < 4 and BASE_INDEX[r[4][0]] < 4]
+            counts['not_snp'] += n_records - len(records)
+            if not records:
+                continue
+
+            chroms = [r[0] for r in records]
+            positions = np.fromiter((int(r[1]) for r in records), np.int64, len(records))
+            codes = np.full((len(records), len(samples)), CODE_MISSING, dtype=np.uint8)
+
+            groups: Dict[bytes, List[int]] = {}
+            for i, r in enumerate(records):
+                groups.setdefault(r[8], []).append(i)
+            for fmt, idx in groups.items():
+                keys = fmt.split(b':')
+                calls = b'\t'.join(records[i][9] for i in idx).split(b'\t')
+                if len(calls) != len(idx) * len(names):
+                    raise ValueError("Sample column count does not match the header")
+                if len(samples) != len(names) or columns.tolist() != list(range(len(names))):
+                    calls = list(np.array(calls, dtype=object)
+                                 .reshape(len(idx), len(names))[:, columns].ravel())
+                if b'GT' not in keys:
+                    chrom, pos = records[idx[0]][:2]
+                    raise ValueError(f"FORMAT '{fmt.decode()}' has no GT field "
+                                     f"(record {chrom.decode()}:{pos.decode()})")
+                gt = split_format_fields(calls, len(keys))[:, keys.index(b'GT')]
+                missing, alt, ploidy = decode_genotypes(gt)
+                group_codes = np.where(ploidy == 1, alt * 2, alt).astype(np.uint8)
+                group_codes[missing] = CODE_MISSING
+                codes[idx] = group_codes.reshape(len(idx), len(samples))
+
+            keep = np.ones(len(records), dtype=bool)
+            if not keep_invariant:
+                has_ref = ((codes == CODE_REF) | (codes == CODE_HET)).any(axis=1)
+                has_alt = ((codes == CODE_ALT) | (codes == CODE_HET)).any(axis=1)
+                keep = has_ref & has_alt
+                counts['invariant'] += int((~keep).sum())
+
+            kept_idx = np.flatnonzero(keep)
+            thin, last = window_filter([chroms[i] for i in kept_idx], positions[kept_idx],
+                                       window, last)
+            counts['thinned'] += int((~thin).sum())
+            kept_idx = kept_idx[thin]
+            counts['output'] += kept_idx.size
+
+            ref = BASE_INDEX[np.fromiter((records[i][3][0] for i in kept_idx), np.uint8, kept_idx.size)]
+            alt_base = BASE_INDEX[np.fromiter((records[i][4][0] for i in kept_idx), np.uint8, kept_idx.size)]
+            matrix.append(codes[kept_idx].T, ref, alt_base)
+
+    if names is None:
+        raise ValueError(f"No #CHROM header line found in {vcf_path}")
+    matrix.finish()
+    return list(samples), matrix, counts
+
+
+# ==============================================
+# Matrix Output
+# ==============================================
+def site_symbols(matrix: PackedMatrix, missing: str) -> np.ndarray:
+    """Character of each genotype code at each site, as a (4, n_sites) table."""
+    ref, alt = matrix.ref[0], matrix.alt[0]
+    bases = np.frombuffer(BASES.encode(), dtype=np.uint8)
+    symbols = np.empty((4, ref.size), dtype=np.uint8)
+    symbols[CODE_REF] = bases[ref]
+    symbols[CODE_HET] = HET_TABLE[ref, alt]
+    symbols[CODE_ALT] = bases[alt]
+    symbols[CODE_MISSING] = ord(missing)
+    return symbols
+
+
+def sample_sequence(matrix: PackedMatrix, sample: int, symbols: np.ndarray) -> bytes:
+    """Translate one sample's codes into nucleotide/IUPAC characters."""
+    codes = matrix.row(sample)
+    return symbols[codes, np.arange(codes.size)].tobytes()
+
+
+def write_matrix(path: str, names: List[str], matrix: PackedMatrix, fmt: str) -> None:
+    """Write the matrix as relaxed PHYLIP or NEXUS, one sample row at a time."""
+    missing = MISSING_SYMBOL[fmt]
+    symbols = site_symbols(matrix, missing)
+    width = max(len(n) for n in names) + 1
+    with open(path, 'wb') as f:
+        if fmt == 'phylip':
+            f.write(f"{len(names)} {matrix.n_sites}\n".encode())
+        else:
+            f.write(f"#NEXUS\n\nBEGIN DATA;\n"
+                    f"\tDIMENSIONS NTAX={len(names)} NCHAR={matrix.n_sites};\n"
+                    f"\tFORMAT DATATYPE=DNA MISSING={missing} GAP=-;\n"
+                    f"\tMATRIX\n".encode())
+        for idx, name in enumerate(names):
+            f.write(f"{name:<{width}}".encode())
+            f.write(sample_sequence(matrix, idx, symbols))
+            f.write(b'\n')
+        if fmt == 'nexus':
+            f.write(b"\t;\nEND;\n")
+
+
+def read_sample_list(path: str) -> List[str]:
+    """Read sample names, one per line.
+
+    Raises:
+        ValueError: If the file lists no samples or repeats a name
+    """
+    with open(path) as f:
+        samples = [line.strip() for line in f if line.strip()]
+    if not samples:
+        raise ValueError(f"No sample names in {path}")
+    repeated = sorted({s for s in samples if samples.count(s) > 1})
+    if repeated:
+        raise ValueError(f"Sample names listed more than once in {path}: "
+                         f"{', '.join(repeated)}")
+    return samples
+
+
+def main():
+    """Main execution routine."""
+    parser = argparse.ArgumentParser(
+        description="Convert a biallelic SNP VCF into a PHYLIP/NEXUS matrix",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("input_vcf", help="Input VCF (plain, gzip or BGZF)")
+    parser.add_argument("output", help="Output matrix file")
+    parser.add_argument("--format", choices=['phylip', 'nexus'], default='phylip',
+                        help="Output format")
+    parser.add_argument("--samples", help="File with samples to keep (one per line)")
+    parser.add_argument("--outgroup", help="Outgroup sample, written as the first row")
+    parser.add_argument("--thin", type=int, default=0,
+                        help="Keep one SNP per window of this many bp (0 = off)")
+    parser.add_argument("--keep-invariant", action='store_true',
+                        help="Keep sites invariant among the selected samples")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="Threads for BGZF decompression")
+    args = parser.parse_args()
+
+    start_time = perf_counter()
+    try:
+        samples = read_sample_list(args.samples) if args.samples else None
+        names, matrix, counts = build_matrix(args.input_vcf, samples, args.outgroup,
+                                             args.thin, args.keep_invariant, args.threads)
+        write_matrix(args.output, names, matrix, args.format)
+    except (ValueError, FileNotFoundError) as e:
+        sys.exit(f"Error: {e}")
+
+    print(f"Conversion completed in {perf_counter() - start_time:.2f}s\n"
+          f"- Samples: {len(names)}\n"
+          f"- Input sites: {counts['input']}\n"
+          f"- Not biallelic SNPs: {counts['not_snp']}\n"
+          f"- Invariant among samples: {counts['invariant']}\n"
+          f"- Removed by thinning: {counts['thinned']}\n"
+          f"- Sites written: {counts['output']}\n"
+          f"- Packed genotype memory: {matrix.nbytes() / 1e6:.1f} MB\n"
+          f"Results written to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
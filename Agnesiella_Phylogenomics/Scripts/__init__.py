@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+# Agnesiella Phylogenomics Toolkit v2024.12.1
+# Author: WJJ
+
+"""
+Installable wrapper around the pipeline scripts.
+
+Each script stays a standalone file; ``phylogenomics <subcommand>`` (see
+cli.py) imports the script behind a subcommand only when it is run.
+"""
+
+__version__ = "2024.12.1"
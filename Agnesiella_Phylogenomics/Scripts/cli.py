@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Phylogenomics Command Line Entry Point v2024.12.1
+# Author: WJJ
+
+"""
+Features:
+1. Single `phylogenomics <subcommand>` entry point for all Python tools
+2. Lazy loading: a script and its heavy imports (Biopython, pandas, ete3,
+   matplotlib) are loaded only when its subcommand runs
+3. Batch/server mode: many invocations over stdin in one warm process, so
+   import cost is paid once per node
+
+Examples:
+    phylogenomics fasta-filter loci/ fas 10 --threads 8
+    printf 'nrcfv-filter a.txt\\nnrcfv-filter b.txt\\n' | phylogenomics batch
+    echo '{"command": "visualize-cid", "args": ["m.csv", "t.list"], "cwd": "run1"}' \\
+        | phylogenomics batch
+
+Batch requests are shell-style lines or JSON objects with "command", "args"
+and optional "cwd"/"id"; one JSON result per request is written to stdout.
+Everything a request writes to stdout and stderr, including output of the
+external tools it starts, is captured into its result ("output", "stderr").
+"""
+
+import io
+import os
+import sys
+import json
+import shlex
+import argparse
+import tempfile
+import importlib.util
+from contextlib import redirect_stderr, redirect_stdout
+from time import perf_counter
+from types import ModuleType
+from typing import Dict, List, Optional, Tuple
+
+# Constants
+SCRIPT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Subcommand -> (script path relative to SCRIPT_ROOT, description)
+COMMANDS: Dict[str, Tuple[str, str]] = {
+    'kmer-profile': ("Genome Assembly/Kmer_Profiler.py",
+                     "Streaming k-mer spectrum profile of read files"),
+    'sequence-analysis': ("Marker Extraction & Dataset Generation/Detailed_Sequence_Analysis.py",
+                          "FASTA statistics and length filters"),
+    'fasta-filter': ("Marker Extraction & Dataset Generation/Fasta_Filter_above_Threshold.py",
+                     "Filter FASTA files by sequence count"),
+    'nrcfv-filter': ("Marker Extraction & Dataset Generation/nRCFV_Filter_above_Threhold.py",
+                     "nRCFV outliers by median absolute deviation"),
+    'visualize-cid': ("Marker Extraction & Dataset Generation/Visualize_CID_Results.py",
+                      "CID distance report, thresholds and plot"),
+    'probe-screen': ("Marker Extraction & Dataset Generation/UCE_Probe_Screen.py",
+                     "UCE probe redundancy self-comparison"),
+    'occupancy': ("Marker Extraction & Dataset Generation/Occupancy_Planner.py",
+                  "Locus presence-absence matrix and occupancy planner"),
+    'trim-alignments': ("Marker Extraction & Dataset Generation/Alignment_Trimmer.py",
+                        "Trim alignment columns and update partitions"),
+    'gene-trees': ("Marker Extraction & Dataset Generation/Gene_Tree_Scheduler.py",
+                   "Schedule per-locus gene-tree inference"),
+    'quibl': ("QuIBL Analysis/Run_QULBL_from_Trees.py",
+              "QuIBL analysis from gene trees"),
+    'gatk-scatter': ("Variant Calling & Filtering/GATK_Scatter_Gather.py",
+                     "Interval scatter-gather for GATK"),
+    'vcf-filter': ("Variant Calling & Filtering/VCF_Site_Filter.py",
+                   "Streaming VCF site and genotype filter"),
+    'vcf-to-matrix': ("Variant Calling & Filtering/VCF_to_SNP_Matrix.py",
+                      "VCF to PHYLIP/NEXUS SNP matrix"),
+}
+
+_loaded: Dict[str, ModuleType] = {}
+
+
+# ==============================================
+# Lazy Script Loading
+# ==============================================
+def load_command(command: str) -> ModuleType:
+    """
+    Import the script behind a subcommand (once per process).
+
+    The script's directory is put on sys.path and the module is registered
+    under its file name, so sibling imports resolve to the same instance.
+
+    Raises:
+        KeyError: If the subcommand is unknown
+    """
+    if command in _loaded:
+        return _loaded[command]
+    relative, _ = COMMANDS[command]
+    path = os.path.join(SCRIPT_ROOT, relative)
+    script_dir = os.path.dirname(path)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    name = os.path.splitext(os.path.basename(path))[0]
+    module = sys.modules.get(name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[name]
+            raise
+    _loaded[command] = module
+    return module
+
+
+def run_command(command: str, args: List[str]) -> int:
+    """
+    Run a subcommand's main() with the given arguments.
+
+    Returns:
+        Exit status (SystemExit from argparse or sys.exit is caught)
+    """
+    module = load_command(command)
+    saved_argv = sys.argv
+    sys.argv = [f"phylogenomics {command}", *args]
+    try:
+        module.main()
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    finally:
+        sys.argv = saved_argv
+
+
+def run_captured(command: str, args: List[str]) -> Tuple[int, str, str, Optional[str]]:
+    """
+    Run a subcommand with file descriptors 1 and 2 redirected to temporary
+    files and descriptor 0 to /dev/null.
+
+    Python-level prints and child processes (gatk, bcftools, tabix, ...)
+    share the redirected descriptors, so their output stays in order and never
+    reaches the real stdout/stderr; children cannot read the request stream.
+
+    Returns:
+        Tuple of (exit status, captured stdout, captured stderr, error message
+        of an uncaught exception or None)
+    """
+    returncode, error = 1, None
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = {fd: os.dup(fd) for fd in (0, 1, 2)}
+    with tempfile.TemporaryFile() as out_capture, tempfile.TemporaryFile() as err_capture, \
+            open(os.devnull, 'rb') as null:
+        os.dup2(null.fileno(), 0)
+        os.dup2(out_capture.fileno(), 1)
+        os.dup2(err_capture.fileno(), 2)
+        try:
+            with open(1, 'w', buffering=1, closefd=False) as out_stream, \
+                    open(2, 'w', buffering=1, closefd=False) as err_stream, \
+                    redirect_stdout(out_stream), redirect_stderr(err_stream):
+                returncode = run_command(command, args)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            for fd, copy in saved.items():
+                os.dup2(copy, fd)
+                os.close(copy)
+        out_capture.seek(0)
+        err_capture.seek(0)
+        return (returncode, out_capture.read().decode(errors='replace'),
+                err_capture.read().decode(errors='replace'), error)
+
+
+# ==============================================
+# Batch / Server Mode
+# ==============================================
+def parse_request(line: str, line_num: int) -> Dict:
+    """
+    Parse one batch request (JSON object or shell-style command line).
+
+    Raises:
+        ValueError: If the request is malformed
+    """
+    line = line.strip()
+    if line.startswith('{'):
+        request = json.loads(line)
+        if 'command' not in request:
+            raise ValueError("missing 'command'")
+        request.setdefault('args', [])
+    else:
+        words = shlex.split(line)
+        request = {'command': words[0], 'args': words[1:]}
+    request.setdefault('id', line_num)
+    return request
+
+
+def serve(stream, out, preload: List[str]) -> int:
+    """
+    Execute requests from a stream until EOF, one JSON result per line.
+
+    Tool stdout and stderr are captured into the result; stdin is detached
+    so that interactive prompts read end of input (answered as "no") instead
+    of consuming requests.
+
+    Returns:
+        Number of failed requests
+    """
+    for command in preload:
+        load_command(command)
+    failures = 0
+    home = os.getcwd()
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip() or line.lstrip().startswith('#'):
+            continue
+        start = perf_counter()
+        result = {'id': line_num, 'output': '', 'stderr': ''}
+        saved_stdin = sys.stdin
+        try:
+            request = parse_request(line, line_num)
+            result['id'] = request['id']
+            result['command'] = request['command']
+            if request['command'] not in COMMANDS:
+                raise ValueError(f"unknown command: {request['command']}")
+            sys.stdin = io.StringIO()
+            os.chdir(request.get('cwd') or home)
+            result['returncode'], result['output'], result['stderr'], error = run_captured(
+                request['command'], [str(a) for a in request['args']])
+            if error:
+                result['error'] = error
+        except Exception as e:
+            result['returncode'] = 1
+            result['error'] = f"{type(e).__name__}: {e}"
+        finally:
+            sys.stdin = saved_stdin
+            os.chdir(home)
+        failures += result['returncode'] != 0
+        result['seconds'] = round(perf_counter() - start, 3)
+        out.write(json.dumps(result) + '\n')
+        out.flush()
+    return failures
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Top-level parser; subcommand arguments are parsed by each script."""
+    parser = argparse.ArgumentParser(
+        prog="phylogenomics",
+        description="Agnesiella phylogenomics pipeline tools",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="subcommands:\n" + "\n".join(
+            f"  {name:<18}{text}" for name, (_, text) in COMMANDS.items())
+            + "\n  batch             Run many requests from stdin in one process"
+    )
+    parser.add_argument("command", help="Subcommand (see below)")
+    parser.add_argument("args", nargs=argparse.REMAINDER,
+                        help="Arguments passed to the subcommand")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Main execution routine."""
+    args = build_parser().parse_args(argv)
+    if args.command == 'batch':
+        batch = argparse.ArgumentParser(
+            prog="phylogenomics batch",
+            description="Execute requests from stdin (or a file) in one warm process",
+            formatter_class=argparse.ArgumentDefaultsHelpFormatter
+        )
+        batch.add_argument("--input", help="Request file (default: stdin)")
+        batch.add_argument("--preload", default="",
+                           help="Comma-separated subcommands to import at startup")
+        opts = batch.parse_args(args.args)
+        preload = [c for c in opts.preload.split(',') if c]
+        unknown = [c for c in preload if c not in COMMANDS]
+        if unknown:
+            sys.exit(f"Error: unknown command(s): {', '.join(unknown)}")
+        stream = open(opts.input) if opts.input else sys.stdin
+        with stream:
+            failures = serve(stream, sys.stdout, preload)
+        sys.exit(1 if failures else 0)
+
+    if args.command not in COMMANDS:
+        sys.exit(f"Error: unknown command '{args.command}' "
+                 f"(choose from: {', '.join(COMMANDS)}, batch)")
+    sys.exit(run_command(args.command, args.args))
+
+
+if __name__ == "__main__":
+    main()
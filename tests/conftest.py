@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""Shared helpers: load pipeline scripts (paths contain spaces) as modules."""
+
+import os
+import sys
+import importlib.util
+
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "Agnesiella_Phylogenomics", "Scripts")
+
+
+def load_script(relative: str):
+    """Import a script under Scripts/ by relative path."""
+    path = os.path.join(SCRIPTS, relative)
+    name = "test_" + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def scripts_dir():
+    return SCRIPTS
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Alignment_Trimmer.py: output directory matches the partition file."""
+
+import pytest
+
+from conftest import load_script
+
+
+def write_locus(path, gap_rows):
+    """Six taxa × 40 columns; the first ``gap_rows`` taxa are all gaps."""
+    path.write_text("".join(f">t{t}\n{'-' * 40 if t < gap_rows else 'ACGT' * 10}\n"
+                            for t in range(6)))
+
+
+def run(trimmer, monkeypatch, *argv):
+    monkeypatch.setattr("sys.argv", ["Alignment_Trimmer.py", *map(str, argv)])
+    trimmer.main()
+
+
+def test_rerun_removes_alignments_of_dropped_loci(tmp_path, monkeypatch):
+    trimmer = load_script("Marker Extraction & Dataset Generation/Alignment_Trimmer.py")
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    for name, gap_rows in (("a", 0), ("b", 2), ("c", 4)):
+        write_locus(src / f"{name}.fas", gap_rows)
+
+    run(trimmer, monkeypatch, src, "fas", out, "--threads", "1", "--max-gap", "0.9")
+    assert sorted(p.name for p in out.glob("*.fas")) == ["a.fas", "b.fas", "c.fas"]
+
+    run(trimmer, monkeypatch, src, "fas", out, "--threads", "1", "--max-gap", "0.5")
+    assert sorted(p.name for p in out.glob("*.fas")) == ["a.fas", "b.fas"]
+    partitions = (out / "Trimmed_Partitions.txt").read_text().splitlines()
+    assert [line.split()[1] for line in partitions] == ["a", "b"]
+
+
+def test_only_own_outputs_removed_and_failures_kept(tmp_path, monkeypatch):
+    trimmer = load_script("Marker Extraction & Dataset Generation/Alignment_Trimmer.py")
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    out.mkdir()
+    for name in ("a", "b", "c"):
+        write_locus(src / f"{name}.fas", 0)
+    (out / "other.fas").write_text(">x\nACGT\n")    # Not written by the trimmer
+
+    run(trimmer, monkeypatch, src, "fas", out, "--threads", "1")
+    (src / "b.fas").write_text(">t0\nACGT\n>t1\nAC\n")   # Unreadable on the rerun
+    (src / "c.fas").unlink()
+    with pytest.raises(SystemExit, match="1 loci failed"):
+        run(trimmer, monkeypatch, src, "fas", out, "--threads", "1")
+
+    assert sorted(p.name for p in out.glob("*.fas")) == ["a.fas", "b.fas", "other.fas"]
+    assert (out / "Trimmed_outputs.txt").read_text().split() == ["a.fas", "b.fas"]
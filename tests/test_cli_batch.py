@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""phylogenomics batch: non-interactive runs and stdout/stderr capture."""
+
+import os
+import sys
+import json
+import shlex
+import subprocess
+
+import pytest
+
+from conftest import load_script
+
+
+def run_batch(scripts_dir, requests, cwd):
+    """Run `cli.py batch` on request lines; return parsed stdout lines."""
+    proc = subprocess.run([sys.executable, os.path.join(scripts_dir, "cli.py"), "batch"],
+                          input="\n".join(requests) + "\n", capture_output=True,
+                          text=True, cwd=cwd)
+    results = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert len(results) == len(requests)
+    assert proc.stderr == ""
+    return results
+
+
+def test_interactive_script_runs_without_prompt(scripts_dir, tmp_path):
+    loci = tmp_path / "loci"
+    loci.mkdir()
+    for name, n in (("a", 3), ("b", 1)):
+        (loci / f"{name}.fas").write_text("".join(f">t{i}\nACGT\n" for i in range(n)))
+    dest = tmp_path / "kept"
+    results = run_batch(scripts_dir, [
+        f"fasta-filter {shlex.quote(str(loci))} fas 2",
+        f"fasta-filter {shlex.quote(str(loci))} fas 2 --copy-to {shlex.quote(str(dest))}",
+    ], tmp_path)
+
+    assert results[0]["returncode"] == 0, results[0]
+    assert "Files meeting threshold (2+ sequences): 1" in results[0]["output"]
+    assert results[1]["returncode"] == 0, results[1]
+    assert sorted(os.listdir(dest)) == ["a.fas"]
+
+
+def test_child_process_stdout_is_captured(scripts_dir, tmp_path):
+    (tmp_path / "genome.fasta").write_text("")
+    (tmp_path / "genome.fasta.fai").write_text("chr1\t1000\t6\t60\t61\n")
+    (tmp_path / "SpA.bam").write_text("")
+    results = run_batch(scripts_dir, [
+        "gatk-scatter call -R genome.fasta --sample SpA=SpA.bam --intervals 2 "
+        "--jobs 1 --gatk echo --bcftools echo --tabix echo",
+        "gatk-scatter intervals genome.fasta.fai 2 intervals",
+    ], tmp_path)
+
+    # echo's output belongs to the first result, not to the JSON stream
+    echoed = [line for line in results[0]["output"].splitlines()
+              if line.startswith("--java-options")]
+    assert len(echoed) == 2 and all("HaplotypeCaller" in line for line in echoed)
+    assert results[1]["returncode"] == 0, results[1]
+    assert "Wrote 2 interval files" in results[1]["output"]
+
+
+def test_child_process_stderr_is_captured(scripts_dir, tmp_path):
+    (tmp_path / "genome.fasta").write_text("")
+    (tmp_path / "genome.fasta.fai").write_text("chr1\t1000\t6\t60\t61\n")
+    (tmp_path / "SpA.bam").write_text("")
+    results = run_batch(scripts_dir, [
+        "gatk-scatter call -R genome.fasta --sample SpA=SpA.bam --intervals 2 "
+        "--jobs 1 --gatk ls --bcftools echo --tabix echo",
+    ], tmp_path)
+
+    # ls rejects the GATK options on fd 2; the exit message follows it
+    assert results[0]["returncode"] == 1
+    assert results[0]["stderr"].count("ls: unrecognized option") == 2
+    assert "Error: 2 job(s) failed" in results[0]["stderr"]
+    assert "ls:" not in results[0]["output"]
+
+
+def answer(monkeypatch, *replies):
+    """Feed input() the given replies, then end of input."""
+    replies = iter(replies)
+
+    def fake_input(prompt):
+        for reply in replies:
+            return reply
+        raise EOFError
+
+    monkeypatch.setattr("builtins.input", fake_input)
+
+
+def test_follow_up_prompts_read_end_of_input(tmp_path, monkeypatch):
+    pytest.importorskip("Bio")
+    dsa = load_script("Marker Extraction & Dataset Generation/Detailed_Sequence_Analysis.py")
+    calls = []
+    monkeypatch.setattr(dsa, "copy_qualified_files", lambda *a: calls.append(a) or [])
+    monkeypatch.setattr(dsa, "filter_sequences", lambda path, n: calls.append(n) or [])
+    monkeypatch.setattr(dsa, "safe_write_output", lambda records, path: calls.append(path))
+
+    # 'y' followed by end of input (batch mode) skips the copy instead of raising
+    answer(monkeypatch, "y")
+    dsa.handle_user_choices(str(tmp_path), is_directory=True)
+    answer(monkeypatch, "y", "long")
+    dsa.handle_user_choices(str(tmp_path), is_directory=True)
+    assert calls == []
+
+    answer(monkeypatch, "Y", "100", " out.fas ")
+    dsa.handle_user_choices("in.fas", is_directory=False)
+    assert calls == [100, "out.fas"]
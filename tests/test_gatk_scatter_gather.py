@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""GATK_Scatter_Gather.py with stub gatk/bcftools/tabix commands."""
+
+import os
+import sys
+import json
+import shlex
+
+import pytest
+
+from conftest import load_script
+
+STUB = '''
+import os, sys, json
+tool, args = sys.argv[1], sys.argv[2:]
+with open(os.environ["STUB_LOG"], "a") as f:
+    f.write(json.dumps([tool] + args) + "\\n")
+def touch(path):
+    with open(path, "w") as f:
+        f.write(tool)
+if tool == "gatk":
+    if "--genomicsdb-workspace-path" in args:
+        os.makedirs(args[args.index("--genomicsdb-workspace-path") + 1], exist_ok=True)
+    if "-O" in args:
+        out = args[args.index("-O") + 1]
+        touch(out)
+        touch(out + ".tbi")
+elif tool == "bcftools":
+    touch(args[args.index("-o") + 1])
+elif tool == "tabix":
+    touch(args[-1] + ".tbi")
+'''
+
+
+@pytest.fixture
+def gsg():
+    return load_script("Variant Calling & Filtering/GATK_Scatter_Gather.py")
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """Reference index, stub tool commands and a command log."""
+    stub = tmp_path / "stub.py"
+    stub.write_text(STUB)
+    log = tmp_path / "commands.jsonl"
+    monkeypatch.setenv("STUB_LOG", str(log))
+    reference = tmp_path / "genome.fasta"
+    reference.write_text("")
+    (tmp_path / "genome.fasta.fai").write_text("chr1\t1000\t6\t60\t61\nchr2\t1000\t1100\t60\t61\n")
+    tools = []
+    for tool in ("gatk", "bcftools", "tabix"):
+        tools += [f"--{tool}", f"{shlex.quote(sys.executable)} {shlex.quote(str(stub))} {tool}"]
+
+    def commands():
+        """Logged commands since the last call."""
+        if not log.exists():
+            return []
+        lines = [json.loads(line) for line in log.read_text().splitlines()]
+        log.unlink()
+        return lines
+
+    return tmp_path, str(reference), tools, commands
+
+
+def write_gvcf(directory, sample):
+    path = directory / f"{sample}.g.vcf.gz"
+    path.write_text(sample)
+    (directory / f"{sample}.g.vcf.gz.tbi").write_text("")
+    return str(path)
+
+
+def test_call_pools_samples_and_resumes(gsg, env):
+    tmp_path, reference, tools, commands = env
+    for sample in ("SpA", "SpB"):
+        (tmp_path / f"{sample}.bam").write_text(sample)
+    argv = ["call", "-R", reference, "--intervals", "2", "--jobs", "3",
+            "--sample", f"SpA={tmp_path / 'SpA.bam'}", "--sample", f"SpB={tmp_path / 'SpB.bam'}",
+            "--out-dir", str(tmp_path / "g_vcfs"), *tools]
+    gsg.main(argv)
+
+    logged = commands()
+    callers = [c for c in logged if c[0] == "gatk"]
+    assert len(callers) == 4
+    for cmd in callers:
+        assert cmd[3] == "HaplotypeCaller"
+        assert cmd[cmd.index("-ERC") + 1] == "GVCF"
+        assert cmd[cmd.index("-L") + 1].endswith(".bed")
+    assert {os.path.basename(c[c.index("-I") + 1]) for c in callers} == {"SpA.bam", "SpB.bam"}
+
+    concats = [c for c in logged if c[0] == "bcftools"]
+    assert len(concats) == 2
+    for cmd in concats:
+        sample = os.path.basename(cmd[cmd.index("-o") + 1]).split(".")[0]
+        parts = cmd[cmd.index("-o") + 2:]
+        assert [os.path.basename(p) for p in parts] == [
+            f"{sample}.scatter_0001.g.vcf.gz", f"{sample}.scatter_0002.g.vcf.gz"]
+    assert len([c for c in logged if c[0] == "tabix"]) == 2
+
+    gsg.main(argv)
+    assert commands() == []
+
+
+def test_joint_reruns_when_input_set_changes(gsg, env):
+    tmp_path, reference, tools, commands = env
+    gvcf_dir = tmp_path / "g_vcfs"
+    gvcf_dir.mkdir()
+    gvcfs = [write_gvcf(gvcf_dir, s) for s in ("SpA", "SpB")]
+    argv = ["joint", "-R", reference, "--gvcf-dir", str(gvcf_dir), "--intervals", "2",
+            "--jobs", "2", "-o", str(tmp_path / "vcfs" / "All.vcf.gz"), *tools]
+    gsg.main(argv)
+
+    logged = commands()
+    imports = [c for c in logged if c[0] == "gatk" and c[3] == "GenomicsDBImport"]
+    genotypes = [c for c in logged if c[0] == "gatk" and c[3] == "GenotypeGVCFs"]
+    assert len(imports) == len(genotypes) == 2
+    for cmd in imports:
+        assert [cmd[i + 1] for i, a in enumerate(cmd) if a == "-V"] == gvcfs
+    for cmd in genotypes:
+        assert cmd[cmd.index("-V") + 1].startswith("gendb://")
+    assert len([c for c in logged if c[0] == "bcftools"]) == 1
+
+    # Same inputs: nothing to do
+    gsg.main(argv)
+    assert commands() == []
+
+    # A species added since the last run: every interval is re-genotyped
+    gvcfs.append(write_gvcf(gvcf_dir, "SpC"))
+    gsg.main(argv)
+    logged = commands()
+    imports = [c for c in logged if c[0] == "gatk" and c[3] == "GenomicsDBImport"]
+    assert len(imports) == 2
+    for cmd in imports:
+        assert [cmd[i + 1] for i, a in enumerate(cmd) if a == "-V"] == gvcfs
+    assert len([c for c in logged if c[0] == "bcftools"]) == 1
+
+    # A re-called gVCF (new mtime) also invalidates the joint result
+    stat = os.stat(gvcfs[0])
+    os.utime(gvcfs[0], ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    gsg.main(argv)
+    assert len([c for c in commands() if c[0] == "gatk" and c[3] == "GenotypeGVCFs"]) == 2
+
+
+def test_joint_rejects_unindexed_gvcf(gsg, env):
+    tmp_path, reference, tools, commands = env
+    gvcf_dir = tmp_path / "g_vcfs"
+    gvcf_dir.mkdir()
+    write_gvcf(gvcf_dir, "SpA")
+    (gvcf_dir / "SpB.g.vcf.gz").write_text("partial")
+    with pytest.raises(SystemExit, match="not indexed"):
+        gsg.main(["joint", "-R", reference, "--gvcf-dir", str(gvcf_dir),
+                  "-o", str(tmp_path / "All.vcf.gz"), *tools])
+    assert commands() == []
+
+
+@pytest.mark.parametrize("contigs,n", [
+    ([("c1", 900), ("c2", 200), ("c3", 900)], 2),
+    ([("c1", 900), ("c2", 200), ("c3", 900)], 7),
+    ([("chr1", 5000), ("scaf", 3), ("chrUn", 0), ("chrM", 16)], 4),
+    ([("tiny", 3)], 8),
+])
+def test_balance_intervals_caps_and_balances(gsg, contigs, n):
+    groups = gsg.balance_intervals(contigs, n)
+    total = sum(length for _, length in contigs)
+    assert len(groups) == min(n, total)
+    sizes = [sum(e - s + 1 for _, s, e in group) for group in groups]
+    assert sum(sizes) == total and max(sizes) - min(sizes) <= 1
+    # Concatenated groups walk the reference in order without gaps or overlaps
+    flat = [interval for group in groups for interval in group]
+    expected = iter((c, p) for c, length in contigs for p in range(1, length + 1))
+    for contig, start, end in flat:
+        assert [next(expected) for _ in range(end - start + 1)] == \
+            [(contig, p) for p in range(start, end + 1)]
+    assert next(expected, None) is None
+
+
+def test_interval_files_are_bed(gsg, tmp_path):
+    groups = gsg.balance_intervals([("HLA-A*01:01", 10), ("chr1:alt", 10)], 2)
+    paths = gsg.write_interval_files(groups, str(tmp_path))
+    assert [os.path.basename(p) for p in paths] == ["scatter_0001.bed", "scatter_0002.bed"]
+    assert [open(p).read() for p in paths] == ["HLA-A*01:01\t0\t10\n", "chr1:alt\t0\t10\n"]
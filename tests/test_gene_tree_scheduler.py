@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""Gene_Tree_Scheduler.py: backfilling limits and reruns over old trees."""
+
+import time
+import threading
+
+from conftest import load_script
+
+
+def start_order(gts, monkeypatch, backfill_wait):
+    """Dispatch A(5), B(5), C(4) and 30 single-thread jobs on 8 threads."""
+    started, lock = [], threading.Lock()
+
+    def fake_run(job, command, tree_dir, timing_file):
+        with lock:
+            started.append(job.loci[0].name)
+        time.sleep(0.05 * job.threads)
+        return []
+
+    def job(name, threads):
+        return gts.Job([gts.Locus(name, 4, 100, 50)], threads)
+
+    monkeypatch.setattr(gts, "run_job", fake_run)
+    jobs = [job("A", 5), job("B", 5), job("C", 4)] + [job(f"s{i}", 1) for i in range(30)]
+    assert gts.dispatch(jobs, 8, "true", "trees", "timing.tsv", backfill_wait) == []
+    return started
+
+
+def test_blocked_large_job_gets_reserved_threads(monkeypatch):
+    gts = load_script("Marker Extraction & Dataset Generation/Gene_Tree_Scheduler.py")
+
+    # Unbounded backfilling: C waits until the small jobs run out
+    order = start_order(gts, monkeypatch, float("inf"))
+    assert order.index("C") > 25
+
+    # Reserving at once: nothing overtakes a blocked head-of-queue job
+    order = start_order(gts, monkeypatch, 0)
+    assert order[:3] == ["A", "B", "C"]
+
+
+def test_failed_rerun_drops_old_tree(tmp_path):
+    gts = load_script("Marker Extraction & Dataset Generation/Gene_Tree_Scheduler.py")
+    trees = tmp_path / "trees"
+    trees.mkdir()
+    loci = [gts.Locus(str(tmp_path / f"{name}.fas"), 4, 100, 50) for name in ("a", "b")]
+    for locus in loci:
+        (trees / f"{locus.name}.treefile").write_text("(old);\n")
+    command = ("case {alignment} in *a.fas) echo '(new);' > {prefix}.treefile;; "
+               "*) exit 1;; esac")
+    errors = gts.dispatch([gts.Job(loci, 1)], 1, command, str(trees),
+                          str(tmp_path / "timing.tsv"))
+
+    assert [name for name, _ in errors] == ["b.fas"]
+    assert not (trees / "b.fas.treefile").exists()
+    assert gts.concatenate_trees(loci, str(trees), str(tmp_path / "all.tre")) == 1
+    assert (tmp_path / "all.tre").read_text() == "(new);\n"
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Kmer_Profiler.py: spectrum estimates, input errors and bbnorm defaults."""
+
+import gzip
+import random
+
+import numpy as np
+import pytest
+
+from conftest import load_script
+
+
+@pytest.fixture
+def kp():
+    return load_script("Genome Assembly/Kmer_Profiler.py")
+
+
+@pytest.fixture
+def reads(tmp_path):
+    rng = random.Random(1)
+    genome = ''.join(rng.choice('ACGT') for _ in range(5000))
+    path = tmp_path / "reads.fq.gz"
+    with gzip.open(path, 'wt') as f:
+        for i in range(5000):
+            start = rng.randrange(len(genome) - 100)
+            f.write(f"@r{i}\n{genome[start:start + 100]}\n+\n{'I' * 100}\n")
+    return path
+
+
+def run(kp, monkeypatch, argv):
+    monkeypatch.setattr("sys.argv", ["Kmer_Profiler.py", *map(str, argv)])
+    kp.main()
+
+
+def test_bbnorm_depths_fixed_unless_adaptive(kp, monkeypatch, reads, tmp_path):
+    run(kp, monkeypatch, [reads, "-o", tmp_path / "fixed", "--threads", "1"])
+    env = (tmp_path / "fixed" / "profile.env").read_text()
+    assert 'BBNORM_TARGET="10"' in env and 'BBNORM_MIN="2"' in env
+
+    run(kp, monkeypatch, [reads, "-o", tmp_path / "adaptive", "--threads", "1",
+                          "--adaptive-bbnorm"])
+    env = (tmp_path / "adaptive" / "profile.env").read_text()
+    assert 'BBNORM_TARGET="10"' not in env
+
+
+def test_truncated_gzip_aborts(kp, monkeypatch, reads, tmp_path):
+    truncated = tmp_path / "truncated.fq.gz"
+    data = reads.read_bytes()
+    truncated.write_bytes(data[:len(data) // 2])
+    with pytest.raises(SystemExit, match="Failed to read input"):
+        run(kp, monkeypatch, [truncated, "-o", tmp_path / "out", "--threads", "1"])
+    assert not (tmp_path / "out" / "profile.env").exists()
+
+
+def test_worker_failure_does_not_block_producer(kp, monkeypatch, reads):
+    monkeypatch.setattr(kp, "CHUNK_BYTES", 2000)
+    monkeypatch.setattr(kp, "profile_chunk", int)  # TypeError on every task
+    with pytest.raises(TypeError):
+        kp.profile_reads([str(reads)], 21, 1, 1 << 16)
+
+
+@pytest.fixture(scope="module")
+def diploid_reads(tmp_path_factory):
+    """40x of 100 bp reads from a 100 kb diploid genome (1% het, 0.5% errors)."""
+    rng = np.random.default_rng(2)
+    size, length, coverage = 100000, 100, 40
+    hap1 = rng.integers(0, 4, size)
+    hap2 = hap1.copy()
+    sites = rng.choice(size, size // 100, replace=False)
+    hap2[sites] = (hap2[sites] + rng.integers(1, 4, sites.size)) % 4
+    n = coverage * size // length
+    starts = rng.integers(0, size - length, n)
+    reads = np.stack([hap1, hap2])[rng.integers(0, 2, n)[:, None],
+                                   starts[:, None] + np.arange(length)]
+    errors = rng.random(reads.shape) < 0.005
+    reads = np.where(errors, (reads + rng.integers(1, 4, reads.shape)) % 4, reads)
+    flip = rng.random(n) < 0.5
+    reads[flip] = (3 - reads[flip])[:, ::-1]
+    seqs = np.frombuffer(b"ACGT", np.uint8)[reads]
+    path = tmp_path_factory.mktemp("diploid") / "reads.fq"
+    with open(path, "wb") as f:
+        for i, seq in enumerate(seqs):
+            f.write(b"@r%d\n%s\n+\n%s\n" % (i, seq.tobytes(), b"I" * length))
+    return path, [seq.tobytes() for seq in seqs]
+
+
+@pytest.mark.parametrize("max_entries", [1 << 24, 50000])
+def test_spectrum_estimates_on_simulated_reads(kp, diploid_reads, max_entries):
+    path, seqs = diploid_reads
+    profile = kp.profile_reads([str(path)], 21, 2, max_entries)
+    assert (profile['rate'] == 1.0) == (max_entries == 1 << 24)  # Subsampled table
+
+    stats = kp.analyze_spectrum(profile['hist'], 21, 100)
+    error_free = 0.995 ** 21
+    assert stats['kmer_coverage'] == pytest.approx(40 * 80 / 100 * error_free, rel=0.1)
+    assert stats['genome_size'] == pytest.approx(100000, rel=0.1)
+    assert stats['heterozygosity'] == pytest.approx(0.01, rel=0.25)
+
+    exact = np.unique(kp.canonical_kmer_hashes(seqs, 21)).size
+    assert profile['distinct'] == pytest.approx(exact, rel=0.03)
+    assert kp.hll_estimate(np.zeros(1 << kp.HLL_P, np.uint8)) == 0.0
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Occupancy_Planner.py: presence matrix, occupancy curve and drop planning."""
+
+from itertools import combinations
+from math import ceil
+
+import numpy as np
+import pytest
+
+from conftest import load_script
+
+
+@pytest.fixture
+def op():
+    return load_script("Marker Extraction & Dataset Generation/Occupancy_Planner.py")
+
+
+def write_locus(path, taxa):
+    path.write_text("".join(f">{t}\nACGT\n" for t in taxa))
+
+
+def run(op, monkeypatch, *argv):
+    monkeypatch.setattr("sys.argv", ["Occupancy_Planner.py", *map(str, argv)])
+    op.main()
+
+
+@pytest.fixture
+def random_loci(tmp_path):
+    """30 loci over 11 taxa (two bytes per packed row) with known presence."""
+    rng = np.random.default_rng(11)
+    present = rng.random((30, 11)) < 0.7
+    present[:, 0] = True
+    lengths = rng.integers(50, 500, size=30)
+    paths = []
+    for row, (mask, length) in enumerate(zip(present, lengths)):
+        path = tmp_path / f"L{row:02d}.fna"
+        path.write_text("".join(f">t{t:02d} desc\n{'A' * length}\n"
+                                for t in np.flatnonzero(mask)))
+        paths.append(str(path))
+    return paths, present, lengths
+
+
+def brute_retained(present, drop, occupancy):
+    keep = [t for t in range(present.shape[1]) if t not in drop]
+    need = max(1, ceil(occupancy * len(keep) - 1e-9))
+    return int((present[:, keep].sum(axis=1) >= need).sum())
+
+
+def test_presence_matrix_and_curve(op, random_loci):
+    paths, present, lengths = random_loci
+    matrix, errors = op.build_matrix(paths, 4)
+    assert errors == []
+    assert matrix.taxa == [f"t{t:02d}" for t in range(11)]
+    assert matrix.bits.shape == (30, 2)
+    assert np.array_equal(matrix.unpack(), present)
+    assert np.array_equal(matrix.counts(), present.sum(axis=1))
+
+    for k, occupancy, loci, total in op.occupancy_curve(matrix):
+        kept = present.sum(axis=1) >= k
+        assert occupancy == k / 11
+        assert (loci, total) == (int(kept.sum()), int(lengths[kept].sum()))
+
+
+def test_best_drop_sets_exhaustive_and_greedy(op, random_loci, monkeypatch):
+    paths, present, _ = random_loci
+    matrix, _ = op.build_matrix(paths, 4)
+    results = op.best_drop_sets(matrix, 0.8, 2)
+    assert [len(drop) for drop, _ in results] == [0, 1, 2]
+    for drop, retained in results:
+        assert retained == brute_retained(present, drop, 0.8)
+        assert retained == max(brute_retained(present, other, 0.8)
+                               for other in combinations(range(11), len(drop)))
+
+    # Above MAX_EXHAUSTIVE each size extends the previous best set by one taxon
+    monkeypatch.setattr(op, "MAX_EXHAUSTIVE", 0)
+    greedy = op.best_drop_sets(matrix, 0.8, 3)
+    for (previous, _), (drop, retained) in zip(greedy, greedy[1:]):
+        assert drop[:-1] == previous
+        assert retained == max(brute_retained(present, previous + (t,), 0.8)
+                               for t in range(11) if t not in previous)
+
+
+def test_taxa_list_sets_denominator(op, monkeypatch, tmp_path, capsys):
+    loci = tmp_path / "loci"
+    loci.mkdir()
+    for i in range(4):
+        write_locus(loci / f"L{i}.fna", ["a", "b", "c"][:3 - i % 2])
+    (tmp_path / "species.list").write_text("a\nb\nc\nd\n")
+
+    run(op, monkeypatch, loci, "fna", tmp_path / "all", "--targets", "0.7")
+    curve = (tmp_path / "all" / "occupancy_curve.tsv").read_text().splitlines()
+    assert len(curve) == 1 + 3
+
+    run(op, monkeypatch, loci, "fna", tmp_path / "listed", "--targets", "0.7",
+        "--taxa", tmp_path / "species.list")
+    assert "1 taxa have no loci" in capsys.readouterr().err
+    curve = (tmp_path / "listed" / "occupancy_curve.tsv").read_text().splitlines()
+    assert len(curve) == 1 + 4
+    plan = (tmp_path / "listed" / "occupancy_plan.tsv").read_text().splitlines()
+    assert plan[1].split("\t")[:4] == ["com70", "0", "-", "2"]   # 3 of 4 taxa needed
+
+    (tmp_path / "species.list").write_text("a\nb\n")
+    with pytest.raises(SystemExit, match="not in the taxon list"):
+        run(op, monkeypatch, loci, "fna", tmp_path / "short", "--taxa",
+            tmp_path / "species.list")
+
+
+def test_duplicate_locus_names_fail(op, monkeypatch, tmp_path):
+    for directory in ("a", "b"):
+        (tmp_path / directory).mkdir()
+        write_locus(tmp_path / directory / "L1.fna", ["t0", "t1"])
+    with pytest.raises(SystemExit, match="more than one file"):
+        run(op, monkeypatch, tmp_path / "a", tmp_path / "b", "fna", tmp_path / "out")
+
+
+def test_drop_sets_without_gain_get_no_lists(op, monkeypatch, tmp_path):
+    loci = tmp_path / "loci"
+    loci.mkdir()
+    # Every locus has all four taxa: dropping one can only lose loci
+    for i in range(3):
+        write_locus(loci / f"L{i}.fna", ["t0", "t1", "t2", "t3"])
+    write_locus(loci / "L3.fna", ["t0", "t1", "t2"])
+    out = tmp_path / "out"
+    run(op, monkeypatch, loci, "fna", out, "--targets", "1.0", "--max-drop", "1")
+
+    rows = [line.split("\t") for line in
+            (out / "occupancy_plan.tsv").read_text().splitlines()[1:]]
+    assert [(r[1], r[3], r[5]) for r in rows] == [
+        ("0", "3", "com100.list"), ("1", "4", "com100_drop-t3.list")]
+    assert (out / "com100_drop-t3.taxa").exists()
+
+    write_locus(loci / "L3.fna", ["t0", "t1", "t2", "t3"])
+    run(op, monkeypatch, loci, "fna", out, "--targets", "1.0", "--max-drop", "1",
+        "--prefix", "x")
+    rows = [line.split("\t") for line in
+            (out / "occupancy_plan.tsv").read_text().splitlines()[1:]]
+    assert [(r[1], r[5]) for r in rows] == [("0", "x100.list"), ("1", "-")]
+    assert sorted(p.name for p in out.glob("x100*")) == ["x100.list"]
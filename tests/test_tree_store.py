@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Tree_Store.py: ete3-identical output and stale store detection."""
+
+import os
+
+import pytest
+
+from conftest import load_script
+
+TREES = [
+    "((t0:0.5,t1:2)0.9:1,(t2:1,(t3:0.25,t4:1):3):1,(t5:1,t6:2,t7:1):0.5);",
+    "((t0,t1),(t2,(t3,t4)),(t5,t6,t7));",
+    "((t0:0.5,t1),(t2,(t3:2,t4)),(t5,t6,t7));",
+    "(t7,((t6,t5),(t4,((t3,t2),(t1,t0)))));",
+]
+TAXA = ["t1", "t3", "t5", "t6"]
+
+
+@pytest.fixture
+def ts():
+    return load_script("QuIBL Analysis/Tree_Store.py")
+
+
+def test_no_length_trees_write_ete3_default(ts):
+    store = ts.TreeStore.from_newick(TREES[1:2])
+    assert store.newick(0) == ("((t0:1,t1:1)1:1,(t2:1,(t3:1,t4:1)1:1)1:1,"
+                               "(t5:1,t6:1,t7:1)1:1);")
+    assert store.prune_all(["t0", "t3", "t4"]) == ["(t0:2,(t3:1,t4:1)1:2);"]
+
+
+def test_matches_ete3(ts):
+    ete3 = pytest.importorskip("ete3")
+    store = ts.TreeStore.from_newick(TREES)
+    expected = []
+    for i, text in enumerate(TREES):
+        assert store.newick(i) == ete3.Tree(text).write()
+        tree = ete3.Tree(text)
+        tree.prune(TAXA, preserve_branch_length=True)
+        expected.append(tree.write())
+    assert store.prune_all(TAXA) == expected
+
+
+def test_saved_store_tracks_source_file(ts, tmp_path):
+    source = tmp_path / "trees.nwk"
+    source.write_text("\n".join(TREES) + "\n")
+    path = str(tmp_path / "trees.store")
+    ts.TreeStore.from_newick_file(str(source)).save(path)
+    assert ts.TreeStore.is_current(path, str(source))
+    assert ts.TreeStore.load(path).prune_all(TAXA) == \
+        ts.TreeStore.from_newick(TREES).prune_all(TAXA)
+
+    source.write_text("\n".join(TREES[:2]) + "\n")
+    assert not ts.TreeStore.is_current(path, str(source))
+    assert not ts.TreeStore.is_current(str(tmp_path / "missing.store"), str(source))
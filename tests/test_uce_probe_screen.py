@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""UCE_Probe_Screen.py: gapped duplicate detection on a small probe set.
+
+The expected hits are the probe pairs LASTZ reports at the pipeline's
+--identity 50 --coverage 50: copies with point substitutions and small indels
+on either strand; unrelated and low-identity probes give no hit.
+"""
+
+import random
+
+import pytest
+
+from conftest import load_script
+
+COMPLEMENT = str.maketrans("ACGT", "TGCA")
+
+
+def revcomp(seq):
+    return seq.translate(COMPLEMENT)[::-1]
+
+
+def substitute(seq, every):
+    return ''.join("ACGT"[("ACGT".index(b) + 1) % 4] if i % every == every // 2 else b
+                   for i, b in enumerate(seq))
+
+
+@pytest.fixture(scope="module")
+def ups():
+    return load_script("Marker Extraction & Dataset Generation/UCE_Probe_Screen.py")
+
+
+@pytest.fixture(scope="module")
+def probes():
+    rng = random.Random(7)
+    bases = [''.join(rng.choice("ACGT") for _ in range(120)) for _ in range(4)]
+    a, b, c, d = bases
+    indel = substitute(a, 40)[:30] + a[31:70] + "TG" + a[70:]      # ~97%, 1 del + 2 ins
+    return {
+        "uce-1_p1": a,
+        "uce-2_p1": indel,                                          # indels, + strand
+        "uce-3_p1": revcomp(b[:50] + b[51:]),                       # one indel, - strand
+        "uce-4_p1": b,
+        "uce-5_p1": substitute(c, 3),                               # ~67% identity to c
+        "uce-6_p1": c,
+        "uce-7_p1": d,                                              # unrelated
+    }
+
+
+def screen(ups, probes, identity=50.0, coverage=50.0):
+    hits = ups.screen_probes([s.encode() for s in probes.values()], ups.DEFAULT_K,
+                             ups.DEFAULT_MIN_SEEDS, ups.DEFAULT_MAX_OCCURRENCE,
+                             identity, coverage)
+    return list(probes), hits
+
+
+def test_indel_and_reverse_complement_duplicates_found(ups, probes):
+    names, hits = screen(ups, probes)
+    pairs = {(names[t], names[q], '+-'[s]) for t, q, s, *_ in hits}
+    assert pairs == {("uce-1_p1", "uce-2_p1", '+'), ("uce-3_p1", "uce-4_p1", '-')}
+    for t, q, s, score, t_start, t_end, q_start, q_end, matches, mismatches, cigar in hits:
+        assert t_end - t_start > 110                     # End to end across the indels
+        assert 'I' in cigar or 'D' in cigar
+        assert 100.0 * matches / (matches + mismatches) > 95
+
+
+def test_identity_threshold(ups, probes):
+    mid = {"uce-5_p1": substitute(probes["uce-6_p1"], 14),  # ~93% identity
+           "uce-6_p1": probes["uce-6_p1"]}
+    assert len(screen(ups, mid, identity=90.0)[1]) == 1
+    assert screen(ups, mid, identity=95.0)[1] == []
+
+
+def test_batches_and_lastz_output(ups, probes, tmp_path, monkeypatch):
+    names, hits = screen(ups, probes)
+    monkeypatch.setattr(ups, "VERIFY_CELLS", 1)         # One pair per batch
+    assert screen(ups, probes)[1] == hits
+
+    output = tmp_path / "self.lastz"
+    ups.write_lastz(str(output), names, [len(s) for s in probes.values()], hits)
+    rows = [line.split('\t') for line in output.read_text().splitlines()]
+    assert len(rows) == 2 * len(hits)
+    minus = [r for r in rows if r[1] == "uce-4_p1"][0]
+    assert minus[6:8] == ["uce-3_p1", '-']
+    assert minus[3:5] == ["0", "120"] and minus[8:10] == ["0", "119"]
+    assert minus[12] == "50M1D69M"
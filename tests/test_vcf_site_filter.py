@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""VCF_Site_Filter.py: BGZF/tabix output and the step 8 site filters."""
+
+import gzip
+import random
+import struct
+import zlib
+
+import pytest
+
+from conftest import load_script
+
+SAMPLES = ["s1", "s2", "s3", "s4", "s5"]
+HEADER = ("##fileformat=VCFv4.2\n"
+          "##contig=<ID=chr1>\n##contig=<ID=chr2>\n"
+          "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t" + "\t".join(SAMPLES) + "\n")
+
+
+@pytest.fixture(scope="module")
+def vsf():
+    return load_script("Variant Calling & Filtering/VCF_Site_Filter.py")
+
+
+def record(chrom, pos, calls, qual=50, ref="A", alt="G", info="AC=0;AN=0;AF=0"):
+    return (f"{chrom}\t{pos}\t.\t{ref}\t{alt}\t{qual}\tPASS\t{info}\tGT:DP\t"
+            + "\t".join(calls) + "\n")
+
+
+def run_filter(vsf, tmp_path, body, threads=1):
+    source = tmp_path / "in.vcf"
+    source.write_text(HEADER + body)
+    output = tmp_path / "out.vcf.gz"
+    params = vsf.FilterParams(30.0, 4, 100, 0.8, 0.5)
+    counts = vsf.filter_vcf(str(source), str(output), params, threads)
+    with gzip.open(output, 'rt') as f:
+        lines = [line.rstrip('\n') for line in f if not line.startswith('#')]
+    return counts, lines, output
+
+
+# ==============================================
+# Reference tabix reader (independent of the indexer under test)
+# ==============================================
+def bgzf_blocks(data):
+    """Map compressed block offset -> (uncompressed start) and the full text."""
+    starts, text, offset = {}, [], 0
+    position = 0
+    while offset < len(data):
+        bsize = struct.unpack('<H', data[offset + 16:offset + 18])[0] + 1
+        block = zlib.decompress(data[offset + 18:offset + bsize - 8], -15)
+        starts[offset] = position
+        position += len(block)
+        text.append(block)
+        offset += bsize
+    return starts, b''.join(text)
+
+
+def read_tbi(path):
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+    assert data[:4] == b'TBI\x01'
+    n_ref, *_, l_nm = struct.unpack('<8i', data[4:36])
+    names = data[36:36 + l_nm].split(b'\0')[:n_ref]
+    offset = 36 + l_nm
+    index = {}
+    for name in names:
+        n_bin, = struct.unpack('<i', data[offset:offset + 4])
+        offset += 4
+        bins = {}
+        for _ in range(n_bin):
+            bin_id, n_chunk = struct.unpack('<Ii', data[offset:offset + 8])
+            offset += 8
+            bins[bin_id] = [struct.unpack('<QQ', data[offset + 16 * i:offset + 16 * i + 16])
+                            for i in range(n_chunk)]
+            offset += 16 * n_chunk
+        n_intv, = struct.unpack('<i', data[offset:offset + 4])
+        linear = struct.unpack(f'<{n_intv}Q', data[offset + 4:offset + 4 + 8 * n_intv])
+        offset += 4 + 8 * n_intv
+        index[name.decode()] = (bins, linear)
+    return index
+
+
+def region_bins(beg, end):
+    end -= 1
+    bins = [0]
+    for shift, first in ((26, 1), (23, 9), (20, 73), (17, 585), (14, 4681)):
+        bins.extend(range(first + (beg >> shift), first + (end >> shift) + 1))
+    return bins
+
+
+def tabix_query(output, index, chrom, beg, end):
+    """Records overlapping [beg, end) found through the index."""
+    starts, text = bgzf_blocks(output.read_bytes())
+    bins, linear = index[chrom]
+    min_offset = linear[beg >> 14] if (beg >> 14) < len(linear) else 0
+    found = set()
+    for bin_id in region_bins(beg, end):
+        for vbeg, vend in bins.get(bin_id, []):
+            if vend <= min_offset:
+                continue
+            ubeg = starts[vbeg >> 16] + (vbeg & 0xffff)
+            uend = starts[vend >> 16] + (vend & 0xffff)
+            for line in text[ubeg:uend].decode().splitlines():
+                fields = line.split('\t')
+                start = int(fields[1]) - 1
+                if fields[0] == chrom and start < end and start + len(fields[3]) > beg:
+                    found.add(line)
+    return found
+
+
+@pytest.fixture(scope="module")
+def large_output(vsf, tmp_path_factory):
+    """Several BGZF blocks over two contigs, with a few long REF alleles."""
+    rng = random.Random(5)
+    body = []
+    for chrom, n in (("chr1", 4000), ("chr2", 1500)):
+        positions = sorted(rng.sample(range(1, 3000000), n))
+        for pos in positions:
+            ref = "A" * (rng.choice([1] * 9 + [40000]))
+            calls = [f"{rng.choice(['0/1', '1/1', '0/0'])}:{rng.randint(5, 50)}"
+                     for _ in SAMPLES]
+            calls[0] = "0/1:20"
+            body.append(record(chrom, pos, calls, ref=ref[:1] if len(ref) == 1 else ref))
+    tmp_path = tmp_path_factory.mktemp("large")
+    counts, lines, output = run_filter(vsf, tmp_path, ''.join(body), threads=4)
+    return lines, output
+
+
+def test_bgzf_output_reads_back_with_gzip(large_output):
+    lines, output = large_output
+    assert len(lines) == 5500
+    data = output.read_bytes()
+    assert data.endswith(bytes.fromhex('1f8b08040000000000ff0600424302001b0003'
+                                       '000000000000000000'))
+    starts, _ = bgzf_blocks(data)
+    assert len(starts) > 3                          # Multi-block output
+
+
+@pytest.mark.parametrize("chrom,beg,end", [
+    ("chr1", 0, 1), ("chr1", 1000000, 1000500), ("chr1", 16383, 16385),
+    ("chr1", 2500000, 2600000), ("chr2", 0, 3000000), ("chr2", 123456, 160000),
+])
+def test_tabix_regions_match_records(large_output, chrom, beg, end):
+    lines, output = large_output
+    index = read_tbi(str(output) + '.tbi')
+    expected = {line for line in lines
+                if line.split('\t')[0] == chrom
+                and int(line.split('\t')[1]) - 1 < end
+                and int(line.split('\t')[1]) - 1 + len(line.split('\t')[3]) > beg}
+    assert tabix_query(output, index, chrom, beg, end) == expected
+
+
+def test_tabix_regions_match_pysam(large_output):
+    pysam = pytest.importorskip("pysam")
+    lines, output = large_output
+    with pysam.TabixFile(str(output)) as tbx:
+        for chrom, beg, end in (("chr1", 1000000, 1200000), ("chr2", 0, 50000)):
+            expected = {line for line in lines
+                        if line.split('\t')[0] == chrom
+                        and int(line.split('\t')[1]) - 1 < end
+                        and int(line.split('\t')[1]) - 1 + len(line.split('\t')[3]) > beg}
+            assert set(tbx.fetch(chrom, beg, end)) == expected
+
+
+def test_site_and_genotype_filters(vsf, tmp_path):
+    good = ["0/1:10"] * 5
+    body = ''.join([
+        record("chr1", 100, good),
+        record("chr1", 200, good, qual=20),                                  # QUAL
+        record("chr1", 300, good, alt="C,T"),                                # Not biallelic
+        record("chr1", 400, ["0/1:2"] + good[1:]),                           # DP mask, kept
+        record("chr1", 500, ["0/1:200", "0/1:300"] + good[2:]),              # Call rate 0.6
+        record("chr1", 600, ["0/0:10"] * 5),                                 # AC == 0
+        record("chr1", 700, ["1/1:10"] * 5),                                 # AC == AN
+        record("chr1", 800, ["./.:."] + ["1/1:10"] + ["0/0:10"] * 3),        # Kept
+    ])
+    counts, lines, _ = run_filter(vsf, tmp_path, body)
+
+    assert [line.split('\t')[1] for line in lines] == ["100", "400", "800"]
+    assert {key: counts[key] for key in ('input', 'multiallelic', 'low_qual', 'max_missing',
+                                         'monomorphic', 'f_missing', 'output')} == {
+        'input': 8, 'multiallelic': 1, 'low_qual': 1, 'max_missing': 1,
+        'monomorphic': 2, 'f_missing': 0, 'output': 3}
+    masked = lines[1].split('\t')
+    assert masked[7] == "AC=4;AN=8;AF=0.5" and masked[9] == "./.:2"
+    assert lines[2].split('\t')[7] == "AC=2;AN=8;AF=0.25"
+
+
+def test_format_without_gt_names_record(vsf, tmp_path):
+    body = "chr1\t100\t.\tA\tG\t50\tPASS\t.\tDP\t" + "\t".join(["10"] * 5) + "\n"
+    with pytest.raises(ValueError, match=r"no GT field \(record chr1:100\)"):
+        run_filter(vsf, tmp_path, body)
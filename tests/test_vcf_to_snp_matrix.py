@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""VCF_to_SNP_Matrix.py: 2-bit packing, IUPAC coding and NEXUS output."""
+
+import os
+
+import numpy as np
+import pytest
+
+from conftest import SCRIPTS, load_script
+
+VCF = """##fileformat=VCFv4.2
+#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tA\tB\tout
+chr1\t10\t.\tA\tG\t50\tPASS\t.\tGT:DP\t0/1:9\t1/1:9\t0/0:9
+chr1\t20\t.\tC\tT\t50\tPASS\t.\tGT\t./.\t0\t0/1
+chr1\t30\t.\tAT\tG\t50\tPASS\t.\tGT\t0/1\t0/1\t0/1
+chr1\t40\t.\tG\tC\t50\tPASS\t.\tGT\t0/0\t0/0\t0/0
+chr1\t50\t.\tT\tA\t50\tPASS\t.\tGT\t0/0\t0/1\t1/1
+chr1\t60\t.\tA\tC\t50\tPASS\t.\tGT\t0/1\t./.\t1
+chr2\t70\t.\tG\tT\t50\tPASS\t.\tGT\t1/1\t0/1\t0/0
+"""
+
+NEXUS = ("#NEXUS\n\nBEGIN DATA;\n"
+         "\tDIMENSIONS NTAX=3 NCHAR=5;\n"
+         "\tFORMAT DATATYPE=DNA MISSING=? GAP=-;\n"
+         "\tMATRIX\n"
+         "out AYACG\n"
+         "A   R?TMT\n"
+         "B   GCW?K\n"
+         "\t;\nEND;\n")
+
+
+@pytest.fixture
+def vsm(monkeypatch):
+    monkeypatch.syspath_prepend(os.path.join(SCRIPTS, "Variant Calling & Filtering"))
+    return load_script("Variant Calling & Filtering/VCF_to_SNP_Matrix.py")
+
+
+def test_pack_round_trip(vsm):
+    rng = np.random.default_rng(3)
+    codes = rng.integers(0, 4, size=(3, 40), dtype=np.uint8)
+    packed = vsm.pack_codes(codes)
+    assert packed.shape == (3, 10)
+    for row in range(3):
+        assert np.array_equal(vsm.unpack_codes(packed[row], 37), codes[row, :37])
+
+    # Chunks of uneven size are carried over and padded on finish()
+    matrix = vsm.PackedMatrix(3)
+    for start, stop in ((0, 3), (3, 10), (10, 10), (10, 37)):
+        matrix.append(codes[:, start:stop], np.zeros(stop - start, np.uint8),
+                      np.ones(stop - start, np.uint8))
+    matrix.finish()
+    assert matrix.n_sites == 37 and matrix.nbytes() == 3 * 10
+    for row in range(3):
+        assert np.array_equal(matrix.row(row), codes[row, :37])
+
+
+def test_vcf_to_nexus(vsm, tmp_path):
+    (tmp_path / "in.vcf").write_text(VCF)
+    names, matrix, counts = vsm.build_matrix(str(tmp_path / "in.vcf"), None, "out", 0,
+                                             False, 1)
+    assert counts == {'input': 7, 'not_snp': 1, 'invariant': 1, 'thinned': 0, 'output': 5}
+    vsm.write_matrix(str(tmp_path / "out.nex"), names, matrix, 'nexus')
+    assert (tmp_path / "out.nex").read_text() == NEXUS
+
+    vsm.write_matrix(str(tmp_path / "out.phy"), names, matrix, 'phylip')
+    assert (tmp_path / "out.phy").read_text().splitlines() == [
+        "3 5", "out AYACG", "A   RNTMT", "B   GCWNK"]
+
+
+@pytest.mark.parametrize("content,message", [
+    ("\n\n", "No sample names"),
+    ("A\nB\nA\n", "more than once.*: A"),
+])
+def test_sample_list_rejects_empty_and_duplicates(vsm, tmp_path, content, message):
+    (tmp_path / "samples.txt").write_text(content)
+    with pytest.raises(ValueError, match=message):
+        vsm.read_sample_list(str(tmp_path / "samples.txt"))
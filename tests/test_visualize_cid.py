@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""Visualize_CID_Results.py: report path without matplotlib."""
+
+import pytest
+
+from conftest import load_script
+
+
+def test_missing_matplotlib_only_skips_plot(tmp_path, monkeypatch, capsys):
+    pytest.importorskip("pandas")
+    vis = load_script("Marker Extraction & Dataset Generation/Visualize_CID_Results.py")
+    names = [f"L{i}" for i in range(5)]
+    rows = [",".join([name] + [str((i * j) % 7 / 7) for j in range(5)])
+            for i, name in enumerate(names)]
+    (tmp_path / "m.csv").write_text(",".join([""] + names) + "\n" + "\n".join(rows) + "\n")
+    (tmp_path / "t.list").write_text("\n".join(names) + "\n")
+
+    def no_matplotlib(backend):
+        raise ImportError("No module named 'matplotlib'")
+
+    monkeypatch.setattr(vis, "load_pyplot", no_matplotlib)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr("sys.argv", ["Visualize_CID_Results.py", "m.csv", "t.list"])
+    vis.main()  # no SystemExit
+
+    assert "plot skipped" in capsys.readouterr().err
+    assert (tmp_path / "4-CID_distance_report.txt").exists()
+    assert (tmp_path / "5-Exceed_MAD_CID_trees.txt").exists()
+    assert not list(tmp_path.glob("4-CID_distance_trend.*"))